@@ -6,15 +6,18 @@ import time
 from collections import deque
 from itertools import groupby
 from queue import Queue
-from typing import Generator
+from typing import Generator, Iterator
 
-from generation import PassThroughMutator, BlendingMutator, RepetitionMutator, ObfuscationMutator
+from generation import PassThroughMutator, BlendingMutator, RepetitionMutator, ObfuscationMutator, GeneratabilityCache, \
+    PlanCache, GenerationPool
 from logger import logger
-from commons import PortAllocator, AccumulationAnalyzer
+from commons import PortAllocator, AccumulationAnalyzer, SketchAccumulationAnalyzer, DecayAccumulationAnalyzer, \
+    KnowledgeBase, Stream, Blob, chunks
 from injection import TunableInitiator
-from rule import Proto, Rule, RuleSet
+from rule import Proto, Rule, RuleSet, RuleMapping
 from sanitization import AlertMonitor, AlertValidator
-from selection import SequentialSelector, CombinationSelector, RandomSelector
+from selection import SequentialSelector, CombinationSelector, CoveringSelector, RandomSelector, AdaptiveSelector, \
+    StratifiedSelector
 
 
 class Fuzzer:
@@ -47,14 +50,25 @@ class Fuzzer:
         self.rule_pool = None
         self.rule_selector = None
         self.rule_mutator = None
+        self.generatability = None
+        self.generation_workers: int = None
+        self.generation_pool = None
+        # The batches generated ahead by the generation pool, and the selected batches still in the pool.
+        self._generated: Iterator[tuple[list[tuple[bytes, bytes]], str]] = None
+        self._generating: deque[tuple[str, list[Rule]]] = deque()
 
         self.test_bundle = Queue()
 
         self.monitored_alerts = None
         self.alert_monitor = None
         self.alert_validator = None
+        self.rule_mapping = None
 
         self.accumulation_analyzer = None
+        self.knowledge_base = None
+
+        self.reload_interval: float = None
+        self._last_reload = time.monotonic()
 
         self._running = False
         self._thread = None
@@ -62,8 +76,9 @@ class Fuzzer:
         ##############################
         self._selected_rules: list[Rule] = None
         self._selected_proto: str = None
-        self._requests: list[bytes] = None
-        self._responses: list[bytes] = None
+        self._requests: list[bytes | Stream] = None
+        self._responses: list[bytes | Stream] = None
+        self._generation_result: tuple[list[tuple[bytes, bytes]], str] = None
         self._flawed_rules: list[Rule] = None
 
         logger.success(f'Initialized Fuzzer with protocol: {self.protocol}')
@@ -72,10 +87,24 @@ class Fuzzer:
                         rule_files: list[str],
                         algorithm: str,
                         batch_size: int = 1,
-                        batch_num: int = 10000, ):
-        self.rule_pool = RuleSet.from_files(file_paths=rule_files)
+                        batch_num: int = 10000,
+                        cache_dir: str = None,
+                        cluster_threshold: float = None,
+                        reload_interval: float = None,
+                        bandit: str = 'ucb',
+                        exploration: float = 1.0,
+                        shard: tuple[int, int] = (0, 1),
+                        resume_from: int = None,
+                        strength: int = 2,
+                        covering_unit: str = 'rule',
+                        compatible: bool = False,
+                        baseline: list[str] = None, ):
+        # Only the rules of the fuzzed protocol (and the flowbit setters they depend on) are parsed.
+        services = [self.protocol] if self.protocol is not None else None
+        self.rule_pool = RuleSet.from_files(file_paths=rule_files, cache_dir=cache_dir, services=services)
         logger.success(f'Loaded rule files: {rule_files}')
         logger.success(f'{str(self.rule_pool)}')
+        self.reload_interval = reload_interval
 
         match algorithm.lower():
             case 'sequential':
@@ -84,6 +113,7 @@ class Fuzzer:
                     batch_size=batch_size,
                     batch_num=batch_num,
                     proto=self.protocol,
+                    cluster_threshold=cluster_threshold,
                 )
             case 'combination':
                 self.rule_selector = CombinationSelector(
@@ -91,6 +121,24 @@ class Fuzzer:
                     batch_size=batch_size,
                     batch_num=batch_num,
                     proto=self.protocol,
+                    cluster_threshold=cluster_threshold,
+                    shard_index=shard[0],
+                    shard_count=shard[1],
+                    start=resume_from,
+                    compatible=compatible,
+                )
+            case 'covering':
+                self.rule_selector = CoveringSelector(
+                    ruleset=self.rule_pool,
+                    batch_size=batch_size,
+                    batch_num=batch_num,
+                    proto=self.protocol,
+                    cluster_threshold=cluster_threshold,
+                    shard_index=shard[0],
+                    shard_count=shard[1],
+                    start=resume_from,
+                    strength=strength,
+                    unit=covering_unit,
                 )
             case 'random':
                 self.rule_selector = RandomSelector(
@@ -98,46 +146,144 @@ class Fuzzer:
                     batch_size=batch_size,
                     batch_num=batch_num,
                     proto=self.protocol,
+                    cluster_threshold=cluster_threshold,
+                    compatible=compatible,
+                )
+            case 'adaptive':
+                self.rule_selector = AdaptiveSelector(
+                    ruleset=self.rule_pool,
+                    batch_size=batch_size,
+                    batch_num=batch_num,
+                    proto=self.protocol,
+                    cluster_threshold=cluster_threshold,
+                    algorithm=bandit,
+                    exploration=exploration,
+                )
+            case 'stratified':
+                self.rule_selector = StratifiedSelector(
+                    ruleset=self.rule_pool,
+                    batch_size=batch_size,
+                    batch_num=batch_num,
+                    proto=self.protocol,
+                    cluster_threshold=cluster_threshold,
                 )
             case _:
                 raise ValueError(f"Unknown selection algorithm: '{algorithm}'")
 
+        if compatible:
+            if self.rule_selector.compatibility is None:
+                logger.warning(f'The {algorithm} selection does not support compatible batches.')
+            else:
+                logger.info(f'Rule compatibility: {self.rule_selector.compatibility}')
+
+        if baseline is not None:
+            # Regression fuzzing: the selection is focused on the rules changed since the baseline.
+            baseline_ruleset = RuleSet.from_files(file_paths=baseline, cache_dir=cache_dir, services=services)
+            changed_rules = self.rule_pool.diff(baseline_ruleset)
+            logger.success(f'Changed rules since the baseline {baseline}: {len(changed_rules)}')
+            self.rule_selector.focus(*changed_rules)
         logger.success(f'Setting up selection strategy: {algorithm}.')
         return self
 
     def setup_generation(self,
                          algorithm: str,
-                         mode: str = 'block-wise', ):
+                         mode: str = 'block-wise',
+                         cache_dir: str = None,
+                         workers: int = None, ):
+        # Each rule batch is compiled into a generation plan once, see `PlanCache`.
+        plans = PlanCache(cache_dir=cache_dir)
         match algorithm.lower():
             case 'pass-through':
-                self.rule_mutator = PassThroughMutator(ruleset=self.rule_pool)
+                self.rule_mutator = PassThroughMutator(ruleset=self.rule_pool, plans=plans)
             case 'blending':
-                self.rule_mutator = BlendingMutator(ruleset=self.rule_pool)
+                self.rule_mutator = BlendingMutator(ruleset=self.rule_pool, plans=plans)
             case 'repetition':
                 if mode != 'block-wise' and mode != 'element-wise':
                     raise ValueError(f'Invalid repetition mode: {mode}')
-                self.rule_mutator = RepetitionMutator(ruleset=self.rule_pool, mode=mode)
+                self.rule_mutator = RepetitionMutator(ruleset=self.rule_pool, mode=mode, plans=plans)
             case 'obfuscation':
-                self.rule_mutator = ObfuscationMutator(ruleset=self.rule_pool)
+                self.rule_mutator = ObfuscationMutator(ruleset=self.rule_pool, plans=plans)
             case _:
                 raise ValueError(f"Unknown generation algorithm: '{algorithm}'")
+
+        # The rules that the mutator cannot generate test packets from are kept out of the selection.
+        self.generatability = GeneratabilityCache(self.rule_mutator, cache_dir=cache_dir)
+        if self.rule_selector is not None:
+            self._exclude_ungeneratable(self.rule_selector.ruleset)
+        self.generatability.store()
+
+        # The test packets are generated ahead in a pool of worker processes, see `_prefetch`.
+        self.generation_workers = workers
         logger.success(f'Setting up generation strategy: {algorithm}.')
         return self
 
+    def _exclude_ungeneratable(self, rules: list[Rule]):
+        failed_rules = self.generatability.precheck(rules, proto=self.protocol)
+        if failed_rules:
+            self.rule_selector.exclude(*failed_rules)
+            logger.info(f'Excluded {len(failed_rules)} rules that cannot be generated: '
+                        f'{dict(self.generatability.report(failed_rules))}')
+
     def setup_sanitization(self,
-                           alert_files: list[str], ):
+                           alert_files: list[str],
+                           mapped_rule_files: list[str] = None,
+                           cache_dir: str = None, ):
+        if mapped_rule_files:
+            # The mapped rules are restricted to the fuzzed services as well, otherwise the rules of the other
+            # services miss the `gid:sid` index and fall back to the (slow and less precise) signature matching.
+            services = [self.protocol] if self.protocol is not None else None
+            mapped_ruleset = RuleSet.from_files(file_paths=mapped_rule_files, cache_dir=cache_dir, services=services)
+            self.rule_mapping = RuleMapping(self.rule_pool, mapped_ruleset)
+            logger.success(f'Mapped rule files: {mapped_rule_files}')
+            logger.success(f'{str(self.rule_mapping)}')
+
         self.monitored_alerts = {alert_file: deque() for alert_file in alert_files}
         self.alert_monitor = AlertMonitor(monitored_alerts=self.monitored_alerts)
         self.alert_validator = AlertValidator(
             nids_bundles=self.monitored_alerts,
             test_bundles=self.test_bundle,
-            port_window=self.port_allocator.memory, )
+            port_window=self.port_allocator.memory,
+            rule_mapping=self.rule_mapping, )
         logger.success(f'Setting up alert sanitizer.')
         return self
 
-    def setup_adaptation(self, threshold: int = 1):
-        self.accumulation_analyzer = AccumulationAnalyzer(threshold=threshold)
-        logger.success(f'Setting up accumulation analyzer.')
+    def setup_adaptation(self,
+                         threshold: int = 1,
+                         algorithm: str = 'exact',
+                         half_life: float = 86400.0, ):
+        match algorithm.lower():
+            case 'exact':
+                self.accumulation_analyzer = AccumulationAnalyzer(threshold=threshold)
+            case 'sketch':
+                self.accumulation_analyzer = SketchAccumulationAnalyzer(threshold=threshold)
+            case 'decay':
+                self.accumulation_analyzer = DecayAccumulationAnalyzer(threshold=threshold, half_life=half_life)
+            case _:
+                raise ValueError(f"Unknown accumulation algorithm: '{algorithm}'")
+        logger.success(f'Setting up accumulation analyzer: {algorithm}.')
+        return self
+
+    def setup_knowledge(self,
+                        knowledge_dir: str = None,
+                        versions: list[str] = None,
+                        skip_verified: int = None, ):
+        if knowledge_dir is None:
+            return self
+        # Outcomes are only shared by the campaigns of the same mutator against the same NIDS versions,
+        # which are told apart by the alert files unless they are given.
+        if versions is None:
+            versions = [pathlib.Path(alert_file).name for alert_file in self.monitored_alerts]
+        self.knowledge_base = KnowledgeBase(knowledge_dir, mutator=type(self.rule_mutator).__name__, versions=versions)
+        logger.success(f'Loaded knowledge base: {self.knowledge_base}')
+
+        rules = self.rule_selector.ruleset
+        if skip_verified is not None:
+            verified_rules = self.knowledge_base.verified(rules, times=skip_verified)
+            self.rule_selector.exclude(*verified_rules)
+            logger.info(f'Excluded {len(verified_rules)} rules verified consistent at least {skip_verified} times.')
+        self.rule_selector.warm_start({rule: outcome for rule in rules
+                                       if (outcome := self.knowledge_base.outcome(rule)).tested > 0})
+        logger.success(f'Setting up knowledge base: {self.knowledge_base.entry}.')
         return self
 
     def fuzz_loop(self):
@@ -176,25 +322,100 @@ class Fuzzer:
     def _pre_fuzzing_run(self):
         self._selected_rules = None
         self._selected_proto = None
+        self._generation_result = None
         self._flawed_rules = None
 
+        if self.reload_interval is not None and time.monotonic() - self._last_reload >= self.reload_interval:
+            self._reload()
+
+    def _reload(self):
+        # Unchanged rules keep their Rule objects, so the state of the selector and the analyzer is preserved.
+        added_rules, removed_rules = self.rule_selector.reload()
+        self._last_reload = time.monotonic()
+        if added_rules or removed_rules:
+            logger.success(f'Reloaded rule files: {len(added_rules)} rules added, {len(removed_rules)} rules removed.')
+            logger.success(f'{str(self.rule_pool)}')
+        if added_rules and self.generatability is not None:
+            self._exclude_ungeneratable([rule for rule in added_rules if rule.activated])
+        if (added_rules or removed_rules) and self.generation_pool is not None:
+            # The workers still hold the rules before the reload, so the batches generated ahead are dropped.
+            logger.info(f'Restarting the generation pool, dropping {len(self._generating)} batches generated ahead.')
+            self._close_generation_pool()
+
     def _selection(self):
         try:
-            self._selected_proto, self._selected_rules = next(self.rule_selector)
+            if self.generation_workers is not None:
+                if self.generation_pool is None:
+                    self.generation_pool = GenerationPool(self.rule_mutator, workers=self.generation_workers)
+                    self._generated = self.generation_pool.generate_many(self._prefetch())
+                self._generation_result = next(self._generated)
+                self._selected_proto, self._selected_rules = self._generating.popleft()
+            else:
+                self._selected_proto, self._selected_rules = next(self.rule_selector)
             logger.debug(f'Selection phase finished: {self._selected_proto} >>> {[rule.id for rule in self._selected_rules]}')
         except StopIteration:
             logger.info(f'There is no rules need to be validated.')
             self.stop()
 
+    def _prefetch(self) -> Generator[tuple[str, list[Rule]], None, None]:
+        # The batches are selected as the generation pool asks for them, ahead of the fuzzing runs, so the
+        # rewards and exclusions of a run only affect the batches selected afterward.
+        while self.rule_selector.count < self.rule_selector.batch_num:
+            try:
+                batch = next(self.rule_selector)
+            except StopIteration:
+                return
+            self._generating.append(batch)
+            yield batch
+
+    def _close_generation_pool(self):
+        if self.generation_pool is not None:
+            self.generation_pool.close()
+        self.generation_pool = None
+        self._generated = None
+        self._generating.clear()
+
     def _generation(self):
         if self._selected_proto is None:
             raise RuntimeError(f'The selected rules and protocol are None, please exec selection before generating test packets.')
 
-        self._requests: list[bytes] = []
-        self._responses: list[bytes] = []
-        for request, response in self.rule_mutator.generate(*self._selected_rules, proto=self._selected_proto):
-            self._requests.append(request)
-            self._responses.append(response)
+        self._requests: list[bytes | Stream] = []
+        self._responses: list[bytes | Stream] = []
+
+        # Signatures are parsed on first use, so a rule with an invalid option is only found here.
+        invalid_rules = []
+        for rule in self._selected_rules:
+            try:
+                _ = rule.signature
+            except Exception as e:
+                logger.error(f'Excluding rule {rule.id} with an invalid signature: {e}')
+                invalid_rules.append(rule)
+        if invalid_rules:
+            self.rule_selector.exclude(*invalid_rules)
+            logger.debug(f'Generation phase skipped.')
+            return
+
+        if self._generation_result is not None:
+            packets, reason = self._generation_result
+            for request, response in packets:
+                self._requests.append(request)
+                self._responses.append(response)
+        else:
+            generator = self.rule_mutator.generate(*self._selected_rules, proto=self._selected_proto)
+            while True:
+                try:
+                    request, response = next(generator)
+                except StopIteration as result:
+                    reason = result.value
+                    break
+                self._requests.append(request)
+                self._responses.append(response)
+
+        # A failed batch of several rules may only fail for their combination, which is not remembered.
+        if reason not in (self.rule_mutator.FINISHED, self.rule_mutator.REJECTED) and len(self._selected_rules) == 1 \
+                and self.generatability is not None and self.generatability.record(self._selected_rules[0], reason):
+            logger.info(f'Excluding rule {self._selected_rules[0].id} that cannot be generated: {reason}')
+            self.rule_selector.exclude(*self._selected_rules)
 
         logger.debug(f'Generation phase finished. Size of bilateral packets: [requests: {len(self._requests)}, responses: {len(self._responses)}]')
 
@@ -203,6 +424,13 @@ class Fuzzer:
             logger.info(f'No packet generated. Injection phase finished.')
             return
 
+        # The streamed packets are spooled to blobs, which the test bundle keeps instead of their bytes.
+        blob_dir = pathlib.Path(self.output_dir) / 'blobs'
+        self._requests = [Blob.write(request, blob_dir) if isinstance(request, Stream) else request
+                          for request in self._requests]
+        self._responses = [Blob.write(response, blob_dir) if isinstance(response, Stream) else response
+                           for response in self._responses]
+
         tuned_port = self.port_allocator.allocate(memorize=True)
         tuning_port = self.port_allocator.allocate(memorize=False)
 
@@ -220,6 +448,8 @@ class Fuzzer:
             self._requests,
             self._responses,
         ))
+        if self.knowledge_base is not None:
+            self.knowledge_base.test(*self._selected_rules)
 
         logger.debug(f'Injection phase finished.')
 
@@ -237,35 +467,71 @@ class Fuzzer:
                     # self._flawed_rules = [self.rule_pool.find_rule(r) for r in flawed_rules]
                     if None in flawed_rules:
                         raise RuntimeError(f'Flawed rule is invalid: {flawed_rules}')
+                    self._reward(selected_rules, flawed_rules, platform_alerts)
+                    if self.knowledge_base is not None:
+                        self.knowledge_base.discrepancy(*selected_rules, confirmed=flawed_rules)
                     self._flawed_rules.extend(flawed_rules)
                     self.save(self.output_dir, selected_rules, requests, responses, platform_alerts)
             self.alert_monitor.resume()
 
         logger.debug(f'Sanitization phase finished: {[rule.id for rule in self._flawed_rules]}')
 
+    def _reward(self,
+                selected_rules: list[Rule],
+                flawed_rules: list[Rule],
+                platform_alerts: dict[str, list[tuple[str, str, str, str, str]]]):
+        # A discrepancy rewards its seed rules, and the alerts raised by each platform tell whether it is a
+        # new kind of discrepancy. The rules confirmed as flawed by the accumulation analyzer earn a bonus.
+        # The alerts are compared by the IDs of the fuzzed rules, no matter which rule file a platform loads.
+        normalize = self.rule_mapping.normalize if self.rule_mapping is not None else str
+        pattern = frozenset((platform, normalize(alert[0]))
+                            for platform, alerts in platform_alerts.items() for alert in alerts)
+        self.rule_selector.reward(*selected_rules, pattern=pattern, confirmed=flawed_rules)
+
     def _post_fuzzing_run(self):
         if self._flawed_rules is not None and len(self._flawed_rules) > 0:
             self.rule_selector.filter(*self._flawed_rules)
+            # The near-duplicates of a flawed rule are likely flawed too, so they are tested from now on.
+            self.rule_selector.expand(*self._flawed_rules)
 
         # Add some interval to avoid overwhelming NIDS platforms.
         time.sleep(0.1)
 
-        if self.rule_selector.count >= self.rule_selector.batch_num:
+        # The batches selected ahead are still tested, until the generation pool runs out of them.
+        if self.rule_selector.count >= self.rule_selector.batch_num and self.generation_pool is None:
             logger.info(f'There is no rules need to be validated.')
             self.stop()
 
     def _finalize(self):
+        self._close_generation_pool()
+        if self.generatability is not None:
+            self.generatability.store()
+        if self.rule_mutator is not None:
+            self.rule_mutator.plans.store()
+            logger.info(f'Generation plans: {self.rule_mutator.plans}')
+
+        if isinstance(self.rule_selector, CombinationSelector):
+            logger.info(f'Stopped at combination #{self.rule_selector.position} of service '
+                        f'{self.rule_selector.current_service}, which can be resumed with --resume-from.')
+
         for selected_rules, client_addr, server_addr, requests, responses, platform_alerts in self.alert_validator.finalize():
             flawed_rules: list[Rule] = self.accumulation_analyzer.update(*selected_rules)
             if None in flawed_rules:
                 raise RuntimeError(f'Flawed rule is invalid: {flawed_rules}')
+            self._reward(selected_rules, flawed_rules, platform_alerts)
+            if self.knowledge_base is not None:
+                self.knowledge_base.discrepancy(*selected_rules, confirmed=flawed_rules)
             self.save(self.output_dir, selected_rules, requests, responses, platform_alerts)
 
+        if self.knowledge_base is not None:
+            self.knowledge_base.store()
+            logger.info(f'Stored knowledge base: {self.knowledge_base}')
+
     @staticmethod
     def save(file_anchor: str,
              rule_id: list[Rule],
-             requests: list[bytes],
-             responses: list[bytes],
+             requests: list[bytes | Stream],
+             responses: list[bytes | Stream],
              platform_alerts: dict[str, list[tuple[str, str, str, str, str]]]):
         # Write the human-readable alert information
         file_discrepancies = pathlib.Path(file_anchor) / 'discrepancies.txt'
@@ -280,9 +546,11 @@ class Fuzzer:
         with open(file_packets, 'ab') as f:
             for request, response in zip(requests, responses):
                 f.write(struct.pack('!I', len(request)))
-                f.write(request)
+                for chunk in chunks(request):
+                    f.write(chunk)
                 f.write(struct.pack('!I', len(response)))
-                f.write(response)
+                for chunk in chunks(response):
+                    f.write(chunk)
             f.write(b'\xff\xff\xff\xff')
 
     @staticmethod
@@ -3,6 +3,12 @@ from typing import Any
 
 
 class AccumulationAnalyzer:
+    """
+    Counts how often each item (usually a flawed rule) has been reported and
+    bursts it once its count reaches the threshold. This class keeps exact
+    counters; subclasses trade exactness for bounded memory by overriding
+    `_accumulate`, `_reset` and `estimate`.
+    """
 
     def __init__(self, threshold: int = 1):
         if threshold < 1:
@@ -17,13 +23,26 @@ class AccumulationAnalyzer:
     def update(self, *items: Any) -> list[Any]:
         burst_items = []
         for item in items:
-            self.item_map[item] += 1
-            if self.item_map[item] >= self.threshold:
+            if self._accumulate(item) >= self.threshold:
                 # print(f'Item {item} exceeds threshold {self.threshold}')
                 burst_items.append(item)
-                self.item_map[item] = 0
+                self._reset(item)
         return burst_items
 
+    def estimate(self, item: Any) -> float:
+        """
+        Returns the current count of the item without updating it.
+        """
+        return self.item_map.get(item, 0)
+
+    def _accumulate(self, item: Any) -> float:
+        self.item_map[item] += 1
+        return self.item_map[item]
+
+    def _reset(self, item: Any):
+        # A burst item starts from zero again, so there is no need to keep its key.
+        self.item_map.pop(item, None)
+
 
 if __name__ == '__main__':
 
@@ -37,4 +56,3 @@ if __name__ == '__main__':
 
 
 
-
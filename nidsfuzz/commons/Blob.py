@@ -0,0 +1,62 @@
+import os
+import tempfile
+import weakref
+from pathlib import Path
+from typing import Iterator
+
+from commons.Stream import Stream, chunks
+
+
+class Blob(Stream):
+    """
+    A test packet spooled to a file, which the test bundles keep instead of its bytes, so that a very large
+    packet does not stay in memory until it is sanitized. A stream is produced once, when it is written to
+    the blob, and the blob is then read in chunks as many times as needed (e.g., to inject the packet, and
+    to save it once a discrepancy is found).
+
+    The file is removed once the blob is no longer referenced.
+
+    Usage:
+    --------
+    >>> blob = Blob.write(stream, blob_dir='output/blobs')
+    >>> len(blob) == len(stream)
+    >>> for chunk in blob:
+    >>>     sock.sendall(chunk)
+    """
+
+    def __init__(self, path: Path, length: int):
+        super().__init__()
+        self.path = path
+        self.length = length
+        self._finalizer = weakref.finalize(self, Path.unlink, path, True)
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(path={str(self.path)!r}, length={len(self)})'
+
+    def pieces(self) -> Iterator[bytes]:
+        with self.path.open('rb') as f:
+            while piece := f.read(self.CHUNK_SIZE):
+                yield piece
+
+    def endswith(self, suffix: bytes) -> bool:
+        if len(suffix) > len(self):
+            return False
+        with self.path.open('rb') as f:
+            f.seek(len(self) - len(suffix))
+            return f.read() == suffix
+
+    @classmethod
+    def write(cls, packet: bytes | Stream, blob_dir: str) -> 'Blob':
+        blob_dir = Path(blob_dir).expanduser()
+        blob_dir.mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=blob_dir, suffix='.blob')
+        length = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks(packet):
+                    f.write(chunk)
+                    length += len(chunk)
+        except Exception:
+            Path(path).unlink(missing_ok=True)
+            raise
+        return cls(Path(path), length)
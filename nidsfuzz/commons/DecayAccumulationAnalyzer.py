@@ -0,0 +1,96 @@
+import math
+import time
+from typing import Any, Callable
+
+from commons.AccumulationAnalyzer import AccumulationAnalyzer
+
+
+class DecayAccumulationAnalyzer(AccumulationAnalyzer):
+    """
+    An accumulation analyzer whose counters decay exponentially over time, so
+    that a rule which misfired once a long time ago does not contribute to
+    the threshold today. A counter loses half of its value every `half_life`
+    seconds.
+
+    At most `capacity` items are tracked. When the limit is reached, counters
+    that have decayed below `floor` are forgotten first, followed by the
+    smallest ones, which keeps the memory footprint flat during unbounded
+    fuzzing campaigns.
+
+    Since every hit starts to decay right away, the counter of `threshold`
+    hits close together is slightly below the threshold (e.g., 1.9999). A
+    counter within `tolerance` below the threshold bursts as well.
+
+    Usage:
+    --------
+    >>> analyzer = DecayAccumulationAnalyzer(threshold=2, half_life=3600)
+    >>> analyzer.update('1:1:1')  # []
+    >>> analyzer.update('1:1:1')  # ['1:1:1'] if both updates happened within a few minutes
+    """
+
+    def __init__(self,
+                 threshold: int = 1,
+                 half_life: float = 86400.0,
+                 capacity: int = 100000,
+                 floor: float = 0.01,
+                 tolerance: float = 0.05,
+                 clock: Callable[[], float] = time.monotonic, ):
+        super().__init__(threshold)
+        if half_life <= 0:
+            raise ValueError(f'The half life must be positive, but got {half_life}')
+        if capacity < 1:
+            raise ValueError(f'The capacity must be positive, but got {capacity}')
+
+        self.half_life = half_life
+        self.capacity = capacity
+        self.floor = floor
+        self.tolerance = tolerance
+        self.clock = clock
+        self._decay_rate = math.log(2) / half_life
+
+        # Each item is mapped to its counter value and the moment that value was recorded.
+        self.item_map: dict[Any, tuple[float, float]] = {}
+
+    def _decayed(self, value: float, timestamp: float, now: float) -> float:
+        return value * math.exp(-self._decay_rate * max(0.0, now - timestamp))
+
+    def estimate(self, item: Any) -> float:
+        if item not in self.item_map:
+            return 0.0
+        return self._decayed(*self.item_map[item], now=self.clock())
+
+    def _accumulate(self, item: Any) -> float:
+        now = self.clock()
+        value, timestamp = self.item_map.get(item, (0.0, now))
+        count = self._decayed(value, timestamp, now) + 1
+        self.item_map[item] = (count, now)
+        if len(self.item_map) > self.capacity:
+            self._evict(now, keep=item)
+        return count + self.tolerance
+
+    def _reset(self, item: Any):
+        self.item_map.pop(item, None)
+
+    def _evict(self, now: float, keep: Any):
+        # The item that has just been updated is never evicted.
+        decayed = {item: self._decayed(value, timestamp, now) for item, (value, timestamp) in self.item_map.items()
+                   if item != keep}
+        for item, value in decayed.items():
+            if value < self.floor:
+                del self.item_map[item]
+        # Evict in bulk (a tenth of the capacity) to amortize the cost of a full scan.
+        overflow = len(self.item_map) - self.capacity
+        if overflow > 0:
+            overflow = max(overflow, self.capacity // 10)
+            for item in sorted(self.item_map.keys() - {keep}, key=decayed.__getitem__)[:overflow]:
+                del self.item_map[item]
+
+
+if __name__ == '__main__':
+
+    test_cases = ['1:1:1', "1:1:1, 2:2:2", "3:3:3, 4:4:4", "4:4:4, 5:5:5"]
+
+    analyzer = DecayAccumulationAnalyzer(threshold=2, half_life=60)
+
+    for test_case in test_cases:
+        print(analyzer.update(*test_case.split(", ")))
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Iterable, NamedTuple
+
+from logger import logger
+from rule import Rule
+
+
+class Outcome(NamedTuple):
+    """
+    The outcome of a rule across campaigns.
+    """
+    tested: int = 0
+    # The number of tests that yielded a discrepancy, and the number of times the rule was confirmed as flawed
+    # by the accumulation analyzer.
+    discrepancies: int = 0
+    confirmed: int = 0
+    last_tested: float | None = None
+
+    @property
+    def flakiness(self) -> float:
+        return self.discrepancies / self.tested if self.tested else 0.0
+
+    def __add__(self, other: 'Outcome') -> 'Outcome':
+        last_tested = max((t for t in (self.last_tested, other.last_tested) if t is not None), default=None)
+        return Outcome(self.tested + other.tested, self.discrepancies + other.discrepancies,
+                       self.confirmed + other.confirmed, last_tested)
+
+
+class KnowledgeBase:
+    """
+    A persistent store of the outcomes of the rules across fuzzing campaigns, so that a campaign does not
+    start from zero and re-test the rules whose text and outcome have not changed since the last one.
+
+    Outcomes are keyed by the SHA-256 digest of the rule text (so a modified rule starts over), by the
+    mutator and by the set of NIDS versions under test, and record how often each rule has been tested,
+    how often it yielded a discrepancy and was confirmed as flawed, and when it was tested last. The
+    selectors warm-start from it, e.g., by excluding the rules verified consistent `n` times (see
+    `verified`), or by priming the arms of the adaptive selection (see `GenericSelector.warm_start`).
+
+    Only the outcomes recorded since the last `store` are added to the stored ones, so that several
+    fuzzing workers can share the same directory.
+
+    Usage:
+    --------
+    >>> knowledge = KnowledgeBase('~/.cache/nidsfuzz', mutator='PassThroughMutator', versions=['snort3', 'suricata7'])
+    >>> knowledge.test(*rules)
+    >>> knowledge.discrepancy(*rules, confirmed=flawed_rules)  # e.g., the output of `AccumulationAnalyzer.update`
+    >>> knowledge.verified(ruleset.activated_rules, times=3)  # the rules tested consistent 3 times, never flawed
+    >>> knowledge.store()
+    """
+
+    # Bump this version whenever the layout of the entries changes.
+    VERSION = 1
+
+    def __init__(self,
+                 knowledge_dir: str,
+                 mutator: str,
+                 versions: Iterable[str],
+                 clock: Callable[[], float] = time.time, ):
+        self.mutator = mutator
+        self.versions = sorted(set(versions))
+        self.clock = clock
+
+        self.outcomes: dict[str, Outcome] = {}
+        # The outcomes recorded since the last `store`.
+        self._pending: dict[str, Outcome] = {}
+
+        knowledge_dir = Path(knowledge_dir).expanduser()
+        knowledge_dir.mkdir(parents=True, exist_ok=True)
+        versions_digest = hashlib.sha256(repr(self.versions).encode('utf-8')).hexdigest()
+        self.entry = knowledge_dir / f'knowledge-{mutator}-{versions_digest[:16]}-v{self.VERSION}.json'
+        self.outcomes.update(self.load())
+
+    def __len__(self) -> int:
+        return len(self.outcomes)
+
+    def __str__(self) -> str:
+        flaky_num = sum(outcome.discrepancies > 0 for outcome in self.outcomes.values())
+        return f'Known rules: {len(self)}, Flaky rules: {flaky_num}'
+
+    def __repr__(self) -> str:
+        return str(self)
+
+    @staticmethod
+    def digest(rule: Rule) -> str:
+        return hashlib.sha256(rule.key.encode('utf-8')).hexdigest()
+
+    def outcome(self, rule: Rule) -> Outcome:
+        return self.outcomes.get(self.digest(rule), Outcome())
+
+    def _record(self, rule: Rule, outcome: Outcome):
+        digest = self.digest(rule)
+        self.outcomes[digest] = self.outcomes.get(digest, Outcome()) + outcome
+        self._pending[digest] = self._pending.get(digest, Outcome()) + outcome
+
+    def test(self, *rules: Rule):
+        """
+        Record a test of the given rules (usually the seed rules of a batch of test packets).
+        """
+        outcome = Outcome(tested=1, last_tested=self.clock())
+        for rule in rules:
+            self._record(rule, outcome)
+
+    def discrepancy(self, *rules: Rule, confirmed: Iterable[Rule] = ()):
+        """
+        Record a discrepancy of the given rules (the seed rules of a tested batch), and the rules confirmed
+        as flawed among them.
+        """
+        confirmed = set(confirmed)
+        for rule in rules:
+            self._record(rule, Outcome(discrepancies=1, confirmed=int(rule in confirmed)))
+
+    def verified(self, rules: Iterable[Rule], times: int) -> list[Rule]:
+        """
+        return the given rules that have been tested at least `times` times without any discrepancy.
+        """
+        return [rule for rule in rules
+                if (outcome := self.outcome(rule)).tested >= times and outcome.discrepancies == 0]
+
+    def load(self) -> dict[str, Outcome]:
+        if not self.entry.exists():
+            return {}
+        try:
+            with self.entry.open('r', encoding='utf-8') as f:
+                return {digest: Outcome(*outcome) for digest, outcome in json.load(f).items()}
+        except Exception as e:
+            logger.warning(f'Discarding the corrupted knowledge base [{self.entry}]: {e}')
+            self.entry.unlink(missing_ok=True)
+            return {}
+
+    def store(self):
+        """
+        Add the outcomes recorded since the last store to the stored ones atomically.
+        """
+        if not self._pending:
+            return
+        outcomes = self.load()
+        for digest, outcome in self._pending.items():
+            outcomes[digest] = outcomes.get(digest, Outcome()) + outcome
+        fd, temp_path = tempfile.mkstemp(dir=self.entry.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(outcomes, f)
+            os.replace(temp_path, self.entry)
+        except Exception:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+        self.outcomes.update(outcomes)
+        self._pending = {}
@@ -0,0 +1,86 @@
+import math
+from typing import Any
+
+from commons.AccumulationAnalyzer import AccumulationAnalyzer
+
+
+class SketchAccumulationAnalyzer(AccumulationAnalyzer):
+    """
+    An accumulation analyzer backed by a count-min sketch, so that its memory
+    footprint is fixed (`depth` x `width` counters) no matter how many distinct
+    items are reported during an unbounded fuzzing campaign.
+
+    The sketch never underestimates a count. With `width = ceil(e / epsilon)` and
+    `depth = ceil(ln(1 / delta))`, an estimate exceeds the true count by more than
+    `epsilon * N` (N being the total number of updates) with probability at most `delta`.
+    Conservative updates are used to further reduce the overestimation.
+
+    Since the counters of a conservative sketch are not the sums of the counts
+    of their items, a burst item is not subtracted from the counters, which
+    would drive the items sharing them below their true counts. Instead, the
+    estimate of the item at its burst is kept as its offset, in a bounded map of
+    the `capacity` latest burst items. An item whose offset has been dropped is
+    overestimated (by the count before its last burst), but never underestimated.
+
+    @see https://en.wikipedia.org/wiki/Count%E2%80%93min_sketch
+
+    Usage:
+    --------
+    >>> analyzer = SketchAccumulationAnalyzer(threshold=2, width=1024, depth=4)
+    >>> analyzer.update('1:1:1')  # []
+    >>> analyzer.update('1:1:1', '2:2:2')  # ['1:1:1']
+    """
+
+    def __init__(self, threshold: int = 1, width: int = 2048, depth: int = 4, capacity: int = 100000):
+        super().__init__(threshold)
+        if width < 1 or depth < 1:
+            raise ValueError(f'The width and depth of the sketch must be positive, but got {width} x {depth}')
+
+        self.width = width
+        self.depth = depth
+        self.table: list[list[int]] = [[0] * width for _ in range(depth)]
+        self.capacity = capacity
+        # The estimates of the burst items at their bursts, in the order of the bursts.
+        self.offsets: dict[Any, int] = {}
+
+    @classmethod
+    def from_error_rate(cls, threshold: int = 1, epsilon: float = 0.001, delta: float = 0.01) -> 'SketchAccumulationAnalyzer':
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError(f'The epsilon and delta must be in (0, 1), but got {epsilon} and {delta}')
+        return cls(threshold=threshold, width=math.ceil(math.e / epsilon), depth=math.ceil(math.log(1 / delta)))
+
+    def _columns(self, item: Any) -> list[int]:
+        # Hash the item once, then derive one column per row from that digest.
+        digest = hash(item)
+        return [hash((row, digest)) % self.width for row in range(self.depth)]
+
+    def _count(self, item: Any) -> int:
+        return min(self.table[row][column] for row, column in enumerate(self._columns(item)))
+
+    def estimate(self, item: Any) -> float:
+        return self._count(item) - self.offsets.get(item, 0)
+
+    def _accumulate(self, item: Any) -> float:
+        columns = self._columns(item)
+        count = min(self.table[row][column] for row, column in enumerate(columns)) + 1
+        # Conservative update: only raise the counters that are below the new estimate.
+        for row, column in enumerate(columns):
+            if self.table[row][column] < count:
+                self.table[row][column] = count
+        return count - self.offsets.get(item, 0)
+
+    def _reset(self, item: Any):
+        self.offsets.pop(item, None)
+        self.offsets[item] = self._count(item)
+        if len(self.offsets) > self.capacity:
+            del self.offsets[next(iter(self.offsets))]
+
+
+if __name__ == '__main__':
+
+    test_cases = ['1:1:1', "1:1:1, 2:2:2", "3:3:3, 4:4:4", "4:4:4, 5:5:5"]
+
+    analyzer = SketchAccumulationAnalyzer(threshold=2, width=64, depth=4)
+
+    for test_case in test_cases:
+        print(analyzer.update(*test_case.split(", ")))
@@ -0,0 +1,85 @@
+from typing import Iterable, Iterator
+
+
+class Stream:
+    """
+    A test packet (or a field of it) whose bytes are produced lazily as a sequence of chunks, so that a very
+    large payload (e.g., a signature repeated a thousand times) is never held in memory as a whole.
+
+    A stream is a sequence of parts, each of them bytes or another stream, and is concatenated with bytes
+    and other streams like bytes are. The chunks are coalesced into at most `CHUNK_SIZE` bytes when iterated,
+    so that they are written (e.g., by `socket.sendall`) in as few calls as the packet in one piece. The
+    length of a stream is known before any chunk is produced.
+
+    Usage:
+    --------
+    >>> packet = b'GET / HTTP/1.1\\r\\n' + stream + b'\\r\\n'  # still a stream
+    >>> len(packet)
+    >>> for chunk in chunks(packet):  # the same for bytes and streams
+    >>>     sock.sendall(chunk)
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, parts: Iterable['bytes | Stream'] = ()):
+        self.parts: tuple[bytes | Stream, ...] = tuple(parts)
+        self.length = sum(len(part) for part in self.parts)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}(length={len(self)})'
+
+    def __add__(self, other: 'bytes | Stream') -> 'Stream':
+        if isinstance(other, (bytes, Stream)):
+            return Stream((self, other))
+        return NotImplemented
+
+    def __radd__(self, other: 'bytes | Stream') -> 'Stream':
+        if isinstance(other, (bytes, Stream)):
+            return Stream((other, self))
+        return NotImplemented
+
+    def __iter__(self) -> Iterator[bytes]:
+        buffer = bytearray()
+        for piece in self.pieces():
+            if len(piece) >= self.CHUNK_SIZE and not buffer:
+                yield piece
+                continue
+            buffer += piece
+            while len(buffer) >= self.CHUNK_SIZE:
+                yield bytes(buffer[:self.CHUNK_SIZE])
+                del buffer[:self.CHUNK_SIZE]
+        if buffer:
+            yield bytes(buffer)
+
+    def pieces(self) -> Iterator[bytes]:
+        """
+        return the bytes of the stream as they are produced, without coalescing them.
+        """
+        for part in self.parts:
+            if isinstance(part, Stream):
+                yield from part.pieces()
+            elif part:
+                yield part
+
+    def endswith(self, suffix: bytes) -> bool:
+        """
+        return whether the stream is known to end with the given suffix, without producing it.
+        """
+        for part in reversed(self.parts):
+            if len(part) == 0:
+                continue
+            if len(part) < len(suffix):
+                # The suffix spans several parts, which is not worth producing them for.
+                return False
+            return part.endswith(suffix)
+        return suffix == b''
+
+
+def chunks(packet: 'bytes | Stream') -> Iterable[bytes]:
+    """
+    return the chunks of the given packet, which is either bytes or a stream.
+    """
+    return (packet,) if isinstance(packet, (bytes, bytearray)) else packet
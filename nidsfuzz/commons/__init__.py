@@ -1,3 +1,8 @@
 
 from .PortAllocator import PortAllocator
-from .AccumulationAnalyzer import AccumulationAnalyzer
\ No newline at end of file
+from .AccumulationAnalyzer import AccumulationAnalyzer
+from .SketchAccumulationAnalyzer import SketchAccumulationAnalyzer
+from .DecayAccumulationAnalyzer import DecayAccumulationAnalyzer
+from .KnowledgeBase import KnowledgeBase, Outcome
+from .Stream import Stream, chunks
+from .Blob import Blob
\ No newline at end of file
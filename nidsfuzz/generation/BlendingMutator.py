@@ -1,14 +1,22 @@
-import exrex
-
 from logger import logger
 from generation.PassThroughMutator import PassThroughSignatureRender, DataChunk, PassThroughMutator
+from generation.PcreSampler import PcreSampleError
+from generation.PlanCache import PlanCache
 from rule import ByteTest, Content, Pcre, Isdataat, RuleSet, Rule, Option
 
 
 class BlendingSignatureRender(PassThroughSignatureRender):
 
     def push_bytetest(self, bytetest: ByteTest) -> bool:
-        return super().push_bytetest(bytetest)
+        # The length limits of the blended rules are merged, instead of being overridden by the latest one.
+        start_idx = (self.preceding_data_chunk_end_index if bytetest['relative'] else 0) + int(bytetest['offset'] or 0)
+        allowed_min_length = start_idx + int(bytetest['count'] or 0)
+        if allowed_min_length > self.max_length:
+            logger.debug(f"\tAdd signature failed: max_length [{self.max_length}] "
+                         f"conflicts with allowed_min_length [{allowed_min_length}].")
+            return False
+        self.min_length = max(self.min_length, allowed_min_length)
+        return True
 
     def query_available_positions(self, relative: bool = False) -> list[tuple[int, int]]:
         """
@@ -32,9 +40,9 @@ class BlendingSignatureRender(PassThroughSignatureRender):
         # Check `negated` modifier, `within` modifier ignored.
         if content['negated']:
             for byte in data:
-                if byte in self.padding_library:
+                if self.padding_bitmap >> byte & 1:
                     logger.debug(f"\tDelete character [{byte}] from padding library.")
-                    self.padding_library.remove(byte)
+                    self.padding_bitmap &= ~(1 << byte)
             return True
         # The first data chunk in the current buffer.
         elif len(self.data_chunks) == 0:
@@ -103,9 +111,9 @@ class BlendingSignatureRender(PassThroughSignatureRender):
             return True
 
         try:
-            data = exrex.getone(pcre['match']).encode("utf-8")
-        except:
-            logger.debug(f"\tGenerating data from regex failed [{pcre['match']}].")
+            data = self.PCRE_SAMPLER.sample(pcre)[0]
+        except PcreSampleError as e:
+            logger.debug(f"\tGenerating data from regex failed [{pcre['match']}]: {e}")
             return False
 
         if pcre['R']:
@@ -126,12 +134,29 @@ class BlendingSignatureRender(PassThroughSignatureRender):
         return True
 
     def push_isdataat(self, isdataat: Isdataat) -> bool:
-        return super().push_isdataat(isdataat)
+        # The same as `push_bytetest`, a limit looser than the ones of the preceding rules is satisfied already.
+        start_idx = self.preceding_data_chunk_end_index if isdataat['relative'] else 0
+        if isdataat['negated']:
+            allowed_max_length = isdataat['location'] + start_idx
+            if allowed_max_length < self.min_length:
+                logger.debug(f"\tAdd signature failed: min_length [{self.min_length}] "
+                             f"conflicts with allowed_max_length [{allowed_max_length}].")
+                return False
+            self.max_length = min(self.max_length, allowed_max_length)
+        else:
+            # isdataat:0 checks that there is at least one byte present after the current cursor location.
+            allowed_min_length = 1 + isdataat['location'] + start_idx
+            if allowed_min_length > self.max_length:
+                logger.debug(f"\tAdd signature failed: max_length [{self.max_length}] "
+                             f"conflicts with allowed_min_length [{allowed_min_length}].")
+                return False
+            self.min_length = max(self.min_length, allowed_min_length)
+        return True
 
 class BlendingMutator(PassThroughMutator):
 
-    def __init__(self, ruleset: RuleSet):
-        super().__init__(ruleset)
+    def __init__(self, ruleset: RuleSet, plans: PlanCache = None):
+        super().__init__(ruleset, plans)
 
         logger.info(f'Blending mutator initialized.')
 
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Iterable
+
+from logger import logger
+from rule import Rule, Proto
+from generation.PassThroughMutator import PassThroughMutator
+
+
+class GeneratabilityCache:
+    """
+    Remembers which rules a mutator cannot generate test packets from, and why, so that the selectors
+    keep these rules out of their pools (see `GenericSelector.exclude`) instead of selecting them again.
+
+    The cache is filled by a static pre-pass (see `precheck` and `PassThroughMutator.check`), which finds
+    invalid signatures, unsatisfiable flowbits, unsupported options and conflicting offsets, and by the
+    failures of single-rule batches at runtime (see `record`). Since some mutators are randomized, a rule
+    that passes the pre-pass only fails for good once it has failed `max_failures` times at runtime.
+
+    Outcomes are keyed by the SHA-256 digest of the rule text and by the mutator, and may be persisted in
+    a cache directory (usually the one of `RuleSetCache`), so that the next campaign skips the pre-pass.
+
+    Usage:
+    --------
+    >>> cache = GeneratabilityCache(PassThroughMutator(ruleset), cache_dir='~/.cache/nidsfuzz')
+    >>> selector.exclude(*cache.precheck(selector.ruleset, proto='http'))
+    >>> cache.record(rule, reason='Orchestration failed.')  # True if the rule fails for good
+    >>> cache.report()  # the number of failed rules by reason
+    >>> cache.store()
+    """
+
+    # Bump this version whenever the checks of the mutators change.
+    VERSION = 2
+
+    def __init__(self, mutator: PassThroughMutator, cache_dir: str = None, max_failures: int = 3):
+        if max_failures < 1:
+            raise ValueError(f'max_failures must be positive, but got {max_failures}')
+
+        self.mutator = mutator
+        self.name = type(mutator).__name__
+        self.max_failures = max_failures
+
+        # The reason why each rule (keyed by its digest) fails for good, or None if it passes the pre-pass.
+        self.outcomes: dict[str, str | None] = {}
+        # The runtime failures of the rules that pass the pre-pass.
+        self.failures: Counter[str] = Counter()
+
+        self.entry: Path | None = None
+        if cache_dir is not None:
+            cache_dir = Path(cache_dir).expanduser()
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            self.entry = cache_dir / f'generatability-{self.name}-v{self.VERSION}.json'
+            self.outcomes.update(self.load())
+
+    def __len__(self) -> int:
+        return sum(reason is not None for reason in self.outcomes.values())
+
+    def __str__(self) -> str:
+        return f'Checked rules: {len(self.outcomes)}, Failed rules: {len(self)}'
+
+    def __repr__(self) -> str:
+        return str(self)
+
+    @staticmethod
+    def digest(rule: Rule) -> str:
+        return hashlib.sha256(rule.key.encode('utf-8')).hexdigest()
+
+    def reason(self, rule: Rule) -> str | None:
+        """
+        return the reason why the rule fails for good, or None if it does not (or has not been checked).
+        """
+        return self.outcomes.get(self.digest(rule))
+
+    def check(self, rule: Rule, proto: str = None) -> str | None:
+        """
+        Check the rule statically, unless it has been checked before.
+        :return:
+            The reason why the generation fails, or None if it does not.
+        """
+        digest = self.digest(rule)
+        if digest not in self.outcomes:
+            proto = proto or next((service for service in rule.services if service in Proto.all()), None)
+            self.outcomes[digest] = self.mutator.check(rule, proto=proto) if proto is not None else None
+        return self.outcomes[digest]
+
+    def precheck(self, rules: Iterable[Rule], proto: str = None) -> list[Rule]:
+        """
+        Check the given rules statically (see `check`), under the given protocol or else under the first
+        supported service of each rule.
+        :return:
+            The rules that cannot be generated.
+        """
+        # The pre-pass orchestrates every rule, whose debug messages would dominate its time.
+        logger.disable('generation')
+        try:
+            return [rule for rule in rules if self.check(rule, proto) is not None]
+        finally:
+            logger.enable('generation')
+
+    def record(self, rule: Rule, reason: str) -> bool:
+        """
+        Record a runtime failure of a single-rule batch.
+        :return:
+            Whether the rule fails for good from now on.
+        """
+        digest = self.digest(rule)
+        if self.outcomes.get(digest) is not None:
+            return True
+        self.failures[digest] += 1
+        if self.failures[digest] >= self.max_failures:
+            self.outcomes[digest] = reason
+            return True
+        return False
+
+    def report(self, rules: Iterable[Rule] = None) -> Counter[str]:
+        """
+        return the number of rules (all checked rules by default) that fail for good by the kind of reason,
+        i.e., the part of the reason before any details.
+        """
+        reasons = self.outcomes.values() if rules is None else [self.reason(rule) for rule in rules]
+        return Counter(reason.split(':')[0].rstrip('.') for reason in reasons if reason is not None)
+
+    def load(self) -> dict[str, str | None]:
+        if self.entry is None or not self.entry.exists():
+            return {}
+        try:
+            with self.entry.open('r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f'Discarding the corrupted cache entry [{self.entry}]: {e}')
+            self.entry.unlink(missing_ok=True)
+            return {}
+
+    def store(self):
+        """
+        Write the outcomes into the cache directory atomically, merged with the ones stored by other workers.
+        """
+        if self.entry is None:
+            return
+        outcomes = self.load()
+        for digest, reason in self.outcomes.items():
+            if reason is not None or digest not in outcomes:
+                outcomes[digest] = reason
+        fd, temp_path = tempfile.mkstemp(dir=self.entry.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(outcomes, f)
+            os.replace(temp_path, self.entry)
+        except Exception:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
@@ -0,0 +1,123 @@
+import os
+import random
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TYPE_CHECKING, Iterable, Iterator, Sequence
+
+from logger import logger
+from rule import Rule
+
+if TYPE_CHECKING:
+    from generation.PassThroughMutator import PassThroughMutator
+
+
+class GenerationPool:
+    """
+    A pool of worker processes that generate the test packets of many rule batches at once, since
+    generation is pure Python and bound to the GIL.
+
+    Each worker is initialized once with the mutator (and so its rule set and configuration), and then
+    only receives the protocol and the rule IDs of a batch, which it looks up in its rule set, and sends
+    back the generated packets and the reason returned by `PassThroughMutator.generate`. Workers reseed
+    their random generators, since forked workers would otherwise draw the same padding and samples.
+
+    Results are yielded in the order of the batches, while at most `backlog` batches are generated ahead,
+    so the batches may be drawn lazily from a selector. Batches are sent to the workers in chunks of
+    `chunksize`, which saves the round trips of many small batches. Workers keep their own generation plans, and do
+    not see the rule set changes made after the pool is started (e.g., by `RuleSet.reload`).
+
+    Usage:
+    --------
+    >>> with GenerationPool(mutator, workers=8) as pool:
+    >>>     for packets, reason in pool.generate_many(batches):  # batches of (proto, rules), e.g., from a selector
+    >>>         ...
+    """
+
+    def __init__(self, mutator: 'PassThroughMutator', workers: int = None, backlog: int = None, chunksize: int = 1):
+        workers = workers if workers is not None else os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError(f'workers must be positive, but got {workers}')
+        if chunksize < 1:
+            raise ValueError(f'chunksize must be positive, but got {chunksize}')
+        backlog = backlog if backlog is not None else 2 * workers * chunksize
+        if backlog < chunksize:
+            raise ValueError(f'backlog must be at least the chunksize [{chunksize}], but got {backlog}')
+
+        self.mutator = mutator
+        self.workers = workers
+        self.backlog = backlog
+        self.chunksize = chunksize
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_initialize, initargs=(mutator,))
+
+        logger.info(f'Generation pool initialized with {workers} workers.')
+
+    def __enter__(self) -> 'GenerationPool':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def generate_many(self,
+                      batches: Iterable[tuple[str, Sequence[Rule]]]) -> Iterator[tuple[list[tuple[bytes, bytes]], str]]:
+        """
+        Generate the test packets of the given batches of (protocol, rules) in the worker processes.
+        :return: The test packets of each batch and the reason returned by `generate`, in the order of the batches.
+        """
+        pending: deque[Future] = deque()
+        batches = iter(batches)
+        chunk = []
+        while True:
+            for proto, rules in batches:
+                chunk.append((proto, [rule.id for rule in rules]))
+                if len(chunk) == self.chunksize:
+                    pending.append(self.executor.submit(_generate, chunk))
+                    chunk = []
+                    if len(pending) * self.chunksize >= self.backlog:
+                        break
+            else:
+                # The batches run out, so the last chunk is sent as it is.
+                if chunk:
+                    pending.append(self.executor.submit(_generate, chunk))
+                    chunk = []
+            if not pending:
+                return
+            for requests, responses, reason in pending.popleft().result():
+                yield list(zip(requests, responses)), reason
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+# The mutator of the current worker process.
+_mutator: 'PassThroughMutator | None' = None
+
+
+def _initialize(mutator: 'PassThroughMutator'):
+    global _mutator
+    _mutator = mutator
+    random.seed()
+
+
+def _generate(chunk: list[tuple[str, list[str]]]) -> list[tuple[list[bytes], list[bytes], str]]:
+    return [_generate_batch(proto, rule_ids) for proto, rule_ids in chunk]
+
+
+def _generate_batch(proto: str, rule_ids: list[str]) -> tuple[list[bytes], list[bytes], str]:
+    rules = [_mutator.rule_pool.find_rule(rule_id) for rule_id in rule_ids]
+    if None in rules:
+        return [], [], f'Unknown rules: {[rule_id for rule_id, rule in zip(rule_ids, rules) if rule is None]}'
+    try:
+        for rule in rules:
+            _ = rule.signature
+    except Exception as e:
+        return [], [], f'Invalid signature: {e}'
+
+    requests, responses = [], []
+    generator = _mutator.generate(*rules, proto=proto)
+    while True:
+        try:
+            request, response = next(generator)
+        except StopIteration as result:
+            return requests, responses, result.value
+        requests.append(request)
+        responses.append(response)
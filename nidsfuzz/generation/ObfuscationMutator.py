@@ -3,6 +3,7 @@ import random
 
 from logger import logger
 from generation.PassThroughMutator import PassThroughSignatureRender, PassThroughMutator
+from generation.PlanCache import PlanCache
 from generation.obfs import UrlEncoding, PathShifting
 from rule import Content, Pcre, Isdataat, ByteTest, Option, RuleSet, Proto, ProtoType, Rule
 
@@ -79,12 +80,16 @@ class ObfuscationSignatureRender(PassThroughSignatureRender):
 
 class ObfuscationMutator(PassThroughMutator):
 
+    # The signatures are obfuscated anew for every test case.
+    DETERMINISTIC = False
+
     def __init__(self, ruleset: RuleSet,
                  replace_times: int = 10,
                  insert_times: int = 3,
                  min_obfuscate_times: int = 1,
-                 max_obfuscate_times: int = 50, ):
-        super().__init__(ruleset)
+                 max_obfuscate_times: int = 50,
+                 plans: PlanCache = None, ):
+        super().__init__(ruleset, plans)
         if min_obfuscate_times > max_obfuscate_times:
             logger.error(
                 f'The minimum obfuscation times [{min_obfuscate_times}] must be smaller than the maximum obfuscation times [{max_obfuscate_times}].')
@@ -1,16 +1,44 @@
 import abc
+import functools
 import math
 import random
-from typing import Generator
-
-import exrex
+from typing import Generator, Iterable, Iterator, NamedTuple, Sequence
 
 from logger import logger
+from commons.Stream import Stream
 from generation.UserBytes import UserBytes
+from generation.GenerationPool import GenerationPool
+from generation.PcreSampler import PcreSampler, PcreSampleError
+from generation.PlanCache import PlanCache
 from generation.grammars import load_grammar
 from rule import StickyBuffer, Proto, ProtoType, Option, Content, Pcre, Isdataat, ByteTest, RuleSet, Rule
 
 
+def bitmap(chars: Iterable[int]) -> int:
+    """
+    return the bitmap of the given bytes, whose n-th bit is set if byte n is present.
+    """
+    return sum(1 << char for char in set(chars))
+
+
+# all printable characters [32-126], and part of control characters [10, 13, 9]
+TEXT_PADDING = bitmap([char for char in range(ord(' '), ord('~') + 1)] + [ord('\n'), ord('\r'), ord('\t')])
+BIN_PADDING = bitmap(range(256))  # 0 - 255
+# The padding of a buffer whose padding bytes are all excluded.
+PRINTABLE_PADDING = bitmap(range(ord(' '), ord('~') + 1))
+
+
+@functools.lru_cache(maxsize=1024)
+def padding_table(padding_bitmap: int) -> tuple[bytes, bytes]:
+    """
+    return the table that translates random bytes into the padding bytes of the given bitmap, and the random
+    bytes to be rejected beforehand, so that every padding byte is drawn with the same probability.
+    """
+    padding = bytes(char for char in range(256) if padding_bitmap >> char & 1)
+    accepted = 256 - 256 % len(padding)
+    return bytes(padding[char % len(padding)] for char in range(256)), bytes(range(accepted, 256))
+
+
 class DataChunk(UserBytes):
 
     def __init__(self, index: int, data: bytes):
@@ -19,7 +47,25 @@ class DataChunk(UserBytes):
         self.index = index
 
 
+class GenerationPlan(NamedTuple):
+    """
+    A rule batch compiled by a mutator for a protocol, i.e., the work of `PassThroughMutator.generate`
+    that does not change between test cases.
+    """
+    proto: str
+    # The flowbits checked by the rules, whose setters are passed through first.
+    flowbits: tuple[str, ...]
+    # The layout of each sticky buffer: a frozen render with fixed data chunks, padding gaps and length bounds,
+    # or the options of a buffer with randomized slots (e.g., PCRE samples), which are orchestrated per test case.
+    layouts: tuple[tuple[str, 'PassThroughSignatureRender | tuple[Option, ...]'], ...]
+    # The reason why the rules cannot be orchestrated, if they cannot.
+    reason: str | None = None
+
+
 class PassThroughSignatureRender:
+    PCRE_SAMPLER = PcreSampler()
+    # The buffers longer than this are produced lazily as streams, see `stream`.
+    STREAM_THRESHOLD = 64 * 1024
 
     def __init__(self, sticky_buffer: str, proto: str):
         if sticky_buffer not in StickyBuffer.all():
@@ -29,12 +75,11 @@ class PassThroughSignatureRender:
 
         self.proto = Proto.lookup(proto.lower())
 
+        # The bitmap of the bytes allowed in the padding (see `bitmap`).
         if self.proto.type == ProtoType.TEXT:
-            # all printable characters [32-126], and part of control characters [10, 13, 9]
-            self.padding_library: list[int] = [char for char in range(ord(' '), ord('~') + 1)] + [ord('\n'), ord('\r'),
-                                                                                                  ord('\t')]
+            self.padding_bitmap: int = TEXT_PADDING
         elif self.proto.type == ProtoType.BIN:
-            self.padding_library: list[int] = list(range(256))  # 0 - 255
+            self.padding_bitmap: int = BIN_PADDING
         else:
             raise ValueError(f"Unsupported protocol: {proto}")
 
@@ -45,16 +90,18 @@ class PassThroughSignatureRender:
         self.global_pcre_data: list[bytes] = []
         self.preceding_data_chunk_end_index = 0
 
-    def generate_padding(self, padding_length: int) -> bytes:
-        padding = b""
+    def generate_padding(self, padding_length: int, rng: random.Random = None) -> bytes:
         if padding_length <= 0:
-            return padding
-        else:
-            if len(self.padding_library) == 0:
-                padding = bytes(random.choices([char for char in range(ord(' '), ord('~') + 1)], k=padding_length))
-            else:
-                padding = bytes(random.choices(self.padding_library, k=padding_length))
-        return padding
+            return b""
+        randbytes = rng.randbytes if rng is not None else random.randbytes
+        table, rejected = padding_table(self.padding_bitmap or PRINTABLE_PADDING)
+        # Random bytes are translated into padding bytes in bulk, drawing enough of them to make up for the
+        # rejected ones on average (at most half of them are rejected).
+        draws = padding_length * 256 // (256 - len(rejected)) + len(rejected)
+        padding = randbytes(draws).translate(table, rejected)
+        while len(padding) < padding_length:
+            padding += randbytes(draws).translate(table, rejected)
+        return padding[:padding_length]
 
     def orchestrate(self, rule_options: list[Option]) -> bool:
         for option in rule_options:
@@ -76,34 +123,63 @@ class PassThroughSignatureRender:
                 return False
         return True
 
+    def freeze(self) -> 'PassThroughSignatureRender':
+        """
+        Make the orchestrated layout immutable, so that it can be rendered by every instance of a generation plan.
+        """
+        self.data_chunks = tuple(self.data_chunks)
+        self.global_pcre_data = tuple(self.global_pcre_data)
+        return self
+
     def render(self, only_global_pcre: bool = False) -> bytes:
         if only_global_pcre and len(self.global_pcre_data) != 0:
             return b"".join(self.global_pcre_data)
 
-        result = b""
+        return self._render(*self.layout())
+
+    def stream(self) -> 'bytes | RenderedStream':
+        """
+        Render the buffer, unless it is longer than `STREAM_THRESHOLD`, in which case it is produced lazily in
+        chunks (see `RenderedStream`), so that a very large buffer is never held in memory as a whole.
+        """
+        starts, length = self.layout()
+        if length <= self.STREAM_THRESHOLD:
+            return self._render(starts, length)
+        return RenderedStream(self, starts, length, seed=random.getrandbits(64))
+
+    def _render(self, starts: list[int], length: int) -> bytes:
+        # The buffer is padded in one shot, and the data chunks are written over the padding.
+        result = bytearray(self.generate_padding(length))
+        for start, data_chunk in zip(starts, self.data_chunks):
+            result[start:start + len(data_chunk.data)] = data_chunk.data
+        return bytes(result)
+
+    def layout(self) -> tuple[list[int], int]:
+        """
+        return the start of each data chunk and the length of the buffer, drawn once per rendering.
+        """
+        # The data chunks are laid out first, where a chunk overlapping the preceding one follows it.
+        starts, length = [], 0
         for data_chunk in self.data_chunks:
-            index, data = data_chunk.index, data_chunk.data
-            result = result + self.generate_padding(index - len(result)) + data
+            starts.append(max(data_chunk.index, length))
+            length = starts[-1] + len(data_chunk.data)
 
         if self.max_length == math.inf:
-            if len(result) < self.min_length:
-                result += self.generate_padding(self.min_length - len(result))
+            if length < self.min_length:
+                length = self.min_length
         else:
-            if len(result) < self.min_length:
-                result += self.generate_padding(random.randint(self.min_length, self.max_length) - len(result))
-            if len(result) > self.max_length:
+            if length < self.min_length:
+                length = random.randint(self.min_length, self.max_length)
+            if length > self.max_length:
                 logger.warning(
-                    f"The rendered value [{len(result)}] exceeds the maximum allowed length of [{self.max_length}].]")
-
-        return result
+                    f"The rendered value [{length}] exceeds the maximum allowed length of [{self.max_length}].]")
+        return starts, length
 
     def push_content(self, content: Content) -> bool:
         data = content.bytes_matches
         # scenario 1: negated characters should not be present in the padding library.
         if content['negated']:
-            for byte in data:
-                if byte in self.padding_library:
-                    self.padding_library.remove(byte)
+            self.padding_bitmap &= ~bitmap(data)
             return True
         # scenario 2: the default placement strategy for the content option is relative
         elif not content["offset"] and not content["depth"] and not content["distance"] and not content["within"]:
@@ -129,16 +205,17 @@ class PassThroughSignatureRender:
         return False
 
     def push_pcre(self, pcre: Pcre) -> bool:
+        if pcre['negated']:
+            return True
+
         try:
-            data = exrex.getone(pcre['match']).encode("utf-8")
-        except Exception as e:
-            logger.error(f'{e}')
+            data = self.PCRE_SAMPLER.sample(pcre)[0]
+        except PcreSampleError as e:
+            logger.debug(f"\tGenerating data from regex failed [{pcre['match']}]: {e}")
             return False
 
-        if pcre['negated']:
-            return True
         # the default placement strategy for the pcre option is absolute
-        elif pcre['R']:
+        if pcre['R']:
             start_idx = self.preceding_data_chunk_end_index
             self.data_chunks.append(DataChunk(start_idx, data))
             self.preceding_data_chunk_end_index = start_idx + len(data)
@@ -192,50 +269,189 @@ class PassThroughSignatureRender:
             return False
         return True
 
+class RenderedStream(Stream):
+    """
+    A buffer rendered lazily, one chunk of padding or data after another. The padding is drawn from a generator
+    seeded once, so the stream produces the same bytes whenever it is read, e.g., as a field of both the request
+    and the response.
+    """
+
+    def __init__(self, render: PassThroughSignatureRender, starts: list[int], length: int, seed: int):
+        super().__init__()
+        self.render = render
+        self.starts = tuple(starts)
+        self.length = length
+        self.seed = seed
+
+    def pieces(self) -> Generator[bytes, None, None]:
+        rng = random.Random(self.seed)
+        position = 0
+        for start, data_chunk in zip(self.starts, self.render.data_chunks):
+            yield from self._padding(start - position, rng)
+            yield data_chunk.data
+            position = start + len(data_chunk.data)
+        yield from self._padding(self.length - position, rng)
+
+    def _padding(self, padding_length: int, rng: random.Random) -> Generator[bytes, None, None]:
+        for offset in range(0, padding_length, self.CHUNK_SIZE):
+            yield self.render.generate_padding(min(self.CHUNK_SIZE, padding_length - offset), rng)
+
+    def endswith(self, suffix: bytes) -> bool:
+        # The trailing padding is random, so only a buffer that ends with a data chunk is known to end with it.
+        if not self.starts or self.starts[-1] + len(self.render.data_chunks[-1].data) != self.length:
+            return False
+        return len(suffix) <= len(self.render.data_chunks[-1].data) and \
+            self.render.data_chunks[-1].data.endswith(suffix)
+
+
 class PassThroughMutator:
 
-    def __init__(self, ruleset: RuleSet):
+    # The values returned by `generate` once the test packets have been generated,
+    # and if the batch does not suit the mutator (e.g., the number of rules).
+    FINISHED = "Generation normally finished."
+    REJECTED = "Rules check failed."
+
+    # Whether the signatures are mutated and orchestrated the same way for every test case (apart from the
+    # padding and the PCRE samples), so that the generation plans can be cached, see `compile`.
+    DETERMINISTIC = True
+
+    def __init__(self, ruleset: RuleSet, plans: PlanCache = None):
         self.rule_pool = ruleset
+        self.plans = plans if plans is not None else PlanCache()
+        # The prerequisite packets are generated by passing the flowbit setters through, whatever the mutator.
+        self._prerequisite_mutator = self if type(self) is PassThroughMutator else None
 
         logger.info(f'Pass-through mutator initialized.')
 
+    @property
+    def prerequisite_mutator(self) -> 'PassThroughMutator':
+        if self._prerequisite_mutator is None:
+            self._prerequisite_mutator = PassThroughMutator(ruleset=self.rule_pool, plans=self.plans)
+        return self._prerequisite_mutator
+
     def generate(self, *rules: Rule, proto: str) -> Generator[tuple[bytes, bytes], None, str]:
         # Step 1: Check whether the received rules meet the requirements
         if not self.is_valid(*rules, proto=proto):
-            return "Rules check failed."
+            return self.REJECTED
+
+        # Step 2 - 5: Instantiate the generation plan of the rules
+        return (yield from self.instantiate(self.compile(*rules, proto=proto)))
+
+    def generate_many(self,
+                      batches: Iterable[tuple[str, Sequence[Rule]]],
+                      workers: int = None,
+                      chunksize: int = 1) -> Iterator[tuple[list[tuple[bytes, bytes]], str]]:
+        """
+        Generate the test packets of many batches of (protocol, rules), e.g., drawn from a selector, in a pool
+        of worker processes (see `GenerationPool`).
+        :return: The test packets of each batch and the reason returned by `generate`, in the order of the batches.
+        """
+        with GenerationPool(self, workers=workers, chunksize=chunksize) as pool:
+            yield from pool.generate_many(batches)
+
+    def compile(self, *rules: Rule, proto: str) -> GenerationPlan:
+        """
+        return the generation plan of the given rules, compiled once and then looked up in the plan cache,
+        unless the mutator is not deterministic.
+        """
+        if not self.DETERMINISTIC:
+            return self._compile(*rules, proto=proto)
+        key = self.plans.key(self, rules, proto)
+        plan = self.plans.get(key)
+        if plan is None:
+            plan = self._compile(*rules, proto=proto)
+            self.plans.put(key, plan)
+        return plan
+
+    def _compile(self, *rules: Rule, proto: str) -> GenerationPlan:
+        flowbits = tuple(RuleSet.from_rules(list(rules))._check_flowbits)
+
+        # Step 3: Extract the rule options and filter out redundant options
+        signatures: dict[str, list[Option]] = self.mutate_signatures(*rules)
+
+        # Step 4: Orchestrate the limits defined in the signatures, except for the randomized slots
+        layouts = []
+        for buffer, options in signatures.items():
+            if any(isinstance(option, Pcre) for option in options):
+                layouts.append((buffer, tuple(options)))
+                continue
+            logger.debug(f'Orchestrating limits for buffer: {buffer}')
+            buffer_render = self.render_signatures(sticky_buffer=buffer, proto=proto)
+            if not buffer_render.orchestrate(options):
+                logger.debug(f"Failed to orchestrate rules: {[rule.id for rule in rules]}")
+                return GenerationPlan(proto, flowbits, (), reason='Orchestration failed.')
+            layouts.append((buffer, buffer_render.freeze()))
+        return GenerationPlan(proto, flowbits, tuple(layouts))
 
+    def instantiate(self, plan: GenerationPlan) -> Generator[tuple[bytes, bytes], None, str]:
         # Step 2: Generate prerequisite packets to bring the connection into the desired state.
-        ruleset = RuleSet.from_rules(list(rules))
-        invalid_flowbits = ruleset._check_flowbits.keys() - self.rule_pool._set_flowbits.keys()
+        # The flowbit setters are looked up in the current rule pool, which may have been reloaded since the compilation.
+        invalid_flowbits = set(plan.flowbits) - self.rule_pool._set_flowbits.keys()
         if invalid_flowbits:
             logger.warning(f'Trying to use rules with invalid flowbits for generation: {invalid_flowbits}')
             return f'Trying to use rules with invalid flowbits for generation: {invalid_flowbits}'
 
-        for flowbit, _ in ruleset._check_flowbits.items():
+        for flowbit in plan.flowbits:
             prerequisite_rule = self.rule_pool._set_flowbits[flowbit][0]
-            pass_through = PassThroughMutator(ruleset=self.rule_pool)
-            yield from pass_through.generate(prerequisite_rule, proto=proto)
+            yield from self.prerequisite_mutator.generate(prerequisite_rule, proto=plan.proto)
 
-        # Step 3: Extract the rule options and filter out redundant options
-        signatures: dict[str, list[Option]] = self.mutate_signatures(*rules)
+        if plan.reason is not None:
+            return plan.reason
 
-        # Step 4: Orchestrate the limits defined in the signatures
+        # Step 4: Orchestrate the buffers with randomized slots
         buffer_renders: dict[str, PassThroughSignatureRender] = {}
-        for buffer, options in signatures.items():
+        for buffer, layout in plan.layouts:
+            if isinstance(layout, PassThroughSignatureRender):
+                buffer_renders[buffer] = layout
+                continue
             logger.debug(f'Orchestrating limits for buffer: {buffer}')
-            buffer_render = buffer_renders.setdefault(buffer, self.render_signatures(sticky_buffer=buffer,
-                                                                                     proto=proto))
-            if not buffer_render.orchestrate(options):
-                logger.debug(f"Failed to orchestrate rules: {[rule.id for rule in rules]}")
+            buffer_render = buffer_renders[buffer] = self.render_signatures(sticky_buffer=buffer, proto=plan.proto)
+            if not buffer_render.orchestrate(list(layout)):
+                logger.debug(f"Failed to orchestrate the randomized slots of buffer: {buffer}")
                 return 'Orchestration failed.'
 
         # Step 5: Generate the bidirectional test packets
-        grammar = load_grammar(proto)
-        part_fields = {buffer: render.render() for buffer, render in buffer_renders.items()}
+        grammar = load_grammar(plan.proto)
+        part_fields = {buffer: render.stream() for buffer, render in buffer_renders.items()}
         grammar.populate(part_fields)
         yield grammar.generate(pkt_type='REQUEST'), grammar.generate(pkt_type='RESPONSE')
 
-        return "Generation normally finished."
+        return self.FINISHED
+
+    def check(self, *rules: Rule, proto: str) -> str | None:
+        """
+        Check whether test packets can be generated from the given rules, by orchestrating their signatures
+        without generating any packet (i.e., Step 2 - 4 of `generate`).
+        :return:
+            The reason why the generation fails, or None if it does not.
+        """
+        try:
+            for rule in rules:
+                _ = rule.signature
+        except Exception as e:
+            return f'Invalid signature: {e}'
+
+        invalid_flowbits = RuleSet.from_rules(list(rules))._check_flowbits.keys() - self.rule_pool._set_flowbits.keys()
+        if invalid_flowbits:
+            return f'Unsatisfiable flowbits: {sorted(invalid_flowbits)}'
+
+        for buffer, options in self.mutate_signatures(*rules).items():
+            unsupported_options = {option.__class__.__name__ for option in options
+                                   if not isinstance(option, (Content, Pcre, Isdataat, ByteTest))}
+            if unsupported_options:
+                return f'Unsupported options: {sorted(unsupported_options)}'
+            try:
+                for option in options:
+                    if isinstance(option, Pcre) and not option['negated']:
+                        PassThroughSignatureRender.PCRE_SAMPLER.parse(option)
+            except PcreSampleError as e:
+                return f'Unsupported PCRE: {e}'
+            try:
+                if not self.render_signatures(sticky_buffer=buffer, proto=proto).orchestrate(options):
+                    return f'Orchestration failed in buffer: {buffer}'
+            except Exception as e:
+                return f'Orchestration failed in buffer: {buffer} ({e.__class__.__name__})'
+        return None
 
     @staticmethod
     def eliminate_redundant_options(options: list[Option]) -> list[Option]:
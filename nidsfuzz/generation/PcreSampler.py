@@ -0,0 +1,258 @@
+import functools
+import random
+import re
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+from rule import Pcre
+
+
+class PcreSampleError(ValueError):
+    """
+    Raised if a PCRE cannot be sampled, e.g., its syntax is not supported, or its shortest match exceeds
+    the maximum sample length.
+    """
+    pass
+
+
+# The characters drawn for the wildcards (e.g., `.` and negated classes), the same as the padding of text protocols.
+ALPHABET = ''.join(chr(char) for char in range(ord(' '), ord('~') + 1)) + '\n\r\t'
+BYTES = ''.join(chr(char) for char in range(256))
+
+CATEGORIES = {
+    sre_parse.CATEGORY_DIGIT: '0123456789',
+    sre_parse.CATEGORY_SPACE: ' \t\n\r\x0b\x0c',
+    sre_parse.CATEGORY_WORD: 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_',
+    sre_parse.CATEGORY_LINEBREAK: '\n',
+}
+for _category, _negated in [(sre_parse.CATEGORY_DIGIT, sre_parse.CATEGORY_NOT_DIGIT),
+                            (sre_parse.CATEGORY_SPACE, sre_parse.CATEGORY_NOT_SPACE),
+                            (sre_parse.CATEGORY_WORD, sre_parse.CATEGORY_NOT_WORD),
+                            (sre_parse.CATEGORY_LINEBREAK, sre_parse.CATEGORY_NOT_LINEBREAK)]:
+    CATEGORIES[_negated] = ''.join(char for char in ALPHABET if char not in CATEGORIES[_category])
+
+
+class PcreSampler:
+    """
+    Samples the strings matched by the PCRE options, instead of `exrex.getone`, which parses the regex
+    again on every call and may produce huge strings for nested unbounded repeats.
+
+    Each PCRE is parsed once (by the parser of the `re` module) into a compiled node tree, which is
+    cached. The samples are bounded by `max_length`: unbounded repeats (e.g., `*` or `{10,}`) repeat at
+    most `limit` times beyond their minimum, and every repeat and branch is drawn within the length
+    left for it, so that the rest of the pattern still fits. A PCRE whose shortest match is longer
+    than `max_length` cannot be sampled.
+
+    The flags of the PCRE are respected: `s` lets `.` draw newlines, `m` puts a newline before `^` and
+    after `$` so that they match wherever the sample is placed in the buffer, and `x` ignores the
+    whitespace of the pattern. The literals of a case-insensitive (`i`) PCRE are kept as they are,
+    which match under any case. Escaped bytes (e.g., `\\xff`) are sampled as raw bytes. Lookarounds are
+    left to the surrounding data, except a negative lookahead of one character, e.g., `(?!\\n)\\s`.
+
+    Usage:
+    --------
+    >>> sampler = PcreSampler(max_length=1024)
+    >>> sampler.sample(Pcre.from_string(r'"/^file\\x3a\\x2f\\x2f[^\\n]{400}/mi"'))  # [b'\\nfile://...']
+    >>> sampler.sample(pcre, k=10)  # 10 samples at once
+    """
+
+    def __init__(self, max_length: int = 4096, limit: int = 20, cache_size: int = 4096):
+        if max_length < 1:
+            raise ValueError(f'max_length must be positive, but got {max_length}')
+        if limit < 1:
+            raise ValueError(f'limit must be positive, but got {limit}')
+
+        self.max_length = max_length
+        self.limit = limit
+        self.compile = functools.lru_cache(maxsize=cache_size)(self._compile)
+
+    def parse(self, pcre: Pcre) -> tuple:
+        """
+        return the compiled node tree of the given PCRE option, which is cached.
+        :raise PcreSampleError: If the PCRE cannot be sampled.
+        """
+        if pcre['match'] is None:
+            raise PcreSampleError('Missing pattern')
+        return self.compile(pcre['match'], pcre['flags'] or '')
+
+    def sample(self, pcre: Pcre, k: int = 1) -> list[bytes]:
+        """
+        Sample k strings matched by the given PCRE option.
+        :raise PcreSampleError: If the PCRE cannot be sampled.
+        """
+        node = self.parse(pcre)
+        samples = []
+        for _ in range(k):
+            pieces = []
+            _sample(node, self.max_length, pieces, {})
+            samples.append(''.join(pieces).encode('latin-1'))
+        return samples
+
+    def _compile(self, pattern: str, flags: str) -> tuple:
+        try:
+            parsed = sre_parse.parse(pattern, re.VERBOSE if 'x' in flags else 0)
+        except (re.error, OverflowError, RecursionError) as e:
+            raise PcreSampleError(f'Unsupported syntax: {e}')
+        # Inline flags, e.g., `(?s)`, apply to the whole pattern.
+        dotall = 's' in flags or bool(parsed.state.flags & re.DOTALL)
+        multiline = 'm' in flags or bool(parsed.state.flags & re.MULTILINE)
+        node = self._compile_sequence(parsed, dotall, multiline)
+        if node[1] > self.max_length:
+            raise PcreSampleError(f'The shortest match [{node[1]}] exceeds the maximum length [{self.max_length}]')
+        return node
+
+    # Each node is a tuple of (kind, the length of its shortest match, *arguments).
+
+    def _compile_sequence(self, items, dotall: bool, multiline: bool) -> tuple:
+        nodes, excluded = [], ''
+        for op, av in items:
+            if op is sre_parse.ASSERT_NOT and av[0] == 1:
+                # A negative lookahead of one character (class) excludes it from the next one, e.g., `(?!\n)\s`.
+                lookahead = self._compile_sequence(av[1], dotall, multiline)[2]
+                if len(lookahead) == 1 and lookahead[0][0] in ('characters', 'text') and lookahead[0][1] == 1:
+                    excluded = lookahead[0][2]
+                    continue
+            node = self._compile_item(op, av, dotall, multiline)
+            if node is None:
+                continue
+            if excluded and node[0] == 'characters':
+                node = 'characters', 1, ''.join(char for char in node[2] if char not in excluded) or node[2]
+            excluded = ''
+            # Consecutive literals are merged into one text.
+            if node[0] == 'characters' and len(node[2]) == 1:
+                node = 'text', 1, node[2]
+            if node[0] == 'text' and nodes and nodes[-1][0] == 'text':
+                node = 'text', nodes[-1][1] + node[1], nodes.pop()[2] + node[2]
+            nodes.append(node)
+        # The shortest match of the nodes after each node, which the node must leave room for.
+        suffixes, length = [], 0
+        for node in reversed(nodes):
+            suffixes.append(length)
+            length += node[1]
+        return 'sequence', length, tuple(nodes), tuple(reversed(suffixes))
+
+    def _compile_item(self, op, av, dotall: bool, multiline: bool) -> tuple | None:
+        if op is sre_parse.LITERAL:
+            return 'characters', 1, _character(av)
+        elif op is sre_parse.NOT_LITERAL:
+            return 'characters', 1, _complement({chr(av)})
+        elif op is sre_parse.ANY:
+            return 'characters', 1, ALPHABET if dotall else ALPHABET.replace('\n', '')
+        elif op is sre_parse.IN:
+            return 'characters', 1, _class(av)
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, sre_parse.POSSESSIVE_REPEAT):
+            low, high, items = av
+            node = self._compile_sequence(items, dotall, multiline)
+            high = min(high, low + self.limit - 1)
+            if len(node[2]) == 1 and node[2][0][0] in ('characters', 'text') and node[2][0][1] == 1:
+                # A repeated character (class), e.g., `[^\n]{400}`, is drawn at once.
+                return 'run', low, low, high, node[2][0][2]
+            return 'repeat', low * node[1], low, high, node
+        elif op is sre_parse.BRANCH:
+            branches = tuple(self._compile_sequence(items, dotall, multiline) for items in av[1])
+            return 'branch', min(branch[1] for branch in branches), branches
+        elif op is sre_parse.SUBPATTERN:
+            group, add_flags, del_flags, items = av
+            # Scoped inline flags, e.g., `(?s:...)`.
+            dotall = (dotall or bool(add_flags & re.DOTALL)) and not del_flags & re.DOTALL
+            multiline = (multiline or bool(add_flags & re.MULTILINE)) and not del_flags & re.MULTILINE
+            node = self._compile_sequence(items, dotall, multiline)
+            return 'group', node[1], group, node
+        elif op is sre_parse.ATOMIC_GROUP:
+            return self._compile_sequence(av, dotall, multiline)
+        elif op is sre_parse.GROUPREF:
+            return 'reference', 0, av
+        elif op is sre_parse.GROUPREF_EXISTS:
+            group, yes, no = av
+            yes = self._compile_sequence(yes, dotall, multiline)
+            no = self._compile_sequence(no or [], dotall, multiline)
+            return 'condition', min(yes[1], no[1]), group, yes, no
+        elif op is sre_parse.AT:
+            if multiline and av is sre_parse.AT_BEGINNING:
+                return 'characters', 1, '\n'
+            if multiline and av is sre_parse.AT_END:
+                return 'characters', 1, '\n'
+            return None
+        elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+            # Lookarounds do not consume any character, and are left to the surrounding data.
+            return None
+        raise PcreSampleError(f'Unsupported syntax: {op}')
+
+
+def _character(code: int) -> str:
+    if code > 0xff:
+        raise PcreSampleError(f'Unsupported character: {chr(code)!r}')
+    return chr(code)
+
+
+def _complement(characters: set[str]) -> str:
+    # The wildcards are drawn from the printable characters, unless all of them are excluded.
+    return ''.join(char for char in ALPHABET if char not in characters) or \
+        ''.join(char for char in BYTES if char not in characters)
+
+
+def _class(items) -> str:
+    characters, negated = set(), False
+    for op, av in items:
+        if op is sre_parse.NEGATE:
+            negated = True
+        elif op is sre_parse.LITERAL:
+            characters.add(_character(av))
+        elif op is sre_parse.RANGE:
+            low, high = av
+            characters.update(chr(code) for code in range(low, min(high, 0xff) + 1))
+        elif op is sre_parse.CATEGORY:
+            characters.update(CATEGORIES[av])
+        else:
+            raise PcreSampleError(f'Unsupported syntax in character class: {op}')
+    choices = _complement(characters) if negated else ''.join(sorted(characters))
+    if not choices:
+        raise PcreSampleError('Empty character class')
+    return choices
+
+
+def _sample(node: tuple, budget: int, pieces: list[str], groups: dict[int, str]) -> int:
+    # Append a sample of the node to the pieces within the given length budget, and return its length.
+    kind = node[0]
+    if kind == 'text':
+        pieces.append(node[2])
+        return node[1]
+    elif kind == 'characters':
+        pieces.append(random.choice(node[2]))
+        return 1
+    elif kind == 'sequence':
+        length = 0
+        for item, suffix in zip(node[2], node[3]):
+            length += _sample(item, budget - length - suffix, pieces, groups)
+        return length
+    elif kind == 'run':
+        _, _, low, high, characters = node
+        count = random.randint(low, max(low, min(high, budget)))
+        pieces.append(''.join(random.choices(characters, k=count)))
+        return count
+    elif kind == 'repeat':
+        _, _, low, high, item = node
+        if item[1] > 0:
+            high = max(low, min(high, budget // item[1]))
+        length = 0
+        for remaining in range(random.randint(low, high) - 1, -1, -1):
+            length += _sample(item, budget - length - remaining * item[1], pieces, groups)
+        return length
+    elif kind == 'branch':
+        branches = [branch for branch in node[2] if branch[1] <= budget] or node[2]
+        return _sample(random.choice(branches), budget, pieces, groups)
+    elif kind == 'group':
+        start = len(pieces)
+        length = _sample(node[3], budget, pieces, groups)
+        groups[node[2]] = ''.join(pieces[start:])
+        return length
+    elif kind == 'reference':
+        text = groups.get(node[2], '')
+        pieces.append(text)
+        return len(text)
+    elif kind == 'condition':
+        return _sample(node[3] if node[2] in groups else node[4], budget, pieces, groups)
+    return 0
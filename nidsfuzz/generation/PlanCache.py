@@ -0,0 +1,118 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Sequence
+
+from logger import logger
+from rule import Rule
+
+if TYPE_CHECKING:
+    from generation.PassThroughMutator import GenerationPlan, PassThroughMutator
+
+
+class PlanCache:
+    """
+    An LRU cache of the generation plans of rule batches (see `GenerationPlan`), so that each batch is
+    compiled once per mutator and protocol, and emitting a test case only instantiates its plan.
+
+    Plans are keyed by the mutator, the protocol and the SHA-256 digest of the rule texts, so that a
+    modified rule never hits a stale plan, and may be persisted in a cache directory (usually the one
+    of `RuleSetCache`). Stored plans are merged with the ones stored by other workers, keeping the
+    `capacity` most recently used ones.
+
+    Note: plans are pickled, so the cache directory must only be writable by trusted users.
+
+    Usage:
+    --------
+    >>> plans = PlanCache(capacity=4096, cache_dir='~/.cache/nidsfuzz')
+    >>> mutator = PassThroughMutator(ruleset, plans=plans)
+    >>> mutator.generate(rule, proto='http')  # compiles the plan of the rule, or instantiates the cached one
+    >>> plans.store()
+    """
+
+    # Bump this version whenever the orchestration of the mutators changes.
+    VERSION = 2
+
+    def __init__(self, capacity: int = 4096, cache_dir: str = None):
+        if capacity < 1:
+            raise ValueError(f'capacity must be positive, but got {capacity}')
+
+        self.capacity = capacity
+        self.plans: OrderedDict[tuple[str, str, str], 'GenerationPlan'] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        self.entry: Path | None = None
+        if cache_dir is not None:
+            cache_dir = Path(cache_dir).expanduser()
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            self.entry = cache_dir / f'plans-v{self.VERSION}.pickle'
+            for key, plan in self.load().items():
+                self.put(key, plan)
+
+    def __len__(self) -> int:
+        return len(self.plans)
+
+    def __str__(self) -> str:
+        return f'Cached plans: {len(self)}, Hits: {self.hits}, Misses: {self.misses}'
+
+    def __repr__(self) -> str:
+        return str(self)
+
+    @staticmethod
+    def key(mutator: 'PassThroughMutator', rules: Sequence[Rule], proto: str) -> tuple[str, str, str]:
+        digest = hashlib.sha256('\n'.join(rule.key for rule in rules).encode('utf-8')).hexdigest()
+        return type(mutator).__name__, proto.lower(), digest
+
+    def get(self, key: tuple[str, str, str]) -> 'GenerationPlan | None':
+        plan = self.plans.get(key)
+        if plan is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.plans.move_to_end(key)
+        return plan
+
+    def put(self, key: tuple[str, str, str], plan: 'GenerationPlan'):
+        self.plans[key] = plan
+        self.plans.move_to_end(key)
+        while len(self.plans) > self.capacity:
+            self.plans.popitem(last=False)
+
+    def clear(self):
+        self.plans.clear()
+
+    def load(self) -> OrderedDict[tuple[str, str, str], 'GenerationPlan']:
+        if self.entry is None or not self.entry.exists():
+            return OrderedDict()
+        try:
+            with self.entry.open('rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            logger.warning(f'Discarding the corrupted cache entry [{self.entry}]: {e}')
+            self.entry.unlink(missing_ok=True)
+            return OrderedDict()
+
+    def store(self):
+        """
+        Write the plans into the cache directory atomically, merged with the ones stored by other workers.
+        """
+        if self.entry is None:
+            return
+        plans = self.load()
+        for key, plan in self.plans.items():
+            plans[key] = plan
+            plans.move_to_end(key)
+        while len(plans) > self.capacity:
+            plans.popitem(last=False)
+        fd, temp_path = tempfile.mkstemp(dir=self.entry.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(plans, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.entry)
+        except Exception:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
@@ -2,6 +2,7 @@ import random
 
 from logger import logger
 from generation.PassThroughMutator import PassThroughSignatureRender, DataChunk, PassThroughMutator
+from generation.PlanCache import PlanCache
 from rule import Pcre, Isdataat, ByteTest, Content, RuleSet, Rule, Option
 
 """
@@ -40,12 +41,16 @@ class RepetitionSignatureRender(PassThroughSignatureRender):
 
 class RepetitionMutator(PassThroughMutator):
 
+    # The repeat times are drawn for every test case.
+    DETERMINISTIC = False
+
     def __init__(self, ruleset: RuleSet,
                  mode: str = 'block-wise',
                  repeat_times: int = 100,
                  min_repeat_times: int = 10,
-                 max_repeat_times: int = 1000):
-        super().__init__(ruleset)
+                 max_repeat_times: int = 1000,
+                 plans: PlanCache = None, ):
+        super().__init__(ruleset, plans)
 
         if mode.lower() in ['block-wise', 'element-wise']:
             self.mode = mode.lower()
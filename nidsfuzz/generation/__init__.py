@@ -3,6 +3,11 @@ from .BlendingMutator import BlendingMutator
 from .PassThroughMutator import PassThroughMutator
 from .RepetitionMutator import RepetitionMutator
 from .ObfuscationMutator import ObfuscationMutator
+from .GeneratabilityCache import GeneratabilityCache
+from .PlanCache import PlanCache
+from .GenerationPool import GenerationPool
+from .PcreSampler import PcreSampler, PcreSampleError
 
 
-__all__ = ["BlendingMutator", "PassThroughMutator", "RepetitionMutator", "ObfuscationMutator"]
\ No newline at end of file
+__all__ = ["BlendingMutator", "PassThroughMutator", "RepetitionMutator", "ObfuscationMutator", "GeneratabilityCache",
+           "PlanCache", "PcreSampler", "PcreSampleError", "GenerationPool"]
\ No newline at end of file
@@ -1,10 +1,13 @@
+from commons.Stream import Stream
+
+
 class DefaultGrammar:
 
     def __init__(self):
-        self.request_fields: dict[str, bytes] = {}
-        self.response_fields: dict[str, bytes] = {}
+        self.request_fields: dict[str, bytes | Stream] = {}
+        self.response_fields: dict[str, bytes | Stream] = {}
 
-    def generate(self, pkt_type: str) -> bytes:
+    def generate(self, pkt_type: str) -> bytes | Stream:
         if self.request_fields == {} or self.response_fields == {}:
             raise RuntimeError(f'Please populate fields before generating packets.')
 
@@ -16,10 +19,13 @@ class DefaultGrammar:
             case _:
                 raise NotImplementedError
 
+        # A packet with a streamed field (see `PassThroughSignatureRender.stream`) is streamed as well.
+        if any(isinstance(value, Stream) for value in field_values.values()):
+            return Stream(field_values.values())
         packet = b"".join(field_values.values())
         return packet
 
-    def populate(self, part_fields: dict[str, bytes]):
+    def populate(self, part_fields: dict[str, bytes | Stream]):
 
         def populating(original_fields, populated_fields):
             # Use received field values to replace the default field values.
@@ -2,6 +2,7 @@ import socket
 import time
 
 from logger import logger
+from commons.Stream import Stream, chunks
 
 
 class GenericClient:
@@ -49,9 +50,11 @@ class GenericClient:
     def is_connected(self) -> bool:
         return self.connected
 
-    def send(self, data: bytes):
+    def send(self, data: bytes | Stream):
         try:
-            self.socket.send(data)
+            # A stream is sent chunk by chunk as it is produced.
+            for chunk in chunks(data):
+                self.socket.sendall(chunk)
         except Exception as e:
             logger.error(f"Failed to send data to {self.server_addr}: {e}")
             raise RuntimeError(f"client connection {self.server_addr} severed during sending.")
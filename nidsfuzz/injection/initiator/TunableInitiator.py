@@ -1,6 +1,7 @@
 import time
 
 from logger import logger
+from commons.Stream import Stream
 from injection.initiator.GenericClient import GenericClient
 from injection.msg.OpcodeEnum import OpcodeEnum
 from injection.msg.TuningMessage import TuningMessage
@@ -40,15 +41,18 @@ class TunableInitiator:
     def is_connected(self) -> bool:
         return self.tuned_client.is_connected
 
-    def inject(self, request: bytes, response: bytes):
+    def inject(self, request: bytes | Stream, response: bytes | Stream):
+        """
+        Inject a request and its response, either of which may be streamed (see `Stream`) chunk by chunk.
+        """
         if request is None or response is None:
             raise RuntimeError('Request or response cannot be None')
 
-        if request != b"" and response != b"":
+        if len(request) != 0 and len(response) != 0:
             opcode = OpcodeEnum.ECHO_WAIT
-        elif request != b"" and response == b"":
+        elif len(request) != 0 and len(response) == 0:
             opcode = OpcodeEnum.NO_OP
-        elif request == b"" and response != b"":
+        elif len(request) == 0 and len(response) != 0:
             opcode = OpcodeEnum.ECHO_NODELAY
         else:
             return
@@ -1,6 +1,7 @@
 import struct
 
 from logger import logger
+from commons.Stream import Stream
 
 
 class TuningMessage:
@@ -9,13 +10,13 @@ class TuningMessage:
     HEADER_LENGTH = 8
     HEADER_FORMAT = "!HHL"
 
-    def __init__(self, opcode: int, port: int, data: bytes = b''):
+    def __init__(self, opcode: int, port: int, data: bytes | Stream = b''):
         self.opcode: int = opcode
         self.port: int = port
-        self.data: bytes = data
+        self.data: bytes | Stream = data
         self.length = len(data)
 
-    def pack(self) -> bytes:
+    def pack(self) -> bytes | Stream:
         header = struct.pack(self.HEADER_FORMAT, self.opcode, self.port, self.length)
         return header + self.data
 
@@ -44,12 +44,49 @@ def main():
         nargs='+',
         help='The rule files under testing.',
     )
+    fuzzing_parser.add_argument(
+        '--baseline',
+        type=str,
+        nargs='+',
+        default=None,
+        help='The previous version of the rule files. If given, only the batches with a rule added or changed '
+             'since then (or checking a flowbit whose setters changed) are selected.',
+    )
+    fuzzing_parser.add_argument(
+        '--rule-cache',
+        type=str,
+        default=None,
+        help='The directory used to cache parsed rule files, the rules that cannot be generated and the '
+             'generation plans of the rules (disabled by default).',
+    )
+    fuzzing_parser.add_argument(
+        '--generation-workers',
+        type=int,
+        default=None,
+        help='The number of worker processes that generate the test packets ahead of the fuzzing runs, so the '
+             'rewards of a run only affect the batches selected afterward (disabled by default).',
+    )
+    fuzzing_parser.add_argument(
+        '--reload-interval',
+        type=float,
+        default=None,
+        help='The interval (in seconds) to check the rule files for changes and reload the changed rules '
+             '(disabled by default).',
+    )
     fuzzing_parser.add_argument(
         '--alert-files',
         type=str,
         nargs='+',
         help='The alert files generated by each evaluated NIDS platform.'
     )
+    fuzzing_parser.add_argument(
+        '--mapped-rule-files',
+        type=str,
+        nargs='+',
+        default=None,
+        help='The rule files loaded by the other NIDS platforms (e.g., Snort2 rules), '
+             'whose rule IDs are mapped to the ones of the rule files under testing.'
+    )
     fuzzing_parser.add_argument(
         "--protocol",
         type=str,
@@ -58,9 +95,54 @@ def main():
     )
     fuzzing_parser.add_argument(
         '--selection',
-        choices=['sequential', 'random', 'combination'],
+        choices=['sequential', 'random', 'combination', 'covering', 'adaptive', 'stratified'],
         default='random',
         help='The rule selecting algorithm to use.')
+    fuzzing_parser.add_argument(
+        '--shard',
+        type=shard,
+        default=(0, 1),
+        help='The shard of the combinations visited by this worker (in the form of index/count), '
+             'so that several workers share a combination campaign.'
+    )
+    fuzzing_parser.add_argument(
+        '--resume-from',
+        type=int,
+        default=None,
+        help='The number of the combination to resume the combination selection from.'
+    )
+    fuzzing_parser.add_argument(
+        '--strength',
+        type=int,
+        default=2,
+        help='The strength of the covering selection, i.e., the number of rules (or feature sets) '
+             'that appear together in at least one batch.'
+    )
+    fuzzing_parser.add_argument(
+        '--covering-unit',
+        choices=['rule', 'feature'],
+        default='rule',
+        help='Whether the covering selection covers the combinations of rules or of their detection features.'
+    )
+    fuzzing_parser.add_argument(
+        '--bandit',
+        choices=['ucb', 'thompson'],
+        default='ucb',
+        help='The bandit algorithm of the adaptive selection.')
+    fuzzing_parser.add_argument(
+        "--exploration",
+        type=float,
+        default=1.0,
+        help='The exploration of the adaptive selection, i.e., the scale of the UCB bound '
+             'or the prior count of Thompson sampling.'
+    )
+    fuzzing_parser.add_argument(
+        '--compatible-batches',
+        action='store_true',
+        help='Only select batches of rules whose signatures do not conflict with each other '
+             '(e.g., contents at the same absolute offset), which suits the blending generation. '
+             'Supported by the random and combination selections.'
+    )
     fuzzing_parser.add_argument(
         "--batch-size",
         type=int,
@@ -73,6 +155,14 @@ def main():
         default=100000,
         help='The number of batches generated in the fuzzing activity.'
     )
+    fuzzing_parser.add_argument(
+        "--cluster-threshold",
+        type=float,
+        default=None,
+        help='The similarity above which near-duplicate rules are clustered, and only one rule per cluster '
+             'is tested until it yields a discrepancy (disabled by default, except for the adaptive '
+             'selection, whose arms are the clusters).'
+    )
     fuzzing_parser.add_argument(
         '--generation',
         choices=['pass-through', 'blending', 'obfuscation', 'repetition'],
@@ -91,6 +181,40 @@ def main():
         default=1,
         help='The threshold of the accumulation analyzer.'
     )
+    fuzzing_parser.add_argument(
+        '--analyzer',
+        choices=['exact', 'sketch', 'decay'],
+        default='exact',
+        help='The counting algorithm of the accumulation analyzer.'
+    )
+    fuzzing_parser.add_argument(
+        '--half-life',
+        type=float,
+        default=86400.0,
+        help='The half life (in seconds) of the counters used by the decay analyzer.'
+    )
+    fuzzing_parser.add_argument(
+        '--knowledge-base',
+        type=str,
+        default=None,
+        help='The directory used to keep the outcomes of the rules across campaigns, which the selection '
+             'starts from (disabled by default).'
+    )
+    fuzzing_parser.add_argument(
+        '--nids-versions',
+        type=str,
+        nargs='+',
+        default=None,
+        help='The versions of the evaluated NIDS platforms, which the outcomes in the knowledge base are kept '
+             'for (the names of the alert files by default).'
+    )
+    fuzzing_parser.add_argument(
+        '--skip-verified',
+        type=int,
+        default=None,
+        help='Skip the rules that have been tested consistent at least this many times according to the '
+             'knowledge base (disabled by default).'
+    )
     fuzzing_parser.set_defaults(func=fuzzing)
 
     ########################################
@@ -123,6 +247,17 @@ def main():
     args = parser.parse_args()
     args.func(args)
 
+def shard(value: str) -> tuple[int, int]:
+    # Parse a shard in the form of index/count, e.g., 0/4 for the first of four workers.
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"shard must be in the form of index/count, but got '{value}'")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in [0, count), but got '{value}'")
+    return index, count
+
+
 def fuzzing(args):
     if args.protocol not in Proto.all():
         protocol = None
@@ -144,13 +279,34 @@ def fuzzing(args):
         algorithm=args.selection,
         batch_size=args.batch_size,
         batch_num=args.batch_num,
+        cache_dir=args.rule_cache,
+        cluster_threshold=args.cluster_threshold,
+        reload_interval=args.reload_interval,
+        bandit=args.bandit,
+        exploration=args.exploration,
+        shard=args.shard,
+        resume_from=args.resume_from,
+        strength=args.strength,
+        covering_unit=args.covering_unit,
+        compatible=args.compatible_batches,
+        baseline=args.baseline,
     ).setup_generation(
         algorithm=args.generation,
         mode=args.repeat_mode,
+        cache_dir=args.rule_cache,
+        workers=args.generation_workers,
     ).setup_sanitization(
         alert_files=args.alert_files,
+        mapped_rule_files=args.mapped_rule_files,
+        cache_dir=args.rule_cache,
     ).setup_adaptation(
         threshold=args.threshold,
+        algorithm=args.analyzer,
+        half_life=args.half_life,
+    ).setup_knowledge(
+        knowledge_dir=args.knowledge_base,
+        versions=args.nids_versions,
+        skip_verified=args.skip_verified,
     )
 
     fuzzer.start()
@@ -1,4 +1,6 @@
 import re
+import sys
+from typing import NamedTuple
 
 from rule.constants.StickyBuffer import StickyBuffer
 from rule.options import Option, Flow, Content, Isdataat, Pcre, Bufferlen, Dsize, ByteTest
@@ -45,6 +47,28 @@ class Rule:
                                r"\((?P<options>.*)\)"
                                r"$)")
 
+    # The options ignored by the fuzzy signature, see `fuzzy_signature`.
+    _ignored_options_pattern = re.compile(r'\s*(?:' + '|'.join([
+        'msg',
+        'flow',
+        'metadata',
+        'service',
+        'reference',
+        'classtype',
+        'gid',
+        'sid',
+        'rev'
+    ]) + r'):.*?;')
+    _option_name_pattern = re.compile(r'\s*[a-zA-Z]*?\s*:\s*')
+    # A header token is either a bracketed list, which may contain spaces (e.g., [80, 443]), or a word.
+    _header_token_pattern = re.compile(r'\[[^\]]*\]|[^\s][^ ]*')
+
+    # Rules are kept by the thousands, so they have no per-instance __dict__ and
+    # cannot be modified once constructed (see `__setattr__`).
+    __slots__ = ('_activated', '_action', '_proto', '_src_ip', '_src_port', '_direction', '_dst_ip',
+                 '_dst_port', '_rule_body', '_key', '_id', '_service', '_services',
+                 '_port', '_fuzzy_signature', '_features', '_hash')
+
     def __init__(self,
                  raw: str,
                  activated: bool,
@@ -56,17 +80,38 @@ class Rule:
                  dst_ip: str,
                  dst_port: str,
                  options: str):
-        self._raw = raw
+        # The header fields take only a handful of distinct values, so they are shared between rules.
         self._activated = activated
-        self._action = action
-        self._proto = proto
-        self._src_ip = src_ip
-        self._src_port = src_port
-        self._direction = direction
-        self._dst_ip = dst_ip
-        self._dst_port = dst_port
+        self._action = _intern(action)
+        self._proto = _intern(proto)
+        self._src_ip = _intern(src_ip)
+        self._src_port = _intern(src_port)
+        self._direction = _intern(direction)
+        self._dst_ip = _intern(dst_ip)
+        self._dst_port = _intern(dst_port)
         self._rule_body = RuleBody(options)
 
+        # A rule is never modified after parsing, so its derived attributes are computed only once.
+        self._key = str(self)
+        self._id = self._compute_id()
+        self._service = self.get('service') if self.get('service') is not None else self._proto
+        self._services = tuple(sys.intern(s.lower()) for s in self._service.split(","))
+        # The following attributes are resolved on first access.
+        self._port = None
+        self._fuzzy_signature = None
+        self._features = None
+        # Assigned last, as it freezes the rule.
+        self._hash = hash(self._key)
+
+    def __setattr__(self, name, value):
+        if hasattr(self, '_hash'):
+            raise AttributeError(f'Rule is immutable, cannot set attribute: {name}')
+        object.__setattr__(self, name, value)
+
+    def _memoize(self, name: str, value):
+        object.__setattr__(self, name, value)
+        return value
+
     def __str__(self) -> str:
         """
         Provide a user-friendly string representation of the rule.
@@ -82,18 +127,39 @@ class Rule:
         return str(self)
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
+
+    def __getstate__(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__ if name != '_hash'}
+
+    def __setstate__(self, state: dict):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        # String hashes are salted per process, so a rule loaded from the cache rehashes its key.
+        object.__setattr__(self, '_hash', hash(self._key))
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if not isinstance(other, Rule):
             return False
-        return str(self) == str(other)
+        return self._hash == other._hash and self._key == other._key
+
+    @property
+    def key(self) -> str:
+        """
+        The canonical text of the rule, which identifies the rule in hashing and comparison.
+        """
+        return self._key
 
     @property
     def fuzzy_signature(self) -> str:
-        full_signature = str(self)
+        if self._fuzzy_signature is None:
+            self._memoize('_fuzzy_signature', self._compute_fuzzy_signature())
+        return self._fuzzy_signature
 
-        fuzzy_signature = re.search(r'\((.*)\)', full_signature)
+    def _compute_fuzzy_signature(self) -> str:
+        fuzzy_signature = re.search(r'\((.*)\)', self._key)
         if not fuzzy_signature:
             return ''
 
@@ -103,22 +169,8 @@ class Rule:
         # matches = re.findall(noteworthy_options_pattern, fuzzy_signature.group(1))
         # return  ''.join(matches)
 
-        ignored_options = [
-            'msg',
-            'flow',
-            'metadata',
-            'service',
-            'reference',
-            'classtype',
-            'gid',
-            'sid',
-            'rev'
-        ]
-        ignored_options_pattern = r'\s*(?:' + '|'.join(ignored_options) + r'):.*?;'
-        fuzzy_signature = re.sub(ignored_options_pattern, '', fuzzy_signature.group(1))
-
-        remove_option_name = r'\s*[a-zA-Z]*?\s*:\s*'
-        fuzzy_signature = re.sub(remove_option_name, '', fuzzy_signature).strip()
+        fuzzy_signature = self._ignored_options_pattern.sub('', fuzzy_signature.group(1))
+        fuzzy_signature = self._option_name_pattern.sub('', fuzzy_signature).strip()
 
         return fuzzy_signature
 
@@ -132,7 +184,17 @@ class Rule:
 
     @property
     def port(self) -> str:
-        """@https://docs.snort.org/rules/options/non_payload/flow"""
+        """
+        @https://docs.snort.org/rules/options/non_payload/flow
+
+        Note: the port is resolved on first access (instead of in the constructor),
+        because rules whose flow has no direction cannot resolve it.
+        """
+        if self._port is None:
+            self._memoize('_port', self._resolve_port())
+        return self._port
+
+    def _resolve_port(self) -> str:
         if self.get('flow') is None:
             return self._dst_port
         else:
@@ -146,9 +208,14 @@ class Rule:
 
     @property
     def service(self) -> str:
-        if self.get('service') is None:
-            return self.protocol
-        return self.get('service')
+        return self._service
+
+    @property
+    def services(self) -> tuple[str, ...]:
+        """
+        return each (lower-cased) service name that the rule applies to.
+        """
+        return self._services
 
     @property
     def signature(self) -> dict[str, list[Option]]:
@@ -158,6 +225,45 @@ class Rule:
         """
         return self._rule_body.signature
 
+    @property
+    def sticky_buffers(self) -> set[str]:
+        """
+        return the sticky buffers used by the signature, without parsing the signature options.
+        """
+        return {sticky_buffer for sticky_buffer, _, _ in self._rule_body._signature_options}
+
+    @property
+    def features(self) -> frozenset[str]:
+        """
+        return the detection features used by the rule, e.g., {'content', 'negated_content', 'pcre', 'multi_buffer'}.
+        The features are extracted from the raw option values, without parsing the signature options.
+        """
+        if self._features is None:
+            self._memoize('_features', self._extract_features())
+        return self._features
+
+    def _extract_features(self) -> frozenset[str]:
+        features = set()
+        for _, name, val in self._rule_body._signature_options:
+            features.add(name)
+            val = val or ''
+            if val.startswith('!'):
+                features.add(f'negated_{name}')
+            if name == 'content':
+                # the modifiers follow the last quote of the content match
+                modifiers = val.rsplit('"', 1)[-1]
+                if 'distance' in modifiers or 'within' in modifiers:
+                    features.add('relative_content')
+                if 'offset' in modifiers or 'depth' in modifiers:
+                    features.add('absolute_content')
+            elif name == 'pcre' and 'R' in val.rstrip('"').rsplit('/', 1)[-1]:
+                features.add('relative_pcre')
+        if self.get('flowbits') is not None:
+            features.add('flowbits')
+        if len(self.sticky_buffers) > 1:
+            features.add('multi_buffer')
+        return frozenset(features)
+
     @property
     def id(self) -> str:
         """
@@ -165,6 +271,9 @@ class Rule:
         @https://docs.snort.org/rules/options/general/sid
         @https://docs.snort.org/rules/options/general/rev
         """
+        return self._id
+
+    def _compute_id(self) -> str:
         gid = self.get('gid') if self.get('gid') else "1"
         sid = self.get('sid') if self.get('sid') else ""
         rev = self.get('rev') if self.get('rev') else "1"
@@ -181,68 +290,32 @@ class Rule:
         @see https://docs.snort.org/rules/headers/new_header_types
         """
         # remove leading and trailing whitespace (spaces, tabs, newlines) from a string.
-        rule_str = rule_str.strip()
-
-        m = cls._rule_pattern.match(rule_str)
+        m = cls.match(rule_str.strip())
         if not m:
             return None
+        return cls.from_match(m)
 
-        action = None
-        proto = None
-        src_ip = None
-        src_port = None
-        direction = None
-        dst_ip = None
-        dst_port = None
-
-        if m.group('enabled') == "#":
-            enabled = False
-        else:
-            enabled = True
+    @classmethod
+    def from_match(cls, m: re.Match) -> 'Rule | None':
+        """
+        Create a rule object from a string already matched by `match`, so that the string is not matched twice.
+        """
+        enabled = m.group('enabled') != "#"
 
         header = m.group("header").strip()
 
         # if a decoder rule, the header will be one word.
-        if len(header.split(" ")) == 1:
-            action = header
+        if " " not in header:
+            action, proto, src_ip, src_port, direction, dst_ip, dst_port = header, None, None, None, None, None, None
         else:
-            states = ["action", "proto", "src_ip", "src_port", "direction", "dst_ip", "dst_port"]
-            state = 0
-            rem = header
-            while state < len(states):
-                if not rem:
-                    return None
-                if rem[0] == "[":
-                    end = rem.find("]")
-                    if end < 0:
-                        return None
-                    token = rem[:end + 1].strip()
-                    rem = rem[end + 1:].strip()
-                else:
-                    end = rem.find(" ")
-                    if end < 0:
-                        token = rem
-                        rem = ""
-                    else:
-                        token = rem[:end].strip()
-                        rem = rem[end:].strip()
-
-                if states[state] == "action":
-                    action = token
-                elif states[state] == "proto":
-                    proto = token
-                elif states[state] == "src_ip":
-                    src_ip = token
-                elif states[state] == "src_port":
-                    src_port = token
-                elif states[state] == "direction":
-                    direction = token
-                elif states[state] == "dst_ip":
-                    dst_ip = token
-                elif states[state] == "dst_port":
-                    dst_port = token
-
-                state += 1
+            # action, proto, src_ip, src_port, direction, dst_ip and dst_port, in a single pass over the header.
+            tokens = cls._header_token_pattern.findall(header)
+            if len(tokens) < 7:
+                return None
+            del tokens[7:]
+            if any(token[0] == "[" and token[-1] != "]" for token in tokens):
+                return None
+            action, proto, src_ip, src_port, direction, dst_ip, dst_port = tokens
 
         options = m.group("options").strip()
 
@@ -250,6 +323,13 @@ class Rule:
 
         return cls(raw, enabled, action, proto, src_ip, src_port, direction, dst_ip, dst_port, options)
 
+    @classmethod
+    def match(cls, rule_str: str) -> re.Match | None:
+        """
+        Match the given string against the rule grammar, see `from_match`.
+        """
+        return cls._rule_pattern.match(rule_str)
+
     @staticmethod
     def is_valid(rule_str: str) -> bool:
         """
@@ -257,7 +337,7 @@ class Rule:
         """
         if not isinstance(rule_str, str):
             raise TypeError(f"rule_str must be of type str, not {type(rule_str)}")
-        return Rule._rule_pattern.match(rule_str) is not None
+        return Rule.match(rule_str) is not None
 
     def get(self, opt_name: str, default_value=None) -> str:
         """
@@ -266,16 +346,30 @@ class Rule:
         return self._rule_body.get(opt_name, default_value)
 
 
-def find_opt_end(options: str) -> int:
-    """ Find the end of an option (;) handling escapes. """
-    offset = 0
+def _intern(value: str | None) -> str | None:
+    return sys.intern(value) if value is not None else None
 
-    while True:
-        i = options[offset:].find(";")
-        if options[offset + i - 1] == "\\":
-            offset += 2
-        else:
-            return offset + i
+
+def find_opt_end(options: str, start: int = 0) -> int:
+    """ Find the end of an option (;) from the start index, handling escapes. """
+    index = options.find(";", start)
+    while index > 0 and options[index - 1] == "\\":
+        index = options.find(";", index + 1)
+    return index
+
+
+class RawOption(NamedTuple):
+    """
+    An option as it appears in a Snort rule, e.g., ('content', '".rhosts"').
+    Fields can also be read by name, e.g., `option['name']`.
+    """
+    name: str
+    value: str | None
+
+    def __getitem__(self, item):
+        if isinstance(item, str):
+            return getattr(self, item)
+        return tuple.__getitem__(self, item)
 
 
 class RuleBody(dict):
@@ -294,9 +388,15 @@ class RuleBody(dict):
     payload options will be looked for in that buffer unless some other sticky
     buffer is specified.
 
+    Note: the raw option list is the canonical form of the rule body. The
+    signature options (content, pcre, etc.) are only parsed into Option objects
+    when the signature is accessed for the first time, and then memoized.
+
     @see https://docs.snort.org/rules/options/payload/index.html
     """
 
+    __slots__ = ('_signature', '_signature_options')
+
     sig_options = {
         "content": Content,
         "isdataat": Isdataat,
@@ -306,16 +406,23 @@ class RuleBody(dict):
         "byte_test": ByteTest
     }
 
+    # TODO: Some rule options may appear multiple times in a Snort rule
+    _list_options = frozenset(["content", "pcre", "isdataat", "reference", "flowbits", "bufferlen", "byte_test"])
+
+    _sticky_buffers = StickyBuffer.all()
+
+    # The options whose values recur across rules, so they are shared (interned) between rules.
+    _interned_options = frozenset(["flow", "service", "classtype", "metadata", "gid", "rev", "priority"])
+
     def __init__(self, raw: str):
         dict.__init__(self)
-        self._raw = raw
         # Preserves the order in which each option appears in a Snort rule.
         self["options"] = []
-        # Groups options according to their applied sticky buffer
+        # Groups options according to their applied sticky buffer, materialized on first access.
         # Note: starting from Python 3.7, dict guarantees insertion order.
-        self.signature: dict[str, list[Option]] = {}
-        # TODO: Some rule options may appear multiple times in a Snort rule
-        self._list_options = ["content", "pcre", "isdataat", "reference", "flowbits", "bufferlen", "byte_test"]
+        self._signature: dict[str, list[Option]] | None = None
+        # The unparsed signature options in the form of (sticky buffer, name, value)
+        self._signature_options: list[tuple[str, str, str]] = []
         # Groups options according to their option name
         self._parse(raw)
 
@@ -326,33 +433,35 @@ class RuleBody(dict):
 
         cur_buffer = "pkt_data"
 
-        while True:
-            if not options:
-                break
-            index = find_opt_end(options)
+        # Options are scanned by index, instead of slicing the remaining options after each one.
+        position = 0
+        while position < len(options):
+            index = find_opt_end(options, position)
             if index < 0:
-                raise Exception(f"end of option (;) not found: {options}")
-            option = options[:index].strip()
-            options = options[index + 1:].strip()
-
-            if option.find(":") > -1:
-                name, val = [x.strip() for x in option.split(":", 1)]
+                if options[position:].isspace():
+                    break
+                raise Exception(f"end of option (;) not found: {options[position:].strip()}")
+            option = options[position:index].strip()
+            position = index + 1
+
+            name, separator, val = option.partition(":")
+            if separator:
+                name = name.strip()
+                val = val.strip()
             else:
-                name = option
                 val = None
+            name = sys.intern(name)
+            if name in self._interned_options:
+                val = _intern(val)
 
             # Groups options according to their applied sticky buffer
-            if name in StickyBuffer.all():
+            if name in self._sticky_buffers:
                 cur_buffer = name
-            elif name in self.sig_options.keys():
-                option = self.sig_options[name].from_string(val)
-                self.signature.setdefault(cur_buffer, []).append(option)
+            elif name in self.sig_options:
+                self._signature_options.append((cur_buffer, name, val))
 
             # Preserves the order in which each option appears in a Snort rule.
-            self["options"].append({
-                "name": name,
-                "value": val,
-            })
+            self["options"].append(RawOption(name, val))
 
             # Groups options according to their option name
             if name in self._list_options:
@@ -364,14 +473,23 @@ class RuleBody(dict):
             else:
                 self[name] = val
 
+    @property
+    def signature(self) -> dict[str, list[Option]]:
+        if self._signature is None:
+            signature = {}
+            for sticky_buffer, name, val in self._signature_options:
+                signature.setdefault(sticky_buffer, []).append(self.sig_options[name].from_string(val))
+            self._signature = signature
+        return self._signature
+
     def __str__(self):
         """Rebuild the rule options from the list of options."""
         options = []
-        for option in self["options"]:
-            if option["value"] is None:
-                options.append(option["name"])
+        for name, value in self["options"]:
+            if value is None:
+                options.append(name)
             else:
-                options.append("%s:%s" % (option["name"], option["value"]))
+                options.append("%s:%s" % (name, value))
         return "%s;" % "; ".join(options)
 
     def __repr__(self):
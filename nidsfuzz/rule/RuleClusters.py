@@ -0,0 +1,141 @@
+import zlib
+
+from rule.Rule import Rule
+from utils import get_ngrams
+
+
+class RuleClusters:
+    """
+    Clusters near-duplicate rules, i.e., rules whose fuzzy signatures (see `Rule.fuzzy_signature`)
+    share most of their n-grams.
+
+    Instead of comparing every pair of rules, each fuzzy signature is summarized by a MinHash
+    sketch of `bands` x `rows` values, and the sketch is split into `bands` bands. Only rules
+    that fall into the same bucket for at least one band are compared with the exact Jaccard
+    similarity, which keeps clustering close to linear in the number of rules. Sketches are
+    deterministic, so the clusters are the same in every fuzzing campaign.
+
+    Each cluster is led by its first rule (the representative), and a rule only joins a cluster
+    if its similarity to the representative reaches the `threshold`. Rules without any n-gram
+    in their fuzzy signature are never clustered.
+
+    @see https://en.wikipedia.org/wiki/MinHash
+    @see https://en.wikipedia.org/wiki/Locality-sensitive_hashing
+
+    Usage:
+    --------
+    >>> clusters = RuleClusters(ruleset.activated_rules, threshold=0.8)
+    >>> representative = clusters.representative(rule)
+    >>> near_duplicates = clusters.members(representative)  # including the representative
+    """
+
+    # The 32-bit golden ratio constant used by Fibonacci hashing.
+    _MULTIPLIER = 0x9E3779B1
+
+    def __init__(self,
+                 rules: list[Rule],
+                 threshold: float = 0.8,
+                 bands: int = 8,
+                 rows: int = 4,
+                 n: int = 3, ):
+        if not 0 < threshold <= 1:
+            raise ValueError(f'The similarity threshold must be in (0, 1], but got {threshold}')
+        if bands < 1 or rows < 1:
+            raise ValueError(f'The number of bands and rows must be positive, but got {bands} x {rows}')
+
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = rows
+        self.n = n
+
+        # One bucket table per band, mapping the band of a MinHash sketch to representatives.
+        self._buckets: list[dict[tuple[int, ...], list[Rule]]] = [{} for _ in range(bands)]
+        # The n-grams of each representative, used to confirm the candidates found in the buckets.
+        self._ngrams: dict[Rule, set[str]] = {}
+        self._representatives: dict[Rule, Rule] = {}
+        self._members: dict[Rule, list[Rule]] = {}
+
+        for rule in rules:
+            self.add(rule)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def __str__(self) -> str:
+        return f'Rules: {len(self._representatives)}, Clusters: {len(self._members)}'
+
+    def __repr__(self) -> str:
+        return str(self)
+
+    @property
+    def representatives(self) -> list[Rule]:
+        return list(self._members)
+
+    def representative(self, rule: Rule) -> Rule:
+        """
+        return the representative of the cluster that the rule belongs to, or the rule itself if it is unknown.
+        """
+        return self._representatives.get(rule, rule)
+
+    def members(self, rule: Rule) -> list[Rule]:
+        """
+        return the rules of the cluster that the rule belongs to, the representative comes first.
+        """
+        return list(self._members.get(self.representative(rule), [rule]))
+
+    def add(self, rule: Rule):
+        if rule in self._representatives:
+            return
+
+        ngrams = get_ngrams(rule.fuzzy_signature, self.n)
+        if not ngrams:
+            self._representatives[rule] = rule
+            self._members[rule] = [rule]
+            return
+
+        band_keys = self._band_keys(ngrams)
+        compared = set()
+        for band, band_key in enumerate(band_keys):
+            for representative in self._buckets[band].get(band_key, []):
+                if representative in compared:
+                    continue
+                compared.add(representative)
+                if self._similarity(ngrams, self._ngrams[representative]) >= self.threshold:
+                    self._representatives[rule] = representative
+                    self._members[representative].append(rule)
+                    return
+
+        # No similar representative is found, so the rule leads a new cluster.
+        self._representatives[rule] = rule
+        self._members[rule] = [rule]
+        self._ngrams[rule] = ngrams
+        for band, band_key in enumerate(band_keys):
+            self._buckets[band].setdefault(band_key, []).append(rule)
+
+    def _band_keys(self, ngrams: set[str]) -> list[tuple[int, ...]]:
+        # One-permutation hashing: every n-gram is hashed only once and falls into one of the
+        # sketch bins, each bin keeping its minimum, so that sketching is linear in the number of n-grams.
+        size = self.bands * self.rows
+        sketch: list[int | None] = [None] * size
+        for ngram in ngrams:
+            # Multiplicative hashing spreads the CRC values evenly over the bins.
+            value = (zlib.crc32(ngram.encode('utf-8')) * self._MULTIPLIER) & 0xFFFFFFFF
+            position = value % size
+            value //= size
+            if sketch[position] is None or value < sketch[position]:
+                sketch[position] = value
+        # Densification: an empty bin borrows the value of the next non-empty bin, tagged with the
+        # distance to that bin, so that two sketches still agree on a bin with the MinHash probability.
+        for position in range(size):
+            if sketch[position] is None:
+                for distance in range(1, size):
+                    value = sketch[(position + distance) % size]
+                    if value is not None and value <= 0xFFFFFFFF:
+                        sketch[position] = value | (distance << 32)
+                        break
+        return [tuple(sketch[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    @staticmethod
+    def _similarity(ngrams1: set[str], ngrams2: set[str]) -> float:
+        intersection_size = len(ngrams1 & ngrams2)
+        return intersection_size / (len(ngrams1) + len(ngrams2) - intersection_size)
@@ -0,0 +1,251 @@
+import math
+import random
+from typing import NamedTuple, Sequence
+
+from rule.Rule import Rule
+from rule.options import Content, Isdataat, ByteTest, Dsize, Bufferlen
+
+
+class Footprint(NamedTuple):
+    """
+    The static constraints of the signature of a rule in one sticky buffer.
+    """
+    # The (start, end, length) of each content with a bounded absolute range, i.e., with a `depth` modifier.
+    windows: tuple[tuple[int, int, int], ...]
+    # The least and the greatest buffer length allowed by the `isdataat`, `dsize`, `bufferlen`
+    # and `byte_test` options, and by the contents at an absolute `offset`.
+    lower: int
+    upper: float
+    # The total length of the contents, which are laid out in the buffer one after another.
+    length: int
+    # The contents that must not appear anywhere in the buffer, and the contents that do appear.
+    negated: tuple[bytes, ...]
+    contents: tuple[bytes, ...]
+
+    @property
+    def constrained(self) -> bool:
+        return bool(self.windows or self.negated) or self.upper != math.inf
+
+
+class RuleCompatibility:
+    """
+    A precomputed compatibility graph of rules, i.e., which rules can be blended into the same test
+    packets (see `BlendingMutator`) without violating each other's signatures.
+
+    The signature of each rule is analyzed statically (see `Footprint`), and two rules of the same
+    service conflict in a sticky buffer they share if:
+        (1) two contents with bounded absolute ranges cannot be placed without overlapping, e.g.,
+        `content:"GET";depth:3;` and `content:"POST";depth:4;` both at the head of a buffer;
+        (2) the length allowed by one rule is less than the contents and the `isdataat` / `dsize`
+        lengths required by both, e.g., `isdataat:!10;` and a content of 20 bytes;
+        (3) a content of one rule contains a negated content of the other.
+
+    Only the rules with one of these constraints are compared with the other rules of their service
+    and buffer, and the rest of the rules (the vast majority) are compatible with each other, so the
+    graph is kept as the (sparse) sets of conflicting rules. The analysis is conservative about relative
+    modifiers (`distance`, `within` and relative `isdataat`), which it ignores, and rules whose signature
+    cannot be parsed are compatible with all rules, leaving them to fail in the generation.
+
+    Usage:
+    --------
+    >>> compatibility = RuleCompatibility(ruleset.activated_rules)
+    >>> compatibility.is_compatible(rule_a, rule_b)
+    >>> batch = compatibility.sample(rule_pool, 4)  # a set of pairwise-compatible rules
+    """
+
+    def __init__(self, rules: Sequence[Rule] = (), max_attempts: int = 100):
+        self.max_attempts = max_attempts
+
+        self._conflicts: dict[Rule, set[Rule]] = {}
+        # Whether a rule has a content at a bounded absolute range, which should be placed first in a batch.
+        self._anchored: set[Rule] = set()
+        # The footprints of all rules, and of the constrained ones, keyed by their (service, sticky buffer).
+        self._members: dict[tuple[str, str], list[tuple[Rule, Footprint]]] = {}
+        self._constrained: dict[tuple[str, str], list[tuple[Rule, Footprint]]] = {}
+
+        for rule in rules:
+            self.add(rule)
+
+    def __len__(self) -> int:
+        return sum(len(conflicts) for conflicts in self._conflicts.values()) // 2
+
+    def __str__(self) -> str:
+        return f'Conflicting rules: {len(self._conflicts)}, Conflicts: {len(self)}'
+
+    def __repr__(self) -> str:
+        return str(self)
+
+    @staticmethod
+    def footprints(rule: Rule) -> dict[str, Footprint]:
+        """
+        return the footprints of the signature of the rule, keyed by the sticky buffers.
+        """
+        try:
+            return {buffer: RuleCompatibility._footprint(options) for buffer, options in rule.signature.items()}
+        except Exception:
+            return {}
+
+    @staticmethod
+    def _footprint(options: list) -> Footprint:
+        windows, negated, contents = [], [], []
+        lower, upper, length = 0, math.inf, 0
+        for option in options:
+            if isinstance(option, Content):
+                data = option.bytes_matches
+                if not data:
+                    continue
+                if option['nocase']:
+                    data = data.lower()
+                positional = option['offset'] or option['depth'] or option['distance'] or option['within']
+                if option['negated']:
+                    if not positional:
+                        negated.append(data)
+                    continue
+                contents.append(data)
+                length += len(data)
+                offset = _to_int(option['offset'] or 0)
+                if option['distance'] or option['within'] or offset is None:
+                    continue
+                if option['depth']:
+                    depth = _to_int(option['depth'])
+                    if depth is None:
+                        continue
+                    windows.append((offset, offset + depth, len(data)))
+                lower = max(lower, offset + len(data))
+            elif isinstance(option, Isdataat):
+                location = _to_int(option['location'])
+                if option['relative'] or location is None:
+                    continue
+                if option['negated']:
+                    upper = min(upper, location)
+                else:
+                    lower = max(lower, location + 1)
+            elif isinstance(option, ByteTest):
+                offset, count = _to_int(option['offset'] or 0), _to_int(option['count'] or 0)
+                if not option['relative'] and offset is not None and count is not None:
+                    lower = max(lower, offset + count)
+            elif isinstance(option, Dsize):
+                minimum, maximum = _size_range(option['sign'], option['size'], option['min_size'], option['max_size'])
+                lower, upper = max(lower, minimum), min(upper, maximum)
+            elif isinstance(option, Bufferlen) and not option['relative']:
+                minimum, maximum = _size_range(option['sign'], option['length'],
+                                               option['min_length'], option['max_length'])
+                lower, upper = max(lower, minimum), min(upper, maximum)
+        return Footprint(tuple(windows), lower, upper, length, tuple(negated), tuple(contents))
+
+    @staticmethod
+    def conflict(a: Footprint, b: Footprint) -> bool:
+        """
+        return whether the signatures of two rules with the given footprints conflict in a sticky buffer.
+        """
+        # A rule that conflicts with itself is left to fail in the generation, instead of conflicting with all rules.
+        if a.lower <= a.upper and b.lower <= b.upper:
+            if max(a.lower, b.lower, a.length + b.length) > min(a.upper, b.upper):
+                return True
+        for start_a, end_a, length_a in a.windows:
+            for start_b, end_b, length_b in b.windows:
+                # Neither content fits before the other within their ranges.
+                if start_a + length_a > end_b - length_b and start_b + length_b > end_a - length_a:
+                    return True
+        return (any(pattern in data for pattern in a.negated for data in b.contents)
+                or any(pattern in data for pattern in b.negated for data in a.contents))
+
+    def add(self, rule: Rule):
+        """
+        Add a rule to the graph, connecting it with the rules it conflicts with.
+        """
+        for buffer, footprint in self.footprints(rule).items():
+            if footprint.windows:
+                self._anchored.add(rule)
+            for service in rule.services:
+                key = (service, buffer)
+                # Unconstrained footprints can only conflict with constrained ones.
+                candidates = self._members.get(key, []) if footprint.constrained else self._constrained.get(key, [])
+                for other, other_footprint in candidates:
+                    if other != rule and self.conflict(footprint, other_footprint):
+                        self._conflicts.setdefault(rule, set()).add(other)
+                        self._conflicts.setdefault(other, set()).add(rule)
+                self._members.setdefault(key, []).append((rule, footprint))
+                if footprint.constrained:
+                    self._constrained.setdefault(key, []).append((rule, footprint))
+
+    def conflicts(self, rule: Rule) -> set[Rule]:
+        return self._conflicts.get(rule, set())
+
+    def is_compatible(self, *rules: Rule) -> bool:
+        """
+        return whether the given rules are pairwise compatible, i.e., form a clique of the compatibility graph.
+        """
+        for i, rule in enumerate(rules):
+            conflicts = self._conflicts.get(rule)
+            if conflicts and not conflicts.isdisjoint(rules[i + 1:]):
+                return False
+        return True
+
+    def order(self, rules: list[Rule]) -> list[Rule]:
+        """
+        return the rules with bounded absolute contents first, so that the contents of the other rules
+        are laid out around them instead of taking the head of the buffer.
+        """
+        return sorted(rules, key=lambda rule: rule not in self._anchored)
+
+    def sample(self, rules, k: int) -> list[Rule]:
+        """
+        Sample k pairwise-compatible rules from the given rule pool (a `RulePool` or a list), where each rule
+        is drawn at random from the rules compatible with the ones drawn before it. If no compatible rule
+        turns up, the rest of the batch is drawn from all rules.
+        """
+        draw = rules.sample if hasattr(rules, 'sample') else lambda n: random.sample(rules, n)
+        if k > len(rules):
+            raise ValueError('Sample larger than the rule pool or is negative')
+
+        batch = draw(1)
+        excluded = set(batch) | self.conflicts(batch[0])
+        attempts = 0
+        while len(batch) < k:
+            rule = draw(1)[0]
+            if rule not in excluded:
+                batch.append(rule)
+                excluded.add(rule)
+                excluded |= self.conflicts(rule)
+                continue
+            attempts += 1
+            if attempts > self.max_attempts:
+                # Most rules are excluded, so the rest of the compatible rules are found by a scan.
+                candidates = [rule for rule in rules if rule not in excluded]
+                while candidates and len(batch) < k:
+                    rule = candidates.pop(random.randrange(len(candidates)))
+                    if rule not in excluded:
+                        batch.append(rule)
+                        excluded.add(rule)
+                        excluded |= self.conflicts(rule)
+                if len(batch) < k:
+                    batch.extend(random.sample([rule for rule in rules if rule not in batch], k - len(batch)))
+        return self.order(batch)
+
+
+def _to_int(value) -> int | None:
+    # Modifiers may refer to the variables of `byte_extract`, which are unknown statically.
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _size_range(sign: str | None, size: int | None, min_size: int | None, max_size: int | None) -> tuple[int, float]:
+    # return the range of sizes allowed by a `dsize` or `bufferlen` option.
+    if min_size is not None and max_size is not None:
+        return (min_size, max_size) if sign == '<=>' else (min_size + 1, max_size - 1)
+    match sign:
+        case '<':
+            return 0, size - 1
+        case '<=':
+            return 0, size
+        case '>':
+            return size + 1, math.inf
+        case '>=':
+            return size, math.inf
+        case '!':
+            return 0, math.inf
+        case _:
+            return size, size
@@ -0,0 +1,143 @@
+import hashlib
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+from rule.Rule import Rule
+from rule.options import Flowbits
+
+
+class IndexEntry(NamedTuple):
+    offset: int
+    length: int
+    # The lower-cased header protocol and `service:` values, joined by commas.
+    services: str
+    # The flowbits set and checked by the rule.
+    setters: frozenset[str]
+    checkers: frozenset[str]
+
+
+class RuleFileIndex:
+    """
+    An index of a rule file by service, built by a lightweight pre-scan that does not parse the rules.
+
+    Each line that looks like a rule is indexed by its byte offset, together with the header protocol,
+    the values of its `service:` options and the flowbits it sets or checks, which are all extracted
+    with a few byte-level patterns. This lets a fuzzing campaign of a single service fully parse only
+    the rules of that service (and the flowbit setters they depend on), instead of every rule in the file.
+
+    The pre-scan over-approximates: an option-like text inside a content string may add a service
+    or a flowbit to a line, which only causes an extra line to be parsed. Callers that need the exact
+    rules of a service still group the parsed rules, e.g., `RuleSet.from_files(..., proto='http')`.
+
+    Usage:
+    --------
+    >>> index = RuleFileIndex('snort3-community.rules')
+    >>> positions = index.select(['sip'])  # the SIP rules, and the flowbit setters they depend on
+    >>> for rule in index.iter_rules(['sip']):  # parses one rule at a time, in file order
+    ...     pass
+    """
+
+    # The same as `Rule._rule_pattern`, capturing the header only.
+    _rule_line_pattern = re.compile(rb'^#*[\s#]*([^()]+)\(.*\)$')
+    _service_pattern = re.compile(rb'(?:\(|;)\s*service\s*:\s*([^;]*)(?=;)')
+    _flowbits_pattern = re.compile(rb'(?:\(|;)\s*flowbits\s*:\s*(\w+)\s*,([^;]*)(?=;)')
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.entries: list[IndexEntry] = []
+        # Maps each flowbit to the positions of the entries that set it.
+        self._setters: dict[str, list[int]] = {}
+
+        offset = 0
+        with Path(file_path).open('rb') as f:
+            for line in f:
+                self._scan(line, offset)
+                offset += len(line)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _scan(self, line: bytes, offset: int):
+        m = self._rule_line_pattern.match(line.strip())
+        if m is None:
+            return
+        header = m.group(1).split(None, 2)
+        services = [header[1] if len(header) > 1 else header[0]]
+        # The substring tests are much cheaper than the patterns, and skip the lines without the options.
+        if b'service' in line:
+            services.extend(self._service_pattern.findall(line))
+        setters, checkers = set(), set()
+        for action, flowbits in (self._flowbits_pattern.findall(line) if b'flowbits' in line else ()):
+            action = action.decode('utf-8', 'replace')
+            names = {name.strip() for name in re.split(rb'[&|]', flowbits) if name.strip()}
+            names = {name.decode('utf-8', 'replace') for name in names}
+            if action in Flowbits.SET:
+                setters.update(names)
+            elif action in Flowbits.CHECK:
+                checkers.update(names)
+
+        position = len(self.entries)
+        self.entries.append(IndexEntry(offset, len(line),
+                                       b','.join(services).decode('utf-8', 'replace').lower(),
+                                       frozenset(setters), frozenset(checkers)))
+        for flowbit in setters:
+            self._setters.setdefault(flowbit, []).append(position)
+
+    def lookup(self, services: Iterable[str]) -> list[int]:
+        """
+        return the positions of the entries that may apply to any of the services, matched
+        case-insensitively as substrings (the same as `RuleSet.group(service=...)`).
+        """
+        services = [service.casefold() for service in services]
+        return [position for position, entry in enumerate(self.entries)
+                if any(service in entry.services for service in services)]
+
+    def select(self, services: Iterable[str], flowbits: Iterable[str] = ()) -> tuple[list[int], set[str]]:
+        """
+        Select the entries of the services, and the entries that set the given flowbits or the flowbits
+        checked by any selected entry, transitively.
+        :return:
+            List[int]: The positions of the selected entries, in file order.
+            Set[str]: The flowbits checked by the selected entries, including the given ones.
+        """
+        selected = set(self.lookup(services))
+        flowbits = set(flowbits)
+        for position in selected:
+            flowbits |= self.entries[position].checkers
+        pending = list(flowbits)
+        while pending:
+            flowbit = pending.pop()
+            for position in self._setters.get(flowbit, []):
+                if position in selected:
+                    continue
+                selected.add(position)
+                for checked_flowbit in self.entries[position].checkers - flowbits:
+                    flowbits.add(checked_flowbit)
+                    pending.append(checked_flowbit)
+        return sorted(selected), flowbits
+
+    def read(self, positions: list[int]) -> Iterator[tuple[bytes, re.Match]]:
+        """
+        Yields the digest and the match of the rule grammar of the (stripped) lines at the given positions,
+        the same as `RuleSet._read`. Lines that do not match the grammar are skipped.
+        """
+        with Path(self.file_path).open('rb') as f:
+            for position in positions:
+                entry = self.entries[position]
+                f.seek(entry.offset)
+                line = f.read(entry.length).decode('utf-8').strip()
+                if match := Rule.match(line):
+                    yield hashlib.blake2b(line.encode('utf-8'), digest_size=16).digest(), match
+
+    def iter_rules(self, services: Iterable[str] = None) -> Iterator[Rule]:
+        """
+        Yields the rules of the services (all rules if None) one at a time, in file order,
+        so that sequential consumers never hold the parsed rules of the whole file.
+        Flowbit setters of other services are not included.
+        """
+        positions = range(len(self.entries)) if services is None else self.lookup(services)
+        for _, match in self.read(list(positions)):
+            rule = Rule.from_match(match)
+            if rule is not None:
+                yield rule
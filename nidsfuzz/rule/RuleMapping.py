@@ -0,0 +1,96 @@
+from rule.Rule import Rule
+from rule.RuleSet import RuleSet
+from utils import get_ngrams
+
+
+class RuleMapping:
+    """
+    Maps the IDs of the rules loaded by other NIDS platforms (e.g., the Snort2 rules used by
+    Suricata and Snort2) to the IDs of the fuzzed rules (e.g., the Snort3 rules), so that alerts
+    raised by the same rule carry the same ID on every platform, even if the rule files differ
+    in their revisions.
+
+    A mapped rule is matched by its `gid:sid` first. The remaining rules fall back to the
+    fuzzy signature (see `Rule.fuzzy_signature`), and are matched to the most similar fuzzed
+    rule that has no counterpart yet, provided that the Jaccard similarity reaches the threshold.
+    Since mismatches are rare, the fallback only compares the unmatched rules of both sides.
+
+    Usage:
+    --------
+    >>> mapping = RuleMapping(RuleSet.from_file('snort3.rules'), RuleSet.from_file('snort2.rules'))
+    >>> mapping.normalize('1:1927:7')  # '1:1927:8'
+    """
+
+    def __init__(self, ruleset: RuleSet, mapped_ruleset: RuleSet, threshold: float = 0.8, n: int = 3):
+        if not 0 < threshold <= 1:
+            raise ValueError(f'The similarity threshold must be in (0, 1], but got {threshold}')
+
+        self.threshold = threshold
+        self.n = n
+
+        self._mapping: dict[str, str] = {}
+        self.num_signature_matches = 0
+        self.unmatched_rules: list[Rule] = []
+
+        # Maps `gid:sid` to the fuzzed rule, activated rules take precedence over commented ones.
+        sid_index: dict[str, Rule] = {}
+        for rule in ruleset.rules:
+            sid_index.setdefault(self._signature_id(rule.id), rule)
+
+        unmatched_rules = []
+        for rule in mapped_ruleset.rules:
+            # The IDs of the fuzzed rules are left as they are.
+            if rule.id in self._mapping or ruleset.find_rule(rule.id) is not None:
+                continue
+            matched_rule = sid_index.get(self._signature_id(rule.id))
+            if matched_rule is not None:
+                self._mapping[rule.id] = matched_rule.id
+            else:
+                unmatched_rules.append(rule)
+
+        # Only the fuzzed rules whose `gid:sid` is missing from the mapped rules are candidates.
+        mapped_sids = {self._signature_id(rule.id) for rule in mapped_ruleset.rules}
+        candidates = {rule: get_ngrams(rule.fuzzy_signature, n) for sid, rule in sid_index.items()
+                      if sid not in mapped_sids}
+        for rule in unmatched_rules:
+            matched_rule = self._most_similar(get_ngrams(rule.fuzzy_signature, n), candidates)
+            if matched_rule is None:
+                self.unmatched_rules.append(rule)
+            else:
+                self._mapping[rule.id] = matched_rule.id
+                self.num_signature_matches += 1
+                del candidates[matched_rule]
+
+    def __len__(self) -> int:
+        return len(self._mapping)
+
+    def __str__(self) -> str:
+        return f'Mapped Rules: {len(self._mapping)}, Matched by Signature: {self.num_signature_matches}, ' \
+               f'Unmatched Rules: {len(self.unmatched_rules)}'
+
+    def __repr__(self) -> str:
+        return str(self)
+
+    def normalize(self, rule_id: str) -> str:
+        """
+        return the ID of the fuzzed rule that corresponds to the given rule ID, or the ID itself if there is none.
+        """
+        return self._mapping.get(rule_id, rule_id)
+
+    @staticmethod
+    def _signature_id(rule_id: str) -> str:
+        # gid:sid:rev -> gid:sid
+        return rule_id.rsplit(':', 1)[0]
+
+    def _most_similar(self, ngrams: set[str], candidates: dict[Rule, set[str]]) -> Rule | None:
+        if not ngrams:
+            return None
+        best_rule, best_similarity = None, 0.0
+        for candidate, candidate_ngrams in candidates.items():
+            if not candidate_ngrams:
+                continue
+            intersection_size = len(ngrams & candidate_ngrams)
+            similarity = intersection_size / (len(ngrams) + len(candidate_ngrams) - intersection_size)
+            if similarity >= self.threshold and similarity > best_similarity:
+                best_rule, best_similarity = candidate, similarity
+        return best_rule
@@ -1,8 +1,18 @@
+import hashlib
+import os
+import re
 from pathlib import Path
+from typing import Iterator
 
+from logger import logger
 from rule.Rule import Rule
+from rule.RuleFileIndex import RuleFileIndex
+from rule.RuleSetCache import RuleSetCache
 from rule.options import Flowbits
 
+# The services and the flowbits that a partially loaded rule file is restricted to.
+Selection = tuple[tuple[str, ...], frozenset[str]]
+
 
 class RuleSet:
     """
@@ -14,12 +24,20 @@ class RuleSet:
     deserialize(cls, data: str) -> 'RuleSet':
         Deserializes a serialized string into a RuleSet object.
 
-    from_file(cls, file_path: str) -> 'RuleSet':
+    from_file(cls, file_path: str, cache_dir: str = None, services: list[str] = None) -> 'RuleSet':
         Creates a RuleSet object using all the rules from a rules file.
+        If a cache directory is given, the parsed RuleSet is loaded from (or stored into) it.
+        If services are given, only their rules (and the flowbit setters they depend on) are parsed.
 
     from_rules(cls, rules: list[Rule]) -> 'RuleSet':
         Creates a RuleSet object from rules.
 
+    find_rule(self, rule_id: str) -> Rule | None:
+        Finds a rule by its ID in constant time.
+
+    reload(self) -> tuple[list[Rule], list[Rule]]:
+        Re-reads the changed rule files, and updates the RuleSet object in place.
+
 
     Example Usage:
     --------
@@ -42,14 +60,39 @@ class RuleSet:
     >>> tcp_rules = ruleset.group(protocol='tcp')
     """
 
+    # The indexed attributes, see `_index`.
+    # (i) protocol, port and service: the case-folded value of the rule attribute.
+    # (ii) services: each service name the rule applies to.
+    # (iii) sticky_buffer: each sticky buffer used by the rule signature.
+    # (iv) feature: each detection feature of the rule, see `Rule.features`.
+    # (v) state: whether the rule is activated or commented.
+    INDEXED_ATTRIBUTES = ('protocol', 'port', 'service', 'services', 'sticky_buffer', 'feature', 'state')
+
     def __init__(self):
         self._activated_rules: list[Rule] = []
         self._commented_rules: list[Rule] = []
-        self._unresolved_rules: list[str] = []
+        # The lines that look like rules but cannot be parsed, keyed by the line digest.
+        self._unresolved_rules: dict[bytes, str] = {}
 
         self._set_flowbits: dict[str, list[Rule]] = {}
         self._check_flowbits: dict[str, list[Rule]] = {}
 
+        # Maps the rule ID to the rule, activated rules take precedence over commented ones.
+        self._rule_index: dict[str, Rule] = {}
+
+        # Every rule in insertion order. Bit i of a bitmap refers to the i-th rule of this list.
+        self._positions: list[Rule] = []
+        # Inverted indexes mapping attribute values to bitmaps. They are built lazily on
+        # the first query and extended incrementally when new rules are added.
+        self._indexes: dict[str, dict[str, int]] = {}
+        self._indexed_positions: dict[str, int] = {}
+
+        # The rule files the rules are loaded from, see `reload`. Each file is mapped to its
+        # modification time and size, to the rules parsed from each line (keyed by the line digest,
+        # an unresolved line has no rule), and to the services and flowbits the file is restricted
+        # to (None if fully loaded).
+        self._sources: dict[str, tuple[tuple[int, int], dict[bytes, list[Rule]], Selection | None]] = {}
+
     @property
     def rules(self) -> list[Rule]:
         return [*self._activated_rules, *self._commented_rules]
@@ -75,75 +118,234 @@ class RuleSet:
     def __add__(self, other: 'RuleSet') -> 'RuleSet':
         if isinstance(other, RuleSet):
             res = RuleSet()
-            res._activated_rules = self._activated_rules + other._activated_rules
-            res._commented_rules = self._commented_rules + other._commented_rules
-            res._resolve_flowbits()
+            for rule in [*self._activated_rules, *other._activated_rules,
+                         *self._commented_rules, *other._commented_rules]:
+                res._add_rule(rule)
+            # Merge the flowbits instead of resolving them from scratch. The order of rules
+            # is the same as resolving them over `res.rules`.
+            for flowbits_map in ('_set_flowbits', '_check_flowbits'):
+                merged_map = getattr(res, flowbits_map)
+                for flowbit in getattr(self, flowbits_map).keys() | getattr(other, flowbits_map).keys():
+                    self_rules = getattr(self, flowbits_map).get(flowbit, [])
+                    other_rules = getattr(other, flowbits_map).get(flowbit, [])
+                    merged_map[flowbit] = [*[r for r in self_rules if r.activated],
+                                           *[r for r in other_rules if r.activated],
+                                           *[r for r in self_rules if not r.activated],
+                                           *[r for r in other_rules if not r.activated]]
+            res._unresolved_rules = {**self._unresolved_rules, **other._unresolved_rules}
+            res._sources = {**self._sources, **other._sources}
             return res
         else:
             return NotImplemented
 
-    def group(self, protocol: str = None, port: str = None, service: str = None) -> 'RuleSet':
+    def group(self,
+              protocol: str = None,
+              port: str = None,
+              service: str = None,
+              sticky_buffer: str = None, ) -> 'RuleSet':
         """
         When Snort starts or reloads configuration, rules are grouped by protocol, port and service.
         For example, all TCP rules using the HTTP_PORTS variable will go in one group and
         all service HTTP rules will go in another group. These rule groups are compiled
         into multi-pattern search engines (MPSE) which are designed to search for all
         patterns with just a single pass through a given packet or buffer.
-        """
-        rule_group = RuleSet()
 
-        def _group(criteria: dict[str, str]):
-            for rule in self._activated_rules:
-                for k, v in criteria.items():
-                    # case-insensitive comparison
-                    if v.casefold() not in getattr(rule, k).casefold():
-                        break
-                else:
-                    rule_group._activated_rules.append(rule)
-            for rule in self._commented_rules:
-                for k, v in criteria.items():
-                    # case-insensitive comparison
-                    if v.casefold() not in getattr(rule, k).casefold():
-                        break
-                else:
-                    rule_group._commented_rules.append(rule)
-
-        criteria = {}
+        Note: protocol, port and service are matched case-insensitively as substrings
+        of the rule attributes, while sticky_buffer must be used by the rule signature.
+        """
+        bitmap = self._full_bitmap()
         if protocol is not None:
-            criteria['protocol'] = protocol
+            bitmap &= self._lookup('protocol', protocol)
         if port is not None:
-            criteria['port'] = port
+            bitmap &= self._lookup('port', port)
+        if service is not None:
+            bitmap &= self._lookup('service', service)
+        if sticky_buffer is not None:
+            bitmap &= self.bitmap(sticky_buffer=sticky_buffer)
+        return self.subset(bitmap)
+
+    def bitmap(self, feature: str = None, sticky_buffer: str = None, service: str = None) -> int:
+        """
+        Returns the bitmap of rules that have the given feature (see `Rule.features`),
+        use the given sticky buffer or apply to the given service name.
+        Bitmaps can be combined with bitwise operators and turned into a RuleSet by `subset`.
+
+        Example Usage:
+        --------
+        >>> pcre_only = ruleset.subset(ruleset.bitmap(feature='pcre') & ~ruleset.bitmap(feature='content'))
+        """
+        bitmap = self._full_bitmap()
+        if feature is not None:
+            bitmap &= self._index('feature').get(feature, 0)
+        if sticky_buffer is not None:
+            bitmap &= self._index('sticky_buffer').get(sticky_buffer.lower(), 0)
         if service is not None:
-            criteria['service'] = service
-        _group(criteria)
-        rule_group._resolve_flowbits()
+            bitmap &= self._index('services').get(service.lower(), 0)
+        return bitmap
+
+    def subset(self, bitmap: int) -> 'RuleSet':
+        """
+        Creates a RuleSet object from the rules selected by the bitmap.
+        """
+        rule_group = RuleSet()
+        for rule in self._select(bitmap):
+            rule_group._add_rule(rule)
+        # Restrict the flowbits of this RuleSet instead of resolving them from scratch.
+        selected_rules = set(rule_group._positions)
+        for flowbits_map in ('_set_flowbits', '_check_flowbits'):
+            for flowbit, rules in getattr(self, flowbits_map).items():
+                rules = [rule for rule in rules if rule in selected_rules]
+                if rules:
+                    getattr(rule_group, flowbits_map)[flowbit] = rules
         return rule_group
 
+    def partition(self) -> dict[str, list[Rule]]:
+        """
+        Groups the activated rules according to each service name they apply to.
+        The services are ordered by the first activated rule applied to them.
+        """
+        activated_bitmap = self._index('state').get('activated', 0)
+        activated_bitmaps = {service: bitmap & activated_bitmap for service, bitmap in
+                             self._index('services').items()}
+        activated_bitmaps = {service: bitmap for service, bitmap in activated_bitmaps.items() if bitmap}
+        result = {}
+        # The lowest set bit of a bitmap is the position of its first rule.
+        for service in sorted(activated_bitmaps, key=lambda s: activated_bitmaps[s] & -activated_bitmaps[s]):
+            result[service] = self._select(activated_bitmaps[service])
+        return result
+
+    def _full_bitmap(self) -> int:
+        return (1 << len(self._positions)) - 1
+
+    def _select(self, bitmap: int) -> list[Rule]:
+        bitmap &= self._full_bitmap()
+        # The bits are scanned from the least significant one, i.e., in insertion order.
+        return [self._positions[position] for position, bit in enumerate(reversed(bin(bitmap)[2:])) if bit == '1']
+
+    def _lookup(self, attribute: str, value: str) -> int:
+        # case-insensitive substring comparison over the distinct attribute values
+        value = value.casefold()
+        bitmap = 0
+        for indexed_value, indexed_bitmap in self._index(attribute).items():
+            if value in indexed_value:
+                bitmap |= indexed_bitmap
+        return bitmap
+
+    @staticmethod
+    def _attribute_values(rule: Rule, attribute: str) -> set[str]:
+        match attribute:
+            case 'protocol' | 'port' | 'service':
+                return {getattr(rule, attribute).casefold()}
+            case 'services':
+                return set(rule.services)
+            case 'sticky_buffer':
+                return rule.sticky_buffers
+            case 'feature':
+                return set(rule.features)
+            case 'state':
+                return {'activated' if rule.activated else 'commented'}
+            case _:
+                raise ValueError(f'Unsupported indexed attribute: {attribute}')
+
+    def _index(self, attribute: str) -> dict[str, int]:
+        index = self._indexes.setdefault(attribute, {})
+        start = self._indexed_positions.get(attribute, 0)
+        if start < len(self._positions):
+            new_positions: dict[str, list[int]] = {}
+            for position in range(start, len(self._positions)):
+                for value in self._attribute_values(self._positions[position], attribute):
+                    new_positions.setdefault(value, []).append(position)
+            for value, positions in new_positions.items():
+                index[value] = index.get(value, 0) | self._to_bitmap(positions)
+            self._indexed_positions[attribute] = len(self._positions)
+        return index
+
+    @staticmethod
+    def _to_bitmap(positions: list[int]) -> int:
+        # Setting the bits in a bytearray avoids creating a new (large) integer for every position.
+        buffer = bytearray(positions[-1] // 8 + 1)
+        for position in positions:
+            buffer[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(buffer, 'little')
+
     @classmethod
-    def from_file(cls, file_path: str) -> 'RuleSet':
+    def from_file(cls,
+                  file_path: str,
+                  cache_dir: str = None,
+                  services: list[str] = None,
+                  flowbits: set[str] = None,
+                  index: RuleFileIndex = None, ) -> 'RuleSet':
+        """
+        If services are given, the rule file is pre-scanned (see `RuleFileIndex`), and only the rules that
+        may apply to the services are parsed, together with the rules that set the given flowbits or the
+        flowbits checked by the parsed rules. A partially loaded RuleSet is cached under its selection of
+        services and flowbits. The pre-scanned index of the file may be given if the caller already has one.
+        """
+        selection = None
+        if services is not None:
+            selection = (tuple(services), frozenset(flowbits or ()))
+
+        cache = RuleSetCache(cache_dir) if cache_dir is not None else None
+        if cache is not None and (rule_set := cache.load(file_path, selection)) is not None:
+            # The cached entry may have been stored from another path of the same content,
+            # so the rule file is tracked under the requested path from now on.
+            (_, line_rules, _), = rule_set._sources.values()
+            rule_set._sources = {str(Path(file_path).resolve()): (cls._stat(file_path), line_rules, selection)}
+            return rule_set
+
         rule_set = cls()
 
-        with Path(file_path).open("r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if Rule.is_valid(line):
-                    rule = Rule.from_string(line)
-                    if rule is None:
-                        # print(f"Not Implemented rule format: {line}")
-                        rule_set._unresolved_rules.append(line)
-                    elif rule.activated:
-                        rule_set._activated_rules.append(rule)
-                    else:
-                        rule_set._commented_rules.append(rule)
+        line_rules = {}
+        stat = cls._stat(file_path)
+        for digest, match in cls._read(file_path, selection, index):
+            rule = Rule.from_match(match)
+            if rule is None:
+                # print(f"Not Implemented rule format: {line}")
+                rule_set._unresolved_rules[digest] = match.string
+                line_rules.setdefault(digest, [])
+            else:
+                rule_set._add_rule(rule)
+                line_rules.setdefault(digest, []).append(rule)
+        rule_set._sources[str(Path(file_path).resolve())] = (stat, line_rules, selection)
         rule_set._resolve_flowbits()
+
+        if cache is not None:
+            cache.store(file_path, rule_set, selection)
         return rule_set
 
     @classmethod
-    def from_files(cls, file_paths: list[str], proto: str = None):
+    def from_files(cls,
+                   file_paths: list[str],
+                   proto: str = None,
+                   cache_dir: str = None,
+                   services: list[str] = None, ):
+        """
+        Creates a RuleSet object from several rule files. If a protocol is given, the rules are grouped by
+        it (see `group`). If services (or a protocol) are given, the rule files are loaded partially, i.e.,
+        only the rules of the services and the flowbit setters they depend on, even across rule files.
+        """
+        if proto is not None:
+            services = [proto, *(services or [])]
+
+        # The flowbits checked by the selected rules of every file, so that their setters are loaded
+        # from whichever file they are in.
+        flowbits = None
+        if services is not None:
+            flowbits = set()
+            indexes = [RuleFileIndex(file_path) for file_path in file_paths]
+            while True:
+                checked_flowbits = set(flowbits)
+                for index in indexes:
+                    checked_flowbits |= index.select(services, flowbits)[1]
+                if checked_flowbits == flowbits:
+                    break
+                flowbits = checked_flowbits
+
         # load rule files
         rule_pool = None
-        for file_path in file_paths:
-            ruleset = RuleSet.from_file(file_path)
+        for position, file_path in enumerate(file_paths):
+            ruleset = RuleSet.from_file(file_path, cache_dir=cache_dir, services=services, flowbits=flowbits,
+                                        index=indexes[position] if services is not None else None)
             if rule_pool is None:
                 rule_pool = ruleset
             else:
@@ -155,20 +357,58 @@ class RuleSet:
 
         return rule_pool
 
+    @classmethod
+    def stream(cls, file_paths: list[str], services: list[str] = None) -> Iterator[Rule]:
+        """
+        Yields the rules of the services (all rules if None) from the rule files one at a time, in file
+        order, without building a RuleSet, e.g., for a single sequential pass over large rule files.
+        Since the flowbits are not resolved, the flowbit setters of other services are not included.
+        """
+        for file_path in file_paths:
+            yield from RuleFileIndex(file_path).iter_rules(services)
+
     @classmethod
     def from_rules(cls, rules: list[Rule]) -> 'RuleSet':
         rule_set = cls()
         for rule in rules:
-            if rule.activated:
-                rule_set._activated_rules.append(rule)
-            else:
-                rule_set._commented_rules.append(rule)
+            rule_set._add_rule(rule)
         rule_set._resolve_flowbits()
         return rule_set
 
 
-    def _resolve_flowbits(self):
-        for rule in self.rules:
+    def _add_rule(self, rule: Rule):
+        if rule.activated:
+            self._activated_rules.append(rule)
+        else:
+            self._commented_rules.append(rule)
+        self._positions.append(rule)
+
+        self._index_id(rule)
+
+    def _index_id(self, rule: Rule):
+        indexed_rule = self._rule_index.get(rule.id)
+        if indexed_rule is None or (rule.activated and not indexed_rule.activated):
+            self._rule_index[rule.id] = rule
+
+    def _remove_rules(self, rules: list[Rule]):
+        # Rules are compared by identity, since the same rule may appear in several rule files.
+        removed_rules = {id(rule) for rule in rules}
+        for rule_list in (self._activated_rules, self._commented_rules, self._positions):
+            rule_list[:] = [rule for rule in rule_list if id(rule) not in removed_rules]
+        for flowbits_map in (self._set_flowbits, self._check_flowbits):
+            for flowbit in list(flowbits_map):
+                flowbits_map[flowbit] = [rule for rule in flowbits_map[flowbit] if id(rule) not in removed_rules]
+                if not flowbits_map[flowbit]:
+                    del flowbits_map[flowbit]
+        self._rule_index.clear()
+        for rule in self._positions:
+            self._index_id(rule)
+        # The positions of the remaining rules have shifted, so the indexes are rebuilt on the next query.
+        self._indexes.clear()
+        self._indexed_positions.clear()
+
+    def _resolve_flowbits(self, rules: list[Rule] = None):
+        for rule in (self.rules if rules is None else rules):
             if rule.get('flowbits') is None:
                 continue
             for flowbits in rule.get('flowbits'):
@@ -179,7 +419,102 @@ class RuleSet:
                     self._check_flowbits.setdefault(check_flowbits, []).append(rule)
 
     def find_rule(self, rule_id: str) -> Rule | None:
-        return next((rule for rule in self.rules if rule.id == rule_id), None)
+        return self._rule_index.get(rule_id)
+
+    def diff(self, baseline: 'RuleSet') -> list[Rule]:
+        """
+        Compares the rules with the ones of a baseline RuleSet (e.g., loaded from the rule files before an update)
+        by their canonical text, which covers their IDs, revisions and states.
+        :return:
+            The activated rules that are added or changed since the baseline, together with the activated rules
+            that check a flowbit whose setters are added, changed or removed, in the order of this RuleSet.
+        """
+        baseline_keys = {rule.key for rule in baseline.rules}
+        changed_rules = {rule for rule in self._activated_rules if rule.key not in baseline_keys}
+
+        for flowbit in self._set_flowbits.keys() | baseline._set_flowbits.keys():
+            setters = {rule.key for rule in self._set_flowbits.get(flowbit, [])}
+            baseline_setters = {rule.key for rule in baseline._set_flowbits.get(flowbit, [])}
+            if setters != baseline_setters:
+                changed_rules.update(rule for rule in self._check_flowbits.get(flowbit, []) if rule.activated)
+
+        return [rule for rule in self._activated_rules if rule in changed_rules]
+
+    def reload(self) -> tuple[list[Rule], list[Rule]]:
+        """
+        Re-reads the rule files that have changed since they were loaded, and updates the rules,
+        the flowbits and the indexes in place. Lines are compared by their digest, so only the
+        added or modified lines are parsed, while unchanged lines keep their Rule objects (and
+        any state attached to them elsewhere, e.g., by selectors or analyzers).
+
+        Note: RuleSet objects created by `group` or `subset` do not keep track of the rule files.
+        :return:
+            List[Rule]: The added rules, including the new version of modified rules.
+            List[Rule]: The removed rules, including the old version of modified rules.
+        """
+        added_rules, removed_rules = [], []
+        for file_path, (stat, line_rules, selection) in list(self._sources.items()):
+            try:
+                new_stat = self._stat(file_path)
+                if new_stat == stat:
+                    continue
+                unchanged_rules = {digest: list(rules) for digest, rules in line_rules.items()}
+                new_line_rules = {}
+                for digest, match in self._read(file_path, selection):
+                    if unchanged_rules.get(digest):
+                        rule = unchanged_rules[digest].pop()
+                    elif digest in self._unresolved_rules:
+                        new_line_rules.setdefault(digest, [])
+                        continue
+                    else:
+                        rule = Rule.from_match(match)
+                        if rule is None:
+                            self._unresolved_rules[digest] = match.string
+                            new_line_rules.setdefault(digest, [])
+                            continue
+                        added_rules.append(rule)
+                    new_line_rules.setdefault(digest, []).append(rule)
+            except OSError as e:
+                logger.warning(f'Failed to reload the rule file [{file_path}]: {e}')
+                continue
+            for rules in unchanged_rules.values():
+                removed_rules.extend(rules)
+            self._sources[file_path] = (new_stat, new_line_rules, selection)
+            # The unresolved lines that have been removed from every rule file are forgotten.
+            for digest in line_rules.keys() - new_line_rules.keys():
+                if digest in self._unresolved_rules and \
+                        not any(digest in other_line_rules for _, other_line_rules, _ in self._sources.values()):
+                    del self._unresolved_rules[digest]
+
+        if removed_rules:
+            self._remove_rules(removed_rules)
+        for rule in added_rules:
+            self._add_rule(rule)
+        self._resolve_flowbits(added_rules)
+        return added_rules, removed_rules
+
+    @staticmethod
+    def _stat(file_path: str) -> tuple[int, int]:
+        stat = os.stat(file_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _read(file_path: str,
+              selection: Selection = None,
+              index: RuleFileIndex = None, ) -> Iterator[tuple[bytes, re.Match]]:
+        """
+        Yields the digest of each (stripped) line that looks like a rule, and its match of the rule grammar.
+        If a selection is given, only the lines selected by the services and the flowbits are read.
+        """
+        if selection is not None:
+            index = index if index is not None else RuleFileIndex(file_path)
+            yield from index.read(index.select(*selection)[0])
+            return
+        with Path(file_path).open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if match := Rule.match(line):
+                    yield hashlib.blake2b(line.encode('utf-8'), digest_size=16).digest(), match
 
 if __name__ == '__main__':
     rule_file = Path(__file__).parent.parent.parent / 'resources' / 'rules' / 'snort3-community.rules'
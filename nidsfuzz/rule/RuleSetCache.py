@@ -0,0 +1,78 @@
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from logger import logger
+
+if TYPE_CHECKING:
+    from rule.RuleSet import RuleSet, Selection
+
+
+class RuleSetCache:
+    """
+    An on-disk cache of parsed RuleSet objects.
+
+    Each entry is keyed by the SHA-256 digest of the rule file content and the
+    version of the rule parser, so that a modified rule file or an upgraded
+    parser never hits a stale entry. A partially loaded RuleSet (see
+    `RuleSet.from_file`) is keyed by its selection of services and flowbits
+    as well. Entries are written atomically, which lets several fuzzing
+    workers share the same cache directory.
+
+    Note: entries are pickled, so the cache directory must only be writable by
+    trusted users.
+
+    Usage:
+    --------
+    >>> cache = RuleSetCache('~/.cache/nidsfuzz')
+    >>> ruleset = cache.load('snort3-community.rules')  # None on a cache miss
+    >>> cache.store('snort3-community.rules', RuleSet.from_file('snort3-community.rules'))
+    """
+
+    # Bump this version whenever the in-memory representation of rules changes.
+    PARSER_VERSION = 8
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir).expanduser()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def digest(file_path: str) -> str:
+        sha256 = hashlib.sha256()
+        with Path(file_path).open('rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def entry(self, file_path: str, selection: Optional['Selection'] = None) -> Path:
+        if selection is None:
+            return self.cache_dir / f'{self.digest(file_path)}-v{self.PARSER_VERSION}.pickle'
+        services, flowbits = selection
+        selection_digest = hashlib.sha256(repr((sorted(services), sorted(flowbits))).encode('utf-8')).hexdigest()
+        return self.cache_dir / f'{self.digest(file_path)}-{selection_digest[:16]}-v{self.PARSER_VERSION}.pickle'
+
+    def load(self, file_path: str, selection: Optional['Selection'] = None) -> 'RuleSet | None':
+        entry = self.entry(file_path, selection)
+        if not entry.exists():
+            return None
+        try:
+            with entry.open('rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            logger.warning(f'Discarding the corrupted cache entry [{entry}]: {e}')
+            entry.unlink(missing_ok=True)
+            return None
+
+    def store(self, file_path: str, ruleset: 'RuleSet', selection: Optional['Selection'] = None):
+        entry = self.entry(file_path, selection)
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(ruleset, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, entry)
+        except Exception:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
@@ -3,4 +3,10 @@ from .constants import *
 
 from .Rule import Rule
 from .RuleSet import RuleSet
+from .RuleSetCache import RuleSetCache
+from .RuleFileIndex import RuleFileIndex
 
+
+from .RuleClusters import RuleClusters
+from .RuleMapping import RuleMapping
+from .RuleCompatibility import RuleCompatibility
\ No newline at end of file
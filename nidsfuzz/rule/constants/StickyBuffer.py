@@ -49,11 +49,8 @@ class StickyBuffer(enum.StrEnum):
         raise ValueError(f'{buffer} is not a valid sticky buffer.')
 
     @classmethod
-    def all(cls) -> set[str]:
-        all_buffers = set()
-        for member in cls:
-            all_buffers.add(member.value)
-        return all_buffers
+    def all(cls) -> frozenset[str]:
+        return _ALL_STICKY_BUFFERS
 
     def proto(self) -> Proto | None:
         proto = self.name.split("_", 1)[0]
@@ -63,6 +60,10 @@ class StickyBuffer(enum.StrEnum):
             return None
 
 
+# The members never change, so the set of all sticky buffers is built only once.
+_ALL_STICKY_BUFFERS = frozenset(member.value for member in StickyBuffer)
+
+
 if __name__ == '__main__':
     buffer = StickyBuffer.HTTP_HEADER
     print(f'The value of buffer: {buffer.value}')
@@ -28,15 +28,19 @@ class Bufferlen(Option):
     SINGLE_VALUE_PATTERN = re.compile(r'^(?P<sign><|>|=|!|<=|>=)?(?P<length>\d+)(?P<relative>,relative)?$')
     RANGE_PATTERN = re.compile(r'^(?P<minlen>\d+)(?P<sign>(<>|<=>))(?P<maxlen>\d+)(?P<relative>,relative)?$')
 
+    __slots__ = ('_range',)
+
+    FIELDS = {
+        "length": None,
+        "min_length": None,
+        "max_length": None,
+        "sign": None,
+        "relative": False,
+    }
+
     def __init__(self, raw: str):
-        super(Bufferlen, self).__init__()
-        self.raw = raw
+        super().__init__(raw)
         self._range = False
-        self["length"] = None
-        self["min_length"] = None
-        self["max_length"] = None
-        self["sign"] = None
-        self["relative"] = False
 
     def __str__(self):
         return f"bufferlen:{self.raw};"
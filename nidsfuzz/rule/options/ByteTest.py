@@ -47,22 +47,23 @@ class ByteTest(Option):
                          r',?\s*(?P<bitmask>bitmask [^,]+)?'
                          r'$')
 
-    def __init__(self, raw: str):
-        super().__init__()
-        self.raw = raw
-        self["count"] = None
-        self["negated"] = False
-        self["operator"] = None
-        self["compare"] = None
-        self["offset"] = None
-        self["relative"] = False
-        self["endian"] = "big"
-        self["string"] = False
-        self["dec"] = False
-        self["hex"] = False
-        self["oct"] = False
-        self["dce"] = False
-        self["bitmask"] = None
+    __slots__ = ()
+
+    FIELDS = {
+        "count": None,
+        "negated": False,
+        "operator": None,
+        "compare": None,
+        "offset": None,
+        "relative": False,
+        "endian": "big",
+        "string": False,
+        "dec": False,
+        "hex": False,
+        "oct": False,
+        "dce": False,
+        "bitmask": None,
+    }
 
     def __str__(self):
         return f"byte_test:{self.raw};"
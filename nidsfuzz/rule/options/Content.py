@@ -1,4 +1,5 @@
 import re
+import sys
 
 from utils import hex2str
 from rule.options import Option
@@ -28,20 +29,21 @@ class Content(Option):
 
     CONTENT_PATTERN = re.compile(r'^(?P<match>!?".+"),?\s*(?P<modifiers>.*)')  # greedy match
 
-    def __init__(self, raw: str):
-        super(Content, self).__init__()
-        self.raw = raw
-        self["match"] = None
-        self["nocase"] = False
-        self["rawbytes"] = False
-        self["fast_pattern"] = False
-        self["fast_pattern_offset"] = None
-        self["fast_pattern_length"] = None
-        self["offset"] = None
-        self["depth"] = None
-        self["distance"] = None
-        self["within"] = None
-        self["negated"] = False
+    __slots__ = ()
+
+    FIELDS = {
+        "match": None,
+        "nocase": False,
+        "rawbytes": False,
+        "fast_pattern": False,
+        "fast_pattern_offset": None,
+        "fast_pattern_length": None,
+        "offset": None,
+        "depth": None,
+        "distance": None,
+        "within": None,
+        "negated": False,
+    }
 
     def __str__(self):
         return f"content:{self.raw};"
@@ -64,7 +66,8 @@ class Content(Option):
                     content[modifier] = True
                 else:
                     key = modifier.split()[0]
-                    value = modifier.split()[1]
+                    # modifier values (e.g., offsets) recur across rules, so they are interned
+                    value = sys.intern(modifier.split()[1])
                     if key not in content:
                         raise Exception(f"Invalid modifier: {modifier}. Full string is: {raw}")
                     else:
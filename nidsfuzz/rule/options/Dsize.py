@@ -27,14 +27,18 @@ class Dsize(Option):
     SINGLE_VALUE_PATTERN = re.compile(r'^(?P<sign><|>|=|!|<=|>=)?(?P<size>\d+)$')
     RANGE_PATTERN = re.compile(r'^(?P<minsize>\d+)(?P<sign>(<>|<=>))(?P<maxsize>\d+)$')
 
+    __slots__ = ('_range',)
+
+    FIELDS = {
+        "size": None,
+        "min_size": None,
+        "max_size": None,
+        "sign": None,
+    }
+
     def __init__(self, raw: str):
-        super().__init__()
-        self.raw = raw
+        super().__init__(raw)
         self._range = False
-        self["size"] = None
-        self["min_size"] = None
-        self["max_size"] = None
-        self["sign"] = None
 
     def __str__(self):
         return f"dsize:{self.raw};"
@@ -29,20 +29,21 @@ class Flow(Option):
     >>> # ('only_stream', False), ('no_frag', False), ('only_frag', False)])
     """
 
-    def __init__(self, raw: str):
-        super().__init__()
-        self.raw = raw
-        self["to_client"] = False
-        self["to_server"] = False
-        self["from_client"] = False
-        self["from_server"] = False
-        self["established"] = False
-        self["not_established"] = False
-        self["stateless"] = False
-        self["no_stream"] = False
-        self["only_stream"] = False
-        self["no_frag"] = False
-        self["only_frag"] = False
+    __slots__ = ()
+
+    FIELDS = {
+        "to_client": False,
+        "to_server": False,
+        "from_client": False,
+        "from_server": False,
+        "established": False,
+        "not_established": False,
+        "stateless": False,
+        "no_stream": False,
+        "only_stream": False,
+        "no_frag": False,
+        "only_frag": False,
+    }
 
     def __str__(self):
         return f"flow:{self.raw};"
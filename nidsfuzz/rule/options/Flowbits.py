@@ -34,14 +34,15 @@ class Flowbits(Option):
     SET = ["set", "setx", "unset", "toggle"]
     CHECK = ["isset", "isnotset"]
 
-    def __init__(self, raw: str):
-        super().__init__()
-        self.raw = raw
-        self["set"] = None
-        self["unset"] = None
-        self["isset"] = None
-        self["isnotset"] = None
-        self["noalert"] = False
+    __slots__ = ()
+
+    FIELDS = {
+        "set": None,
+        "unset": None,
+        "isset": None,
+        "isnotset": None,
+        "noalert": False,
+    }
 
     def __str__(self):
         return f"flowbits:{self.raw};"
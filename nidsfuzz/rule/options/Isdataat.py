@@ -26,12 +26,13 @@ class Isdataat(Option):
 
     PATTERN = re.compile(r'^(?P<negated>!)?\s*(?P<location>\d+)\s*(?P<relative>,\s*relative)?$')
 
-    def __init__(self, raw: str):
-        super().__init__()
-        self.raw = raw
-        self["negated"] = False
-        self["location"] = None
-        self["relative"] = False
+    __slots__ = ()
+
+    FIELDS = {
+        "negated": False,
+        "location": None,
+        "relative": False,
+    }
 
     def __str__(self):
         return f"isdataat:{self.raw};"
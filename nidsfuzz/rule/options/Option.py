@@ -1,12 +1,52 @@
 import abc
+import sys
+from collections.abc import Mapping
+from typing import Any
 
-class Option(dict, metaclass=abc.ABCMeta):
+
+class Option(Mapping, metaclass=abc.ABCMeta):
+    """
+    A parsed rule option. Options are read like dicts, e.g., `content['offset']`,
+    `option.get('relative')` or `option.items()`, but each instance only keeps
+    its raw string and a list of values, while the field names (interned) and
+    their order are shared by all options of the same class through `FIELDS`.
+    """
+
+    __slots__ = ('raw', '_values')
+
+    # The fields of the option with their default values, in declaration order.
+    FIELDS: dict[str, Any] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_index = {sys.intern(field): index for index, field in enumerate(cls.FIELDS)}
+
+    def __init__(self, raw: str):
+        self.raw = raw
+        self._values = list(self.FIELDS.values())
 
     @classmethod
     @abc.abstractmethod
     def from_string(cls, raw: str):
         pass
 
+    def __getitem__(self, field: str) -> Any:
+        return self._values[self._field_index[field]]
+
+    def __setitem__(self, field: str, value: Any):
+        if field not in self._field_index:
+            raise KeyError(f'Unknown field of {type(self).__name__}: {field}')
+        self._values[self._field_index[field]] = value
+
+    def __contains__(self, field) -> bool:
+        return field in self._field_index
+
+    def __iter__(self):
+        return iter(self._field_index)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
     @abc.abstractmethod
     def __str__(self):
         pass
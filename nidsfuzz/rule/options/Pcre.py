@@ -25,21 +25,22 @@ class Pcre(Option):
     """
     PCRE_PATTERN = re.compile(r'^(?P<negated>!)?"(?P<match>/.*/)(?P<flags>[ismxAEGOR]*)"$')  # greedy match
 
-    def __init__(self, raw: str):
-        super(Pcre, self).__init__()
-        self.raw = raw
-        self["match"] = None
-        self["negated"] = False
-        self["flags"] = None
-        self["i"] = False
-        self["s"] = False
-        self["m"] = False
-        self["x"] = False
-        self["A"] = False
-        self["E"] = False
-        self["G"] = False
-        self["O"] = False
-        self["R"] = False
+    __slots__ = ()
+
+    FIELDS = {
+        "match": None,
+        "negated": False,
+        "flags": None,
+        "i": False,
+        "s": False,
+        "m": False,
+        "x": False,
+        "A": False,
+        "E": False,
+        "G": False,
+        "O": False,
+        "R": False,
+    }
 
     def __str__(self):
         return f"pcre:{self.raw};"
@@ -102,7 +103,7 @@ class Pcre(Option):
         specifies that whitespace data characters in the pattern are ignored
         except when escaped or inside a character class
         """
-        return "X" in self["flags"]
+        return "x" in self["flags"]
 
     @property
     def A(self):
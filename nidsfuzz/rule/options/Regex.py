@@ -27,17 +27,18 @@ class Regex(Option):
 
     PATTERN = re.compile(r'^"(?P<match>/.*/)(?P<flags>[ismR]*)"(?P<fast_pattern>,fast_pattern)?(?P<nocase>,nocase)?$')
 
-    def __init__(self, raw: str):
-        super().__init__()
-        self.raw = raw
-        self["match"] = None
-        self["flags"] = None
-        self["fast_pattern"] = False
-        self["nocase"] = False
-        self["i"] = False
-        self["s"] = False
-        self["m"] = False
-        self["R"] = False
+    __slots__ = ()
+
+    FIELDS = {
+        "match": None,
+        "flags": None,
+        "fast_pattern": False,
+        "nocase": False,
+        "i": False,
+        "s": False,
+        "m": False,
+        "R": False,
+    }
 
     def __str__(self):
         return f"regex:{self.raw};"
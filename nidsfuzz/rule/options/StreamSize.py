@@ -40,15 +40,19 @@ class StreamSize(Option):
                                r',?(?P<direction>either|to_server|to_client|both)?'
                                r'$')
 
+    __slots__ = ('_range',)
+
+    FIELDS = {
+        "sign": None,
+        "bytes": None,
+        "min_bytes": None,
+        "max_bytes": None,
+        "direction": "either",
+    }
+
     def __init__(self, raw: str):
-        super().__init__()
-        self.raw = raw
+        super().__init__(raw)
         self._range = False
-        self["sign"] = None
-        self["bytes"] = None
-        self["min_bytes"] = None
-        self["max_bytes"] = None
-        self["direction"] = "either"
 
     def __str__(self):
         return f"stream_size:{self.raw};"
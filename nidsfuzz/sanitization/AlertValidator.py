@@ -2,6 +2,7 @@ from collections import deque
 from queue import Queue
 
 from logger import logger
+from rule import RuleMapping
 from sanitization import test_oracle
 from sanitization.AlignedBundle import AlignedBundle
 
@@ -13,7 +14,8 @@ class AlertValidator:
     def __init__(self,
                  test_bundles: Queue[tuple],
                  nids_bundles: dict[str, deque[tuple]],
-                 port_window: deque[int], ):
+                 port_window: deque[int],
+                 rule_mapping: RuleMapping = None, ):
         if port_window.maxlen is None:
             raise ValueError(f'The maxlen of port window is not defined.')
 
@@ -21,6 +23,8 @@ class AlertValidator:
         self.nids_bundles = nids_bundles
         self.port_window = port_window
         self.memory_span = self.port_window.maxlen
+        # Translates the IDs of the rules loaded by other NIDS platforms into the IDs of the fuzzed rules.
+        self.rule_mapping = rule_mapping
 
         ################# State Variables ##################
         self.aligned_bundles: deque[AlignedBundle] = deque(maxlen=self.memory_span)
@@ -29,6 +33,9 @@ class AlertValidator:
         aligned_bundle = self.aligned_bundles.popleft()
         input_rules = aligned_bundle.input_rules
         output_rules = aligned_bundle.output_rules
+        if self.rule_mapping is not None:
+            output_rules = [[self.rule_mapping.normalize(rule_id) for rule_id in platform_rules]
+                            for platform_rules in output_rules]
 
         logger.debug(f'\tSanitizing test bundle {aligned_bundle}')
         all_passed, _ = test_oracle.run(input_rules, output_rules)
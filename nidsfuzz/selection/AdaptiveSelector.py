@@ -0,0 +1,205 @@
+import heapq
+import math
+import random
+from typing import TYPE_CHECKING, Hashable, Iterable
+
+from rule import Rule, RuleSet
+from selection.GenericSelector import GenericSelector
+from selection.RulePool import RulePool
+
+if TYPE_CHECKING:
+    from commons.KnowledgeBase import Outcome
+
+
+class AdaptiveSelector(GenericSelector):
+    """
+    Selects rules as the arms of a multi-armed bandit, so that the batches are spent on the rules that
+    yield discrepancies instead of the rules that are already consistent across NIDS platforms.
+
+    Each selected rule counts as a pull of its arm, and each discrepancy found by the sanitizer credits
+    the arms of its seed rules (see `reward`), with bonuses for an alert pattern that has not been seen
+    before and for the rules confirmed as flawed. The reward of a pull is clamped to [0, 1].
+
+    The arms are clusters of near-duplicate rules by default (see `RuleClusters`): a rewarded rule is
+    usually filtered once it is confirmed as flawed, so it is the released near-duplicates of the rule
+    that inherit its reward and get exploited.
+
+    Algorithms:
+        (1) ucb: the upper confidence bound (UCB1) of the mean reward, where `exploration` scales the bound.
+        (2) thompson: Thompson sampling from a Beta distribution, where `exploration` is the prior count
+        of both successes and failures.
+
+    Arms that have never been pulled are always selected first (in random order). Afterwards, only a
+    random sample of `sample_size` rules and the rules of the best rewarded arms are scored for each
+    batch, instead of every rule of the pools. The rule pool whose best candidate scores highest is
+    chosen if no protocol is given.
+    """
+
+    # The similarity of near-duplicate rules that share an arm, unless another threshold is given.
+    CLUSTER_THRESHOLD = 0.8
+
+    def __init__(self,
+                 ruleset: RuleSet,
+                 batch_size: int,
+                 batch_num: int,
+                 proto: str = None,
+                 cluster_threshold: float = None,
+                 algorithm: str = 'ucb',
+                 exploration: float = 1.0,
+                 discrepancy_reward: float = 0.5,
+                 novelty_bonus: float = 0.25,
+                 confirmation_bonus: float = 0.25,
+                 sample_size: int = 256, ):
+        if algorithm.lower() not in ('ucb', 'thompson'):
+            raise ValueError(f"Unknown bandit algorithm: '{algorithm}'")
+        if exploration <= 0:
+            raise ValueError(f'exploration must be positive, but got {exploration}')
+        if sample_size < 1:
+            raise ValueError(f'sample_size must be positive, but got {sample_size}')
+
+        if cluster_threshold is None:
+            cluster_threshold = self.CLUSTER_THRESHOLD
+        super().__init__(ruleset, batch_size, batch_num, proto, cluster_threshold)
+
+        self.algorithm = algorithm.lower()
+        self.exploration = exploration
+        self.discrepancy_reward = discrepancy_reward
+        self.novelty_bonus = novelty_bonus
+        self.confirmation_bonus = confirmation_bonus
+        self.sample_size = sample_size
+
+        self.pulls: dict[Rule, int] = {}
+        self.rewards: dict[Rule, float] = {}
+        self.total_pulls = 0
+        self.alert_patterns: set[Hashable] = set()
+        # The rules of each pool whose arms have never been pulled, together with the pool they are drawn
+        # from, so that they are rebuilt once the pool starts over. Stale rules are dropped when drawn.
+        self.fresh_rules: dict[str, tuple[RulePool, RulePool]] = {}
+
+    def reset(self):
+        super().reset()
+
+    def _arm(self, rule: Rule) -> Rule:
+        return self.clusters.representative(rule) if self.clusters is not None else rule
+
+    def score(self, rule: Rule) -> float:
+        arm = self._arm(rule)
+        pulls = self.pulls.get(arm, 0)
+        rewards = self.rewards.get(arm, 0.0)
+        if pulls == 0:
+            return math.inf
+        if self.algorithm == 'ucb':
+            return rewards / pulls + self.exploration * math.sqrt(math.log(self.total_pulls) / pulls)
+        else:
+            return random.betavariate(self.exploration + rewards, self.exploration + max(pulls - rewards, 0.0))
+
+    def select(self) -> tuple[str, list[Rule]]:
+        """
+        Selects the `batch_size` candidate rules with the highest scores from the chosen pool, ties are broken randomly.
+        :return:
+            Str: The chosen protocol.
+            List[Rule]: A list of selected rules.
+        """
+        if self.proto is not None:
+            if len(self.current_rule_pool) < self.batch_size:
+                self.reset()
+            services = [self.current_service]
+        else:
+            services = [service for service, rules in self.rule_pools.items() if len(rules) >= self.batch_size]
+            if not services:
+                # All rule pools run out, so they start over.
+                self.rule_pools = self._preprocess()
+                services = list(self.rule_pools)
+
+        # Each arm is scored once per batch, so that the rules of an arm share one Thompson sample.
+        arm_scores = {}
+        candidates, scores = {}, {}
+        for service in services:
+            candidates[service] = self._candidates(service)
+            scores[service] = []
+            for position, rule in enumerate(candidates[service]):
+                arm = self._arm(rule)
+                if arm not in arm_scores:
+                    arm_scores[arm] = self.score(rule)
+                scores[service].append((arm_scores[arm], random.random(), position))
+        self.current_service = max(scores, key=lambda service: max(scores[service]))
+        self.current_rule_pool = self.rule_pools[self.current_service]
+
+        rule_batch = [candidates[self.current_service][position]
+                      for _, _, position in heapq.nlargest(self.batch_size, scores[self.current_service])]
+        for rule in rule_batch:
+            arm = self._arm(rule)
+            self.pulls[arm] = self.pulls.get(arm, 0) + 1
+            self.total_pulls += 1
+        return self.current_service, rule_batch
+
+    def _candidates(self, service: str) -> list[Rule]:
+        """
+        return the rules of the pool to be scored: the rules of unpulled arms if there are enough of them,
+        and otherwise the rest of them, a random sample of the pool, and the rules of the best rewarded arms.
+        """
+        rule_pool = self.rule_pools[service]
+        source, fresh_rules = self.fresh_rules.get(service, (None, None))
+        if source is not rule_pool:
+            fresh_rules = RulePool(rule for rule in rule_pool if self.pulls.get(self._arm(rule), 0) == 0)
+            self.fresh_rules[service] = (rule_pool, fresh_rules)
+
+        while True:
+            sampled_rules = fresh_rules.sample(min(self.batch_size, len(fresh_rules)))
+            stale_rules = [rule for rule in sampled_rules if rule not in rule_pool or self.pulls.get(self._arm(rule))]
+            if not stale_rules:
+                break
+            fresh_rules.purge(stale_rules)
+        if len(sampled_rules) == self.batch_size:
+            return sampled_rules
+
+        candidates = sampled_rules + rule_pool.sample(min(max(self.sample_size, self.batch_size), len(rule_pool)))
+        leading_arms = heapq.nlargest(self.sample_size,
+                                      (arm for arm, rewards in self.rewards.items() if rewards > 0),
+                                      key=lambda arm: self.rewards[arm] / max(self.pulls.get(arm, 0), 1))
+        for arm in leading_arms:
+            members = self.clusters.members(arm) if self.clusters is not None else [arm]
+            candidates.extend(rule for rule in members if rule in rule_pool)
+        return list(dict.fromkeys(candidates))
+
+    def reward(self, *rules: Rule, value: float = None, pattern: Hashable = None, confirmed: Iterable[Rule] = ()):
+        """
+        Credit the arms of the given rules (the seed rules of a discrepancy) for one pull: the discrepancy
+        earns `value` (`discrepancy_reward` by default), a new alert pattern earns the novelty bonus, and
+        the confirmed rules (e.g., the flawed ones) earn the confirmation bonus, clamped to [0, 1] in total.
+        """
+        value = self.discrepancy_reward if value is None else value
+        if pattern is not None and pattern not in self.alert_patterns:
+            self.alert_patterns.add(pattern)
+            value += self.novelty_bonus
+        confirmed_arms = {self._arm(rule) for rule in confirmed}
+        for arm in {self._arm(rule) for rule in rules}:
+            arm_value = value + (self.confirmation_bonus if arm in confirmed_arms else 0.0)
+            self.rewards[arm] = self.rewards.get(arm, 0.0) + min(max(arm_value, 0.0), 1.0)
+
+    def warm_start(self, history: dict[Rule, 'Outcome']):
+        """
+        Count the tests of the given rules in earlier campaigns as pulls of their arms, and their discrepancies
+        and confirmations as rewards, so that the historically flaky rules are exploited first, while the rules
+        that have always been consistent are only explored again once in a while.
+        """
+        for rule, outcome in history.items():
+            if outcome.tested == 0:
+                continue
+            arm = self._arm(rule)
+            value = self.discrepancy_reward * outcome.discrepancies + self.confirmation_bonus * outcome.confirmed
+            self.pulls[arm] = self.pulls.get(arm, 0) + outcome.tested
+            self.rewards[arm] = self.rewards.get(arm, 0.0) + min(value, float(outcome.tested))
+            self.total_pulls += outcome.tested
+
+    def reload(self) -> tuple[list[Rule], list[Rule]]:
+        added_rules, removed_rules = super().reload()
+        # The added rules join the fresh rules of their pools, unless their arms have been pulled already.
+        for rule in added_rules:
+            for service in rule.services:
+                if service in self.fresh_rules and rule in self.fresh_rules[service][0]:
+                    self.fresh_rules[service][1].append(rule)
+        return added_rules, removed_rules
+
+    def filter(self, *rules: Rule):
+        super().filter(*rules)
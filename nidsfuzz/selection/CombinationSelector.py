@@ -1,38 +1,155 @@
-import itertools
+import bisect
+import math
 
 from rule import Rule, RuleSet
 from selection.GenericSelector import GenericSelector
 
 
 class CombinationSelector(GenericSelector):
+    """
+    Enumerates the unique `batch_size`-combinations of the current rule pool, skipping the combinations
+    that contain a filtered rule.
 
-    def __init__(self, ruleset: RuleSet, batch_size: int, batch_num: int, proto: str = None,):
+    Combinations are numbered in the colexicographic order of the combinatorial number system, i.e.,
+    combination #i can be computed directly (see `unrank`) without enumerating the ones before it, and
+    rules appended to the pool (e.g., by `reload` or `expand`) never change the number of a combination.
+    This lets several workers share a campaign deterministically, each visiting every `shard_count`-th
+    combination starting from its `shard_index`, and lets a campaign resume from the `position` it stopped at.
+    If `compatible` is enabled, the combinations of conflicting rules (see `RuleCompatibility`) are skipped as well.
+
+    If the selection is focused on some rules (see `focus`), the rule pools are not restricted to them. Instead,
+    they are moved to the end of each pool, so that the combinations with at least one of them are the ones
+    numbered from comb(the number of other rules, batch_size) on (see `offset`), and only these are visited.
+
+    @see https://en.wikipedia.org/wiki/Combinatorial_number_system
+    """
+
+    def __init__(self,
+                 ruleset: RuleSet,
+                 batch_size: int,
+                 batch_num: int,
+                 proto: str = None,
+                 cluster_threshold: float = None,
+                 shard_index: int = 0,
+                 shard_count: int = 1,
+                 start: int = None,
+                 compatible: bool = False, ):
         if batch_size < 2:
             raise ValueError(f"batch_size must be greater than 2, but got {batch_size}")
+        if not 0 <= shard_index < shard_count:
+            raise ValueError(f"shard_index must be in [0, {shard_count}), but got {shard_index}")
+
+        super().__init__(ruleset, batch_size, batch_num, proto, cluster_threshold, compatible)
+
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        # The number of the next combination to visit, which can be used as a checkpoint.
+        self.position: int = self.offset + shard_index if start is None else start
+        self._filtered: set[Rule] = set(self.filtered_rules.get(self.current_service, []))
+
+    @property
+    def num_combinations(self) -> int:
+        return math.comb(len(self.current_rule_pool), self.batch_size)
+
+    @property
+    def offset(self) -> int:
+        """
+        return the number of the first combination to visit, i.e., the first one with a focused rule.
+        """
+        if self.targets is None:
+            return 0
+        return math.comb(self._leading(self.current_rule_pool), self.batch_size)
+
+    def _leading(self, rules) -> int:
+        # The number of the rules before the first focused rule. The rules appended later (e.g., by `reload`)
+        # follow the focused rules, so the combinations of them and the other rules are visited as well.
+        return next((position for position, rule in enumerate(rules) if rule in self.targets), len(rules))
+
+    def unrank(self, index: int) -> list[Rule]:
+        """
+        return combination #index of the current rule pool.
+        """
+        if not 0 <= index < self.num_combinations:
+            raise IndexError(f'combination index out of range: {index}')
+        positions = self._unrank(index, len(self.current_rule_pool), self.batch_size)
+        return [self.current_rule_pool[position] for position in positions]
+
+    def rank(self, rules: list[Rule]) -> int:
+        """
+        return the number of the combination of the given rules in the current rule pool.
+        """
+        pool_positions = {rule: position for position, rule in enumerate(self.current_rule_pool)}
+        return self._rank([pool_positions[rule] for rule in rules])
 
-        super().__init__(ruleset, batch_size, batch_num, proto)
+    @staticmethod
+    def _unrank(index: int, n: int, size: int) -> list[int]:
+        # The positions (in ascending order) of combination #index of `size` out of n positions.
+        positions = []
+        upper = n
+        for k in range(size, 0, -1):
+            # The largest position c (below the previous one) such that comb(c, k) <= index.
+            c = bisect.bisect_right(range(upper), index, key=lambda c: math.comb(c, k)) - 1
+            positions.append(c)
+            index -= math.comb(c, k)
+            upper = c
+        return positions[::-1]
 
-        self.current_product_iter = itertools.product(self.current_rule_pool, repeat=self.batch_size)
+    @staticmethod
+    def _rank(positions: list[int]) -> int:
+        return sum(math.comb(position, k) for k, position in enumerate(sorted(positions), start=1))
 
     def reset(self):
         super().reset()
-        self.current_product_iter = itertools.product(self.current_rule_pool, repeat=self.batch_size)
+        self.position = self.offset + self.shard_index
+        self._filtered = set(self.filtered_rules.get(self.current_service, []))
+
+    def focus(self, *rules: Rule):
+        super().focus(*rules)
+        self.position = self.offset + self.shard_index
+        self._filtered = set()
+
+    def _focus(self, rules: list[Rule]) -> list[Rule]:
+        if self.targets.isdisjoint(rules):
+            return []
+        return [rule for rule in rules if rule not in self.targets] + [rule for rule in rules if rule in self.targets]
+
+    def reload(self) -> tuple[list[Rule], list[Rule]]:
+        added_rules, removed_rules = super().reload()
+        if removed_rules:
+            # The removed rules shift the positions in the rule pool, so the enumeration starts over.
+            self.position = self.offset + self.shard_index
+        return added_rules, removed_rules
 
     def select(self) -> tuple[str, list[Rule]]:
         while True:
-            try:
-                combination = next(self.current_product_iter)
-                for rule in combination:
-                    if rule in self.filtered_rules.get(self.current_service, []):
-                        break
-                else:
-                    return self.current_service, list(combination)
-            except StopIteration:
+            if self.position >= self.num_combinations:
                 self.reset()
+                if self.position >= self.num_combinations:
+                    # The shard has no combination of this rule pool.
+                    self.is_finished = True
+                    raise StopIteration
+                continue
+            combination = self._visit(self.unrank(self.position))
+            self.position += self.shard_count
+            if combination is not None:
+                return self.current_service, combination
 
-    def filter(self, *rules: Rule):
-        self.filtered_rules.setdefault(self.current_service, []).extend(rules)
-
-
+    def _visit(self, combination: list[Rule]) -> list[Rule] | None:
+        # The combinations with a filtered rule, or with conflicting rules, are skipped.
+        if not self._filtered.isdisjoint(combination):
+            return None
+        if self.compatibility is not None:
+            if not self.compatibility.is_compatible(*combination):
+                return None
+            return self.compatibility.order(combination)
+        return combination
 
+    def exclude(self, *rules: Rule):
+        # The rules stay in the current rule pool until it starts over, so that the numbers of the combinations
+        # do not change, but the combinations with them are skipped.
+        self.excluded_rules.update(rules)
+        self._filtered.update(rules)
 
+    def filter(self, *rules: Rule):
+        self.filtered_rules.setdefault(self.current_service, []).extend(rules)
+        self._filtered.update(rules)
@@ -0,0 +1,131 @@
+import math
+
+from rule import Rule, RuleSet
+from selection.CombinationSelector import CombinationSelector
+
+
+class CoveringSelector(CombinationSelector):
+    """
+    Selects the batches of a t-way covering array over the rule pool, i.e., every `strength` rules
+    of the pool appear together in at least one batch, with far fewer batches than enumerating every
+    combination (see `CombinationSelector`).
+
+    The pool is cut into groups of `batch_size // strength` consecutive rules, and each batch joins
+    `strength` distinct groups. Since any `strength` rules fall into at most `strength` groups, every
+    combination of groups covers them, and a campaign over n rules takes comb(n / (batch_size / t), t)
+    batches, e.g., about 2n^2 / batch_size^2 batches for all pairs, within a factor of two (for pairs)
+    of the lower bound comb(n, 2) / comb(batch_size, 2). The combinations of groups are numbered the same
+    as in `CombinationSelector`, so batches are generated one at a time, and can be sharded and resumed.
+
+    If the unit is 'feature', the pool is reduced to the first rule of each distinct set of detection
+    features (see `Rule.features`), so that every `strength` feature sets appear together instead.
+
+    If the selection is focused on some rules (see `focus`), only the batches with a group of focused rules
+    (or of the feature sets of focused rules) are visited, the same as in `CombinationSelector`.
+
+    Note: filtered rules are dropped from the batches, and the batches left with fewer than `strength`
+    rules are skipped. Reloading rules that change the pool starts the covering array over.
+    """
+
+    def __init__(self,
+                 ruleset: RuleSet,
+                 batch_size: int,
+                 batch_num: int,
+                 proto: str = None,
+                 cluster_threshold: float = None,
+                 shard_index: int = 0,
+                 shard_count: int = 1,
+                 start: int = None,
+                 strength: int = 2,
+                 unit: str = 'rule', ):
+        if strength < 2:
+            raise ValueError(f"strength must be greater than 2, but got {strength}")
+        if batch_size < strength:
+            raise ValueError(f"batch_size must be at least the strength {strength}, but got {batch_size}")
+        if unit not in ('rule', 'feature'):
+            raise ValueError(f"Unknown covering unit: '{unit}'")
+
+        self.strength = strength
+        self.unit = unit
+        self._units: list[Rule] | None = None
+        self._units_source: tuple[int, int] | None = None
+
+        super().__init__(ruleset, batch_size, batch_num, proto, cluster_threshold, shard_index, shard_count, start)
+
+    @property
+    def units(self) -> list[Rule]:
+        """
+        return the rules to cover, i.e., the current rule pool or the first rule of each feature set.
+        """
+        if self.unit == 'rule':
+            return self.current_rule_pool
+        # The units are derived from the current rule pool again only if it has been switched or resized.
+        source = (id(self.current_rule_pool), len(self.current_rule_pool))
+        if self._units_source != source:
+            units = {}
+            for rule in self.current_rule_pool:
+                if self.targets is not None and rule in self.targets and rule.features in units:
+                    # A focused rule stands for its feature set, which thus follows the other feature sets.
+                    if units[rule.features] in self.targets:
+                        continue
+                    del units[rule.features]
+                units.setdefault(rule.features, rule)
+            self._units = list(units.values())
+            self._units_source = source
+        return self._units
+
+    @property
+    def offset(self) -> int:
+        if self.targets is None:
+            return 0
+        return math.comb(self._leading(self.units) // self.group_size, self.strength)
+
+    @property
+    def group_size(self) -> int:
+        return self.batch_size // self.strength
+
+    @property
+    def num_groups(self) -> int:
+        return math.ceil(len(self.units) / self.group_size)
+
+    @property
+    def num_combinations(self) -> int:
+        return math.comb(self.num_groups, self.strength)
+
+    def unrank(self, index: int) -> list[Rule]:
+        """
+        return batch #index of the covering array of the current rule pool.
+        """
+        if not 0 <= index < self.num_combinations:
+            raise IndexError(f'batch index out of range: {index}')
+        units, group_size = self.units, self.group_size
+        return [rule for group in self._unrank(index, self.num_groups, self.strength)
+                for rule in units[group * group_size:(group + 1) * group_size]]
+
+    def rank(self, rules: list[Rule]) -> int:
+        """
+        return the number of the first batch that covers the given rules (at most `strength` of them).
+        """
+        unit_positions = {rule: position for position, rule in enumerate(self.units)}
+        groups = {unit_positions[rule] // self.group_size for rule in rules}
+        if len(groups) > self.strength:
+            raise ValueError(f'{len(rules)} rules are not covered by a {self.strength}-way covering array')
+        # Fewer groups than the strength are completed with the lowest other groups.
+        groups.update([group for group in range(self.strength + 1) if group not in groups][:self.strength - len(groups)])
+        return self._rank(list(groups))
+
+    def reset(self):
+        self._units_source = None
+        super().reset()
+
+    def reload(self) -> tuple[list[Rule], list[Rule]]:
+        added_rules, removed_rules = super().reload()
+        self._units_source = None
+        if added_rules or removed_rules:
+            # The rules appended to the pool join the last groups, whose earlier batches missed them.
+            self.position = self.offset + self.shard_index
+        return added_rules, removed_rules
+
+    def _visit(self, combination: list[Rule]) -> list[Rule] | None:
+        batch = [rule for rule in combination if rule not in self._filtered]
+        return batch if len(batch) >= self.strength else None
@@ -1,6 +1,11 @@
 import abc
+from typing import TYPE_CHECKING
 
-from rule import RuleSet, Rule, Proto
+from rule import RuleSet, Rule, Proto, RuleClusters, RuleCompatibility
+from selection.RulePool import RulePool
+
+if TYPE_CHECKING:
+    from commons.KnowledgeBase import Outcome
 
 
 class GenericSelector(abc.ABC):
@@ -10,6 +15,8 @@ class GenericSelector(abc.ABC):
                  batch_size: int,
                  batch_num: int,
                  proto: str = None,
+                 cluster_threshold: float = None,
+                 compatible: bool = False,
                  ):
         if batch_size < 1:
             raise ValueError(f"batch_size must be greater than 1, but got {batch_size}")
@@ -19,21 +26,41 @@ class GenericSelector(abc.ABC):
         if proto is not None and proto.lower() not in Proto.all():
             raise ValueError(f"proto must be one of {Proto.all()}, but got {proto}")
 
+        self.source_ruleset: RuleSet = ruleset
         self.ruleset: list[Rule] = ruleset.activated_rules
         self.batch_size = batch_size
         self.batch_num = batch_num
         self.proto = proto.lower() if proto is not None else None
 
+        # If enabled, only the first rule of each cluster of near-duplicate rules is put into the rule
+        # pools, and the rest of the cluster is held back until that rule yields a discrepancy, see `expand`.
+        self.clusters: RuleClusters | None = None
+        if cluster_threshold is not None:
+            self.clusters = RuleClusters(self.ruleset, threshold=cluster_threshold)
+        self.held_rules: dict[str, dict[Rule, list[Rule]]] = {}
+        self.expanded_clusters: set[Rule] = set()
+
+        # If enabled, the selectors that support it only select batches of pairwise-compatible rules,
+        # which can be blended into the same test packets, see `RuleCompatibility`.
+        self.compatibility: RuleCompatibility | None = None
+        if compatible:
+            self.compatibility = RuleCompatibility(self.ruleset)
+
+        # The rules that are kept out of the rule pools for good, see `exclude`.
+        self.excluded_rules: set[Rule] = set()
+        # If given, the rules that the selection is restricted to, see `focus`.
+        self.targets: set[Rule] | None = None
+
         #################################
-        self.rule_pools: dict[str, list[Rule]] = self._preprocess()
+        self.rule_pools: dict[str, RulePool] = self._preprocess()
         self.filtered_rules: dict[str, list[Rule]] = {}
 
         if proto is None:
             self.current_service: str = next(iter(self.rule_pools))
-            self.current_rule_pool: list[Rule] = self.rule_pools[self.current_service]
+            self.current_rule_pool: RulePool = self.rule_pools[self.current_service]
         else:
             self.current_service: str = proto
-            self.current_rule_pool: list[Rule] = self.rule_pools[proto]
+            self.current_rule_pool: RulePool = self.rule_pools[proto]
 
         self.is_finished = False
 
@@ -57,24 +84,146 @@ class GenericSelector(abc.ABC):
 
         return proto, rules
 
-    def _preprocess(self) -> dict[str, list[Rule]]:
+    def _preprocess(self) -> dict[str, RulePool]:
         """
         Group the rule pool based on service to ensure the selected rules share the same application protocol.
         :return:
             A dictionary mapping service names to their applied rules.
         """
+        # The service index of the RuleSet is built only once, so switching pools does not re-walk the rules.
         result = {}
-        for rule in self.ruleset:
-            services = [s.lower() for s in rule.service.split(",") if s.lower() in Proto.all()]
-            for service in services:
-                result.setdefault(service, []).append(rule)
-        for service, rules in list(result.items()):
-            if len(rules) < self.batch_size:
-                del result[service]
+        self.held_rules = {}
+        for service, rules in self.source_ruleset.partition().items():
+            if service not in Proto.all():
+                continue
+            if self.excluded_rules:
+                rules = [rule for rule in rules if rule not in self.excluded_rules]
+            if self.targets is not None:
+                rules = self._focus(rules)
+            if self.clusters is not None:
+                rules, self.held_rules[service] = self._hold_back(rules)
+            if len(rules) >= self.batch_size:
+                result[service] = RulePool(rules)
         if len(result) == 0:
             raise ValueError(f'The input ruleset does not satisfy the expected batch size: {self.batch_size}')
         return result
 
+    def _focus(self, rules: list[Rule]) -> list[Rule]:
+        """
+        Restrict the rules of a pool to the targets, see `focus`.
+        """
+        return [rule for rule in rules if rule in self.targets]
+
+    def _hold_back(self, rules: list[Rule]) -> tuple[list[Rule], dict[Rule, list[Rule]]]:
+        """
+        Keep the first rule of each cluster that has not been expanded yet, and hold back the others.
+        :return:
+            List[Rule]: The kept rules.
+            Dict[Rule, List[Rule]]: The held-back rules, keyed by the representative of their cluster.
+        """
+        kept_rules = []
+        held_rules = {}
+        for rule in rules:
+            representative = self.clusters.representative(rule)
+            if representative in self.expanded_clusters:
+                kept_rules.append(rule)
+            elif representative in held_rules:
+                held_rules[representative].append(rule)
+            else:
+                kept_rules.append(rule)
+                held_rules[representative] = []
+        return kept_rules, {representative: rules for representative, rules in held_rules.items() if rules}
+
+    def expand(self, *rules: Rule):
+        """
+        Release the near-duplicates of the given rules (usually the flawed ones) into the rule pools,
+        so that the rest of their clusters will be tested as well. This is a no-op without clustering.
+        """
+        if self.clusters is None:
+            return
+        for rule in rules:
+            representative = self.clusters.representative(rule)
+            if representative in self.expanded_clusters:
+                continue
+            self.expanded_clusters.add(representative)
+            for service, held_rules in self.held_rules.items():
+                released_rules = held_rules.pop(representative, [])
+                if released_rules and service in self.rule_pools:
+                    self.rule_pools[service].extend(released_rules)
+
+    def exclude(self, *rules: Rule):
+        """
+        Keep the given rules (e.g., the ones whose signatures cannot be parsed) out of the rule pools for good,
+        unlike `filter`, which only removes the rules until the rule pools start over.
+        """
+        self.excluded_rules.update(rules)
+        for rule_pool in self.rule_pools.values():
+            rule_pool.purge(rules)
+
+    def focus(self, *rules: Rule):
+        """
+        Restrict the selection to the given rules for good, e.g., the rules changed since a baseline
+        (see `RuleSet.diff`), and start the rule pools over. Reloaded rules join the given rules.
+        """
+        self.targets = set(rules)
+        self.rule_pools = self._preprocess()
+        if self.proto is None:
+            self.current_service = next(iter(self.rule_pools))
+        elif self.proto not in self.rule_pools:
+            raise ValueError(f'The focused {self.proto} rules do not satisfy the expected batch size: {self.batch_size}')
+        self.current_rule_pool = self.rule_pools[self.current_service]
+        self.filtered_rules = {}
+        self.is_finished = False
+
+    def reward(self, *rules: Rule, value: float = None, pattern=None, confirmed=()):
+        """
+        Report the reward of the given rules (usually the seed rules of a discrepancy) and, optionally,
+        the pattern of the alerts they caused and the rules confirmed as flawed among them. This is a
+        no-op unless the selector adapts to the rewards.
+        """
+        pass
+
+    def warm_start(self, history: dict[Rule, 'Outcome']):
+        """
+        Start from the outcomes of the given rules in earlier campaigns (see `KnowledgeBase`). This is a no-op
+        unless the selector adapts to the rewards.
+        """
+        pass
+
+    def reload(self) -> tuple[list[Rule], list[Rule]]:
+        """
+        Reload the changed rule files (see `RuleSet.reload`) and update the rule pools in place: removed
+        rules leave the pools, while added (or modified) rules join the pools of their services right away,
+        so that they are tested soon. The state of unchanged rules is kept.
+        :return:
+            List[Rule]: The added rules.
+            List[Rule]: The removed rules.
+        """
+        added_rules, removed_rules = self.source_ruleset.reload()
+
+        if removed_rules:
+            removed_ids = {id(rule) for rule in removed_rules}
+            for rule_pool in self.rule_pools.values():
+                rule_pool.purge(removed_rules)
+            for held_rules in self.held_rules.values():
+                for rules in held_rules.values():
+                    rules[:] = [rule for rule in rules if id(rule) not in removed_ids]
+
+        for rule in added_rules:
+            if not rule.activated:
+                continue
+            if self.targets is not None:
+                self.targets.add(rule)
+            if self.clusters is not None:
+                self.clusters.add(rule)
+            if self.compatibility is not None:
+                self.compatibility.add(rule)
+            for service in rule.services:
+                if service in self.rule_pools:
+                    self.rule_pools[service].append(rule)
+
+        return added_rules, removed_rules
+
     def switch(self):
         """
         If the current rule pool runs out, this method switches to the next rule pool or creates a new one.
@@ -6,26 +6,45 @@ from selection.GenericSelector import GenericSelector
 
 class RandomSelector(GenericSelector):
 
+    def __init__(self,
+                 ruleset: RuleSet,
+                 batch_size: int,
+                 batch_num: int,
+                 proto: str = None,
+                 cluster_threshold: float = None,
+                 compatible: bool = False, ):
+        super().__init__(ruleset, batch_size, batch_num, proto, cluster_threshold, compatible)
+        # The services of the rule pools, which only change when the pools are switched.
+        self.services: list[str] = list(self.rule_pools)
+
     def reset(self):
         super().reset()
+        self.services = list(self.rule_pools)
+
+    def focus(self, *rules: Rule):
+        super().focus(*rules)
+        self.services = list(self.rule_pools)
 
     def select(self) -> tuple[str, list[Rule]]:
         """
         Selects a rule batch by:
         1. Randomly choosing one pool from `self.rule_pools`.
-        2. Randomly sampling `batch_size` rules from the selected pool.
+        2. Randomly sampling `batch_size` rules from the selected pool (pairwise-compatible ones if enabled).
         :return:
             Str: The chosen protocol.
             List[Rule]: A list of selected rules.
         """
         if self.proto is None:
-            self.current_service = random.choice(list(self.rule_pools))
+            self.current_service = random.choice(self.services)
             self.current_rule_pool = self.rule_pools[self.current_service]
 
         if len(self.current_rule_pool) < self.batch_size:
             self.reset()
 
-        rule_batch = random.sample(self.current_rule_pool, self.batch_size)
+        if self.compatibility is not None:
+            rule_batch = self.compatibility.sample(self.current_rule_pool, self.batch_size)
+        else:
+            rule_batch = self.current_rule_pool.sample(self.batch_size)
         return self.current_service, rule_batch
 
     def filter(self, *rules: Rule):
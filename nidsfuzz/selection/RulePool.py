@@ -0,0 +1,170 @@
+import random
+from collections.abc import Sequence
+from typing import Iterable
+
+from rule import Rule
+
+
+class RulePool(Sequence):
+    """
+    A pool of rules that keeps the order of a list, but removes rules, pops the head and samples
+    rules in (amortized) constant time, instead of scanning or shifting the whole list.
+
+    Rules are kept in slots together with a map from each rule to its slots. A removed or popped
+    rule leaves an empty slot (a tombstone) behind, instead of being swapped with the last rule,
+    so that sequential and combination selectors still see the rules in their original order.
+    The slots are compacted once the tombstones outnumber the rules. Positional access skips the
+    tombstones with a Fenwick tree over the slots holding rules, in O(log n) without compacting.
+
+    Usage:
+    --------
+    >>> pool = RulePool(rules)
+    >>> pool.remove(rule)  # O(1), raises ValueError if absent like list.remove
+    >>> head = pool.popleft()  # O(1)
+    >>> batch = pool.sample(2)  # the same distribution as random.sample(pool, 2)
+    >>> rule = pool[3]  # O(log n)
+    """
+
+    def __init__(self, rules: Iterable[Rule] = ()):
+        self._slots: list[Rule | None] = []
+        # The slots of each rule in ascending order (the same rule may appear more than once).
+        self._positions: dict[Rule, list[int]] = {}
+        # The slots before the head have been popped, and the tombstones after it have been removed.
+        self._head = 0
+        self._tombstones = 0
+        # A Fenwick tree (1-based) that counts the slots holding rules, see `_locate`.
+        self._live: list[int] = [0]
+        self.extend(rules)
+
+    def __len__(self) -> int:
+        return len(self._slots) - self._head - self._tombstones
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+        return self._slots[self._locate(range(len(self))[index])]
+
+    def __iter__(self):
+        for rule in self._slots[self._head:]:
+            if rule is not None:
+                yield rule
+
+    def __contains__(self, rule) -> bool:
+        return bool(self._positions.get(rule))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (RulePool, list)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f'RulePool({list(self)})'
+
+    def append(self, rule: Rule):
+        self._positions.setdefault(rule, []).append(len(self._slots))
+        self._slots.append(rule)
+        # The new node counts the slots it covers, i.e., itself and the nodes of its lower bits.
+        node = len(self._slots)
+        count, child = 1, node - 1
+        while child > node - (node & -node):
+            count += self._live[child]
+            child -= child & -child
+        self._live.append(count)
+
+    def extend(self, rules: Iterable[Rule]):
+        for rule in rules:
+            self.append(rule)
+
+    def remove(self, rule: Rule):
+        """
+        Remove the first occurrence of the rule, the same as `list.remove`.
+        """
+        positions = self._positions.get(rule)
+        if not positions:
+            raise ValueError(f'{rule} is not in the rule pool')
+        self._clear(positions.pop(0), rule)
+
+    def purge(self, rules: Iterable[Rule]):
+        """
+        Remove the given rule objects (compared by identity), ignoring the ones that are absent.
+        """
+        for rule in rules:
+            positions = self._positions.get(rule, [])
+            for position in positions:
+                if self._slots[position] is rule:
+                    positions.remove(position)
+                    self._clear(position, rule)
+                    break
+
+    def popleft(self) -> Rule:
+        while self._head < len(self._slots) and self._slots[self._head] is None:
+            self._head += 1
+            self._tombstones -= 1
+        if self._head >= len(self._slots):
+            raise IndexError('pop from an empty rule pool')
+        rule = self._slots[self._head]
+        self._slots[self._head] = None
+        self._release(self._head)
+        self._head += 1
+        self._positions[rule].pop(0)
+        if not self._positions[rule]:
+            del self._positions[rule]
+        if self._head > len(self):
+            self._compact()
+        return rule
+
+    def sample(self, k: int) -> list[Rule]:
+        """
+        Sample k distinct rules (by their slots) uniformly at random, the same as `random.sample`.
+        """
+        if not 0 <= k <= len(self):
+            raise ValueError('Sample larger than the rule pool or is negative')
+        if 2 * k > len(self):
+            return random.sample(list(self), k)
+        # Since at least half of the slots hold rules (see `_clear`), a slot drawn at random holds an
+        # unsampled rule with a probability of at least 1/4, and k rules take O(k) draws in expectation.
+        sampled_positions = set()
+        result = []
+        while len(result) < k:
+            position = random.randrange(self._head, len(self._slots))
+            if self._slots[position] is None or position in sampled_positions:
+                continue
+            sampled_positions.add(position)
+            result.append(self._slots[position])
+        return result
+
+    def _locate(self, index: int) -> int:
+        # return the slot of the rule at the given index, by descending the Fenwick tree.
+        position, remaining = 0, index + 1
+        step = 1 << (len(self._live) - 1).bit_length()
+        while step:
+            node = position + step
+            if node < len(self._live) and self._live[node] < remaining:
+                position = node
+                remaining -= self._live[node]
+            step >>= 1
+        return position
+
+    def _release(self, position: int):
+        node = position + 1
+        while node < len(self._live):
+            self._live[node] -= 1
+            node += node & -node
+
+    def _clear(self, position: int, rule: Rule):
+        self._slots[position] = None
+        self._release(position)
+        self._tombstones += 1
+        if not self._positions[rule]:
+            del self._positions[rule]
+        if self._head + 2 * self._tombstones > len(self._slots):
+            self._compact()
+
+    def _compact(self):
+        rules = list(self)
+        self._slots = []
+        self._positions = {}
+        self._head = 0
+        self._tombstones = 0
+        self._live = [0]
+        self.extend(rules)
@@ -11,7 +11,7 @@ class SequentialSelector(GenericSelector):
         if len(self.current_rule_pool) < self.batch_size:
             self.reset()
 
-        rule_batch = [self.current_rule_pool.pop(0) for _ in range(self.batch_size)]
+        rule_batch = [self.current_rule_pool.popleft() for _ in range(self.batch_size)]
         self.filtered_rules.setdefault(self.current_service, []).extend(rule_batch)
         return self.current_service, rule_batch
 
@@ -0,0 +1,97 @@
+import random
+
+from rule import RuleSet, Rule
+from selection.GenericSelector import GenericSelector
+from selection.RulePool import RulePool
+
+
+class StratifiedSelector(GenericSelector):
+    """
+    Selects rules across strata of the rule pool instead of uniformly, since uniform sampling is dominated
+    by the most common kind of rule (e.g., a plain `content`), while the rarer ones (e.g., `byte_test`,
+    negated `pcre` or multi-buffer rules) are where NIDS platforms tend to disagree.
+
+    Each stratum holds the rules with the same detection features (see `Rule.features`) and sticky buffers.
+    The strata of a pool are visited round-robin, in a random order in each round, and each batch takes
+    one random rule from each of the next `batch_size` strata. Every stratum is thus tested once every
+    `len(strata) / batch_size` batches, however few rules it holds.
+    """
+
+    def __init__(self,
+                 ruleset: RuleSet,
+                 batch_size: int,
+                 batch_num: int,
+                 proto: str = None,
+                 cluster_threshold: float = None, ):
+        super().__init__(ruleset, batch_size, batch_num, proto, cluster_threshold)
+        # The services of the rule pools, which only change when the pools are switched.
+        self.services: list[str] = list(self.rule_pools)
+
+        self._strata: dict[frozenset[str], RulePool] = {}
+        self._strata_source: tuple[int, int] | None = None
+        # The strata left in the current round of each service.
+        self._rounds: dict[str, list[frozenset[str]]] = {}
+
+    @staticmethod
+    def stratum(rule: Rule) -> frozenset[str]:
+        return rule.features | rule.sticky_buffers
+
+    @property
+    def strata(self) -> dict[frozenset[str], RulePool]:
+        """
+        return the strata of the current rule pool.
+        """
+        # The strata are derived from the current rule pool again only if it has been switched or resized.
+        source = (id(self.current_rule_pool), len(self.current_rule_pool))
+        if self._strata_source != source:
+            strata = {}
+            for rule in self.current_rule_pool:
+                strata.setdefault(self.stratum(rule), []).append(rule)
+            self._strata = {stratum: RulePool(rules) for stratum, rules in strata.items()}
+            self._strata_source = source
+        return self._strata
+
+    def reset(self):
+        super().reset()
+        self.services = list(self.rule_pools)
+
+    def focus(self, *rules: Rule):
+        super().focus(*rules)
+        self.services = list(self.rule_pools)
+
+    def select(self) -> tuple[str, list[Rule]]:
+        """
+        Selects a rule batch by:
+        1. Randomly choosing one pool from `self.rule_pools`.
+        2. Taking one random rule from each of the next `batch_size` strata of the pool.
+        :return:
+            Str: The chosen protocol.
+            List[Rule]: A list of selected rules.
+        """
+        if self.proto is None:
+            self.current_service = random.choice(self.services)
+            self.current_rule_pool = self.rule_pools[self.current_service]
+
+        if len(self.current_rule_pool) < self.batch_size:
+            self.reset()
+
+        strata = self.strata
+        rule_batch = []
+        while len(rule_batch) < self.batch_size:
+            remaining_strata = self._rounds.get(self.current_service)
+            if not remaining_strata:
+                remaining_strata = list(strata)
+                random.shuffle(remaining_strata)
+                self._rounds[self.current_service] = remaining_strata
+            stratum = remaining_strata.pop()
+            if stratum not in strata:
+                # The stratum has run out since the round started.
+                continue
+            rule = strata[stratum].sample(1)[0]
+            # If there are fewer strata than rules in a batch, a stratum may be visited twice.
+            if rule not in rule_batch:
+                rule_batch.append(rule)
+        return self.current_service, rule_batch
+
+    def filter(self, *rules: Rule):
+        super().filter(*rules)
@@ -1,4 +1,8 @@
 
+from .RulePool import RulePool
 from .RandomSelector import RandomSelector
 from .SequentialSelector import SequentialSelector
-from .CombinationSelector import CombinationSelector
\ No newline at end of file
+from .CombinationSelector import CombinationSelector
+from .CoveringSelector import CoveringSelector
+from .AdaptiveSelector import AdaptiveSelector
+from .StratifiedSelector import StratifiedSelector
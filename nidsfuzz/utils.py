@@ -36,10 +36,7 @@ def hex2str(hex_str: str) -> str:
     return res
 
 def get_ngrams(text, n):
-    ngrams = set()
-    for i in range(len(text) - n + 1):
-        ngrams.add(text[i: i + n])
-    return ngrams
+    return {text[i: i + n] for i in range(len(text) - n + 1)}
 
 def jaccard_similarity(s1, s2, n=3):
     """
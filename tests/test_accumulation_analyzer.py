@@ -0,0 +1,103 @@
+import unittest
+
+from commons import AccumulationAnalyzer, SketchAccumulationAnalyzer, DecayAccumulationAnalyzer, KnowledgeBase
+from rule import Rule
+
+
+class MockClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestAccumulationAnalyzer(unittest.TestCase):
+
+    def setUp(self):
+        self.test_cases = ['1:1:1', "1:1:1, 2:2:2", "3:3:3, 4:4:4", "4:4:4, 5:5:5"]
+        self.expected = [[], ['1:1:1'], [], ['4:4:4']]
+
+    def test_exact_analyzer(self):
+        analyzer = AccumulationAnalyzer(threshold=2)
+        for test_case, expected in zip(self.test_cases, self.expected):
+            self.assertEqual(analyzer.update(*test_case.split(", ")), expected)
+        # Burst items are forgotten, only the pending ones are kept.
+        self.assertEqual(set(analyzer.item_map), {'2:2:2', '3:3:3', '5:5:5'})
+
+    def test_sketch_analyzer(self):
+        analyzer = SketchAccumulationAnalyzer(threshold=2, width=1024, depth=4)
+        for test_case, expected in zip(self.test_cases, self.expected):
+            self.assertEqual(analyzer.update(*test_case.split(", ")), expected)
+
+        # The memory footprint does not depend on the number of distinct items.
+        analyzer = SketchAccumulationAnalyzer(threshold=100000, width=1024, depth=4)
+        for i in range(10000):
+            analyzer.update(f'1:{i}:1')
+        self.assertEqual(len(analyzer.table), 4)
+        self.assertTrue(all(len(row) == 1024 for row in analyzer.table))
+        # The count-min sketch never underestimates.
+        self.assertTrue(all(analyzer.estimate(f'1:{i}:1') >= 1 for i in range(10000)))
+
+        # The burst of an item does not lower the counts of the items sharing its counters.
+        analyzer = SketchAccumulationAnalyzer(threshold=2, width=1, depth=1)
+        self.assertEqual(analyzer.update('1:1:1'), [])
+        self.assertEqual(analyzer.update('2:2:2'), ['2:2:2'])
+        self.assertEqual(analyzer.estimate('2:2:2'), 0)
+        self.assertEqual(analyzer.update('1:1:1'), ['1:1:1'])
+
+    def test_decay_analyzer(self):
+        clock = MockClock()
+        analyzer = DecayAccumulationAnalyzer(threshold=2, half_life=60, clock=clock)
+        for test_case, expected in zip(self.test_cases, self.expected):
+            self.assertEqual(analyzer.update(*test_case.split(", ")), expected)
+
+        # A misfire that happened long ago no longer trips the threshold.
+        self.assertEqual(analyzer.update('6:6:6'), [])
+        clock.now += 3600
+        self.assertAlmostEqual(analyzer.estimate('6:6:6'), 0.0)
+        self.assertEqual(analyzer.update('6:6:6'), [])
+
+        # Hits close together burst at the threshold, even though the first one has decayed a little.
+        self.assertEqual(analyzer.update('7:7:7'), [])
+        clock.now += 0.01
+        self.assertEqual(analyzer.update('7:7:7'), ['7:7:7'])
+
+        # The number of tracked items is bounded by the capacity.
+        analyzer = DecayAccumulationAnalyzer(threshold=2, half_life=60, capacity=100, clock=clock)
+        for i in range(10000):
+            analyzer.update(f'1:{i}:1')
+            # The item that has just been updated is never evicted.
+            self.assertIn(f'1:{i}:1', analyzer.item_map)
+        self.assertLessEqual(len(analyzer.item_map), 100)
+
+    def test_knowledge_base(self):
+        import tempfile
+
+        clock = MockClock()
+        rules = [Rule.from_string(f'alert http any any -> any any ( msg:"KNOWN"; content:"{i}"; sid:{i}; rev:1; )')
+                 for i in range(1, 4)]
+        analyzer = AccumulationAnalyzer(threshold=2)
+        with tempfile.TemporaryDirectory() as knowledge_dir:
+            # Two workers of the same campaign share the directory, and their outcomes add up.
+            workers = [KnowledgeBase(knowledge_dir, mutator='PassThroughMutator', versions=['snort3', 'suricata7'],
+                                     clock=clock) for _ in range(2)]
+            for worker in workers:
+                clock.now += 1
+                worker.test(*rules)
+                worker.discrepancy(rules[0], confirmed=analyzer.update(rules[0]))
+                worker.store()
+
+            knowledge = KnowledgeBase(knowledge_dir, mutator='PassThroughMutator', versions=['suricata7', 'snort3'])
+            self.assertEqual(knowledge.outcome(rules[0]), (2, 2, 1, 2))
+            self.assertEqual(knowledge.outcome(rules[1]), (2, 0, 0, 2))
+            self.assertEqual(knowledge.outcome(rules[0]).flakiness, 1.0)
+            self.assertEqual(knowledge.verified(rules, times=2), rules[1:])
+            self.assertEqual(knowledge.verified(rules, times=3), [])
+
+            # Outcomes are kept apart by the mutator, the NIDS versions and the rule text.
+            for mutator, versions in [('BlendingMutator', ['snort3', 'suricata7']), ('PassThroughMutator', ['snort3'])]:
+                self.assertEqual(len(KnowledgeBase(knowledge_dir, mutator=mutator, versions=versions)), 0)
+            modified_rule = Rule.from_string(str(rules[1]).replace('rev:1;', 'rev:2;'))
+            self.assertEqual(knowledge.outcome(modified_rule).tested, 0)
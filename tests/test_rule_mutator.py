@@ -1,8 +1,12 @@
 import pathlib
 import unittest
 
-from generation import PassThroughMutator, BlendingMutator, RepetitionMutator, ObfuscationMutator
-from rule import Rule, RuleSet
+from generation import PassThroughMutator, BlendingMutator, RepetitionMutator, ObfuscationMutator, GeneratabilityCache, \
+    PlanCache, PcreSampler, PcreSampleError
+from generation.PassThroughMutator import PassThroughSignatureRender, DataChunk
+from generation.BlendingMutator import BlendingSignatureRender
+from commons import Stream, Blob
+from rule import Rule, RuleSet, Isdataat, ByteTest, Pcre
 
 
 class TestRuleMutator(unittest.TestCase):
@@ -113,6 +117,181 @@ class TestRuleMutator(unittest.TestCase):
             print(f'response:\n{response.decode("utf-8")}')
             print('=======================')
 
+    def test_blending_length_limits(self):
+        # The limits of the blended rules are merged, so a looser limit of a later rule is satisfied already.
+        render = BlendingSignatureRender(sticky_buffer='pkt_data', proto='dns')
+        self.assertTrue(render.orchestrate([Isdataat.from_string('10'), ByteTest.from_string('1,&,0x80,2')]))
+        self.assertEqual(render.min_length, 11)
+        self.assertTrue(render.orchestrate([Isdataat.from_string('!20')]))
+        self.assertTrue(render.orchestrate([Isdataat.from_string('!30')]))
+        self.assertEqual(render.max_length, 20)
+        # Only the limits that contradict each other fail.
+        self.assertFalse(render.orchestrate([Isdataat.from_string('!5')]))
+        self.assertFalse(render.orchestrate([ByteTest.from_string('4,>,0,18')]))
+
+    def test_generatability_cache(self):
+        import tempfile
+
+        rules = [self.rule_1, self.rule_3] + [Rule.from_string(
+            f'alert tcp any any -> any 21 ( msg:"UNGENERATABLE"; {options} service:ftp; sid:{sid}; rev:1; )'
+        ) for sid, options in enumerate([
+            'flowbits:isset,unknown.flowbit; content:"A";',
+            'content:"A"; dsize:>10;',
+            'content:"AAAA"; content:"B",offset 1;',
+        ], start=9999990)]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = GeneratabilityCache(PassThroughMutator(ruleset=self.ruleset), cache_dir=cache_dir, max_failures=2)
+            self.assertEqual(cache.precheck(rules), rules[2:])
+            self.assertEqual(cache.report(), {'Unsatisfiable flowbits': 1, 'Unsupported options': 1,
+                                              'Orchestration failed in buffer': 1})
+
+            # A rule that passes the pre-pass fails for good after failing several times at runtime.
+            self.assertFalse(cache.record(self.rule_1, 'Orchestration failed.'))
+            self.assertTrue(cache.record(self.rule_1, 'Orchestration failed.'))
+            self.assertEqual(cache.reason(self.rule_1), 'Orchestration failed.')
+            cache.store()
+
+            # The outcomes are loaded by the next campaign, which does not check the rules again.
+            cache = GeneratabilityCache(PassThroughMutator(ruleset=self.ruleset), cache_dir=cache_dir)
+            self.assertEqual(len(cache), 4)
+            cache.mutator = None
+            self.assertEqual(cache.precheck(rules), [self.rule_1] + rules[2:])
+
+    def test_generation_plans(self):
+        import tempfile
+
+        rule = Rule.from_string('alert tcp any any -> any 21 ( msg:"PLAN"; content:"AAAA"; content:"BBBB",distance 8; '
+                                'service:ftp; sid:9999989; rev:1; )')
+        with tempfile.TemporaryDirectory() as cache_dir:
+            plans = PlanCache(capacity=2, cache_dir=cache_dir)
+            mutator = PassThroughMutator(ruleset=self.ruleset, plans=plans)
+            packets = [list(mutator.generate(rule, proto='ftp')) for _ in range(10)]
+            # The rule is compiled once, and only the padding changes between test cases.
+            self.assertEqual((len(plans), plans.misses, plans.hits), (1, 1, 9))
+            self.assertTrue(all(b'AAAA' in request and b'BBBB' in request for (request, _), in packets))
+            self.assertGreater(len({request for (request, _), in packets}), 1)
+            (_, layout), = mutator.compile(rule, proto='ftp').layouts
+            self.assertIsInstance(layout, PassThroughSignatureRender)
+            self.assertIsInstance(layout.data_chunks, tuple)
+
+            # The buffers with PCRE options are orchestrated per test case, after the packets of the flowbit setters.
+            plan = mutator.compile(self.rule_3, proto='http')
+            self.assertEqual(plan.flowbits, ('file.realplayer.playlist',))
+            self.assertTrue(all(isinstance(layout, tuple) for _, layout in plan.layouts))
+            self.assertEqual(len(list(mutator.generate(self.rule_3, proto='http'))), 2)
+
+            # The least recently used plans are evicted, and the stored plans are loaded by the next campaign.
+            self.assertEqual(len(plans), 2)
+            plans.store()
+            plans = PlanCache(cache_dir=cache_dir)
+            self.assertEqual(len(plans), 2)
+            list(PassThroughMutator(ruleset=self.ruleset, plans=plans).generate(self.rule_3, proto='http'))
+            self.assertEqual((plans.misses, plans.hits), (0, 2))
+
+        # The plans of randomized mutators are compiled for every test case.
+        plans = PlanCache()
+        mutator = RepetitionMutator(ruleset=self.ruleset, repeat_times=3, min_repeat_times=2, max_repeat_times=10,
+                                    plans=plans)
+        list(mutator.generate(self.rule_1, proto='ftp'))
+        self.assertEqual(len(plans), 0)
+
+    def test_pcre_sampler(self):
+        import re
+
+        sampler = PcreSampler(max_length=512)
+        for raw in [r'"/^file\x3a\x2f\x2f[^\n]{400}/mi"', r'"/(a|bc)+\d{2,}(?:x|y)*$/s"', r'"/^GET\s+[^\s]*?\.php/i"',
+                    r'"/(?P<q>[\x22\x27]).{0,20}(?P=q)/s"', r'"/ a b [ ]+ c # comment/x"', r'"/(.*){50}(.+)+\xff$/"']:
+            pcre = Pcre.from_string(raw)
+            flags = sum(flag for char, flag in [('i', re.I), ('s', re.S), ('m', re.M), ('x', re.X)] if pcre[char])
+            # The samples match the PCRE under its flags, and the unbounded repeats stay within the maximum length.
+            for data in sampler.sample(pcre, k=20):
+                self.assertRegex(data.decode('latin-1'), re.compile(pcre['match'], flags))
+                self.assertLessEqual(len(data), 512)
+
+        # Each PCRE is parsed once.
+        sampler.sample(pcre)
+        self.assertEqual((sampler.compile.cache_info().misses, sampler.compile.cache_info().hits), (6, 1))
+
+        # The PCRE options that cannot be sampled are reported, and fail the generatability check.
+        with self.assertRaises(PcreSampleError):
+            sampler.sample(Pcre.from_string(r'"/a{1000}/"'))
+        with self.assertRaises(PcreSampleError):
+            sampler.sample(Pcre.from_string(r'"/(?<=a)(?<n>b)/"'))
+        rule = Rule.from_string(r'alert tcp any any -> any 21 ( msg:"PCRE"; pcre:"/(?<n>b)/"; service:ftp; '
+                                r'sid:9999988; rev:1; )')
+        self.assertTrue(PassThroughMutator(ruleset=self.ruleset).check(rule, proto='ftp').startswith('Unsupported PCRE'))
+
+    def test_padding(self):
+        render = PassThroughSignatureRender(sticky_buffer='pkt_data', proto='ftp')
+        render.orchestrate(Rule.from_string(r'alert tcp any any -> any 21 ( msg:"PADDING"; content:!"abc"; '
+                                            r'content:"XYZ",offset 10; content:"OVERLAP"; service:ftp; '
+                                            r'sid:9999987; rev:1; )').signature['pkt_data'])
+        render.data_chunks.append(DataChunk(12, b'123'))
+        render.min_length = 1000
+        data = render.render()
+        # The gaps are padded, an overlapping chunk follows the preceding one, and the buffer is padded to its length.
+        self.assertEqual(len(data), 1000)
+        self.assertEqual(data[10:23], b'XYZOVERLAP123')
+        # The padding of text protocols is printable, without the bytes of the negated contents.
+        padding = data[:10] + data[23:]
+        self.assertTrue(set(padding) <= set(range(ord(' '), ord('~') + 1)) | {ord('\n'), ord('\r'), ord('\t')})
+        self.assertFalse(set(padding) & set(b'abc'))
+        self.assertEqual(len(set(render.generate_padding(100000))), 95)
+
+        render.padding_bitmap = 0
+        self.assertTrue(set(render.generate_padding(100)) <= set(range(ord(' '), ord('~') + 1)))
+        self.assertEqual(render.generate_padding(0), b'')
+
+    def test_generation_pool(self):
+        rule = Rule.from_string('alert tcp any any -> any 21 ( msg:"POOL"; content:"AAAA"; content:"BBBB",distance 8; '
+                                'service:ftp; sid:9999986; rev:1; )')
+        unknown_rule = Rule.from_string('alert tcp any any -> any 21 ( msg:"UNKNOWN"; content:"CCCC"; service:ftp; '
+                                        'sid:9999985; rev:1; )')
+        ruleset = RuleSet.from_rules(self.ruleset.rules + [rule])
+        batches = [('ftp', [rule])] * 10 + [('http', [self.rule_3]), ('ftp', [unknown_rule])]
+        results = list(PassThroughMutator(ruleset=ruleset).generate_many(iter(batches), workers=2, chunksize=3))
+
+        # The results are yielded in the order of the batches, and the rules are looked up by ID in the workers.
+        self.assertEqual([reason for _, reason in results],
+                         [PassThroughMutator.FINISHED] * 11 + [f'Unknown rules: {[unknown_rule.id]}'])
+        self.assertTrue(all(b'AAAA' in request and b'BBBB' in request for (request, _), in
+                            (packets for packets, _ in results[:10])))
+        # The packets of the flowbit setter of rule_3 come first.
+        self.assertEqual(len(results[10][0]), 2)
+        # The workers draw their own padding.
+        self.assertEqual(len({request for (request, _), in (packets for packets, _ in results[:10])}), 10)
+
+    def test_streamed_packets(self):
+        import re
+        import tempfile
+
+        rule = Rule.from_string('alert tcp any any -> any 80 ( msg:"STREAM"; http_client_body; content:"AAAA"; '
+                                'content:"BBBB",distance 8; service:http; sid:9999984; rev:1; )')
+        mutator = RepetitionMutator(ruleset=self.ruleset, repeat_times=5000, min_repeat_times=5000,
+                                    max_repeat_times=5000)
+        (request, response), = mutator.generate(rule, proto='http')
+        # The large buffers are streamed, and the streams produce the same bytes whenever they are read.
+        self.assertIsInstance(request, Stream)
+        data = b''.join(request)
+        self.assertEqual(len(data), len(request))
+        self.assertEqual(b''.join(request), data)
+        self.assertTrue(all(len(chunk) <= Stream.CHUNK_SIZE for chunk in request))
+        self.assertEqual(data.count(b'AAAA'), 5000)
+        self.assertEqual(int(re.search(rb'Content-Length: (\d+)', data).group(1)), len(data.split(b'\r\n\r\n', 1)[1]))
+
+        # The streams are spooled to blobs, which are removed once they are no longer referenced.
+        with tempfile.TemporaryDirectory() as blob_dir:
+            blob = Blob.write(request, blob_dir)
+            self.assertEqual((len(blob), b''.join(blob)), (len(data), data))
+            self.assertEqual(b''.join(b'HEADER' + blob), b'HEADER' + data)
+            path = blob.path
+            del blob
+            self.assertFalse(path.exists())
+
+        # The small buffers are still rendered at once.
+        (request, response), = PassThroughMutator(ruleset=self.ruleset).generate(rule, proto='http')
+        self.assertIsInstance(request, bytes)
+
     def test_repetition_mutator(self):
         mutator = RepetitionMutator(
             ruleset=self.ruleset,
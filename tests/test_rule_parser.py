@@ -5,7 +5,7 @@ from collections import defaultdict
 from pathlib import Path
 from unittest import TestCase
 
-from rule import RuleSet
+from rule import Rule, RuleSet, RuleMapping
 
 
 class TestRuleParser(TestCase):
@@ -130,6 +130,221 @@ class TestRuleParser(TestCase):
         for option, count in statistics.items():
             print(f"{option}: {count}")
 
+    def test_lazy_signature(self):
+        target_ruleset = RuleSet.from_file(str(self.http_rules['snort3']))
+
+        rule = target_ruleset.activated_rules[0]
+        self.assertIsNone(rule._rule_body._signature)
+        signature = rule.signature
+        self.assertIs(signature, rule.signature)
+
+        num_of_options = sum(len(options) for options in signature.values())
+        self.assertEqual(num_of_options, len(rule._rule_body._signature_options))
+        print(repr(rule._rule_body))
+
+    def test_compact_rules(self):
+        import copy, pickle
+
+        target_ruleset = RuleSet.from_file(str(self.community_rules['snort3']))
+
+        rule = target_ruleset.activated_rules[0]
+        self.assertFalse(hasattr(rule, '__dict__'))
+        with self.assertRaises(AttributeError):
+            rule._proto = 'udp'
+
+        # Options are still read like dicts.
+        content = rule.signature['pkt_data'][0]
+        self.assertFalse(hasattr(content, '__dict__'))
+        self.assertEqual(content['match'], content.get('match'))
+        self.assertEqual(list(content), list(type(content).FIELDS))
+        self.assertIsNone(content.get('unknown'))
+        obfuscated_content = copy.deepcopy(content)
+        obfuscated_content['match'] = 'obfuscated'
+        self.assertNotEqual(content['match'], obfuscated_content['match'])
+
+        for option in rule._rule_body["options"]:
+            self.assertEqual(option["name"], option.name)
+
+        unpickled_rule = pickle.loads(pickle.dumps(rule))
+        self.assertEqual(unpickled_rule, rule)
+        self.assertEqual(unpickled_rule.features, rule.features)
+        self.assertEqual(dict(unpickled_rule.signature['pkt_data'][0]), dict(content))
+
+    def test_tokenizing_rules(self):
+        rule = Rule.from_string('alert tcp $HOME_NET [1024:, 8080] -> [10.0.0.1, 10.0.0.2] any '
+                                '( msg:"escaped \\; semicolon"; content:"abc",nocase; http_uri; '
+                                'content:"def"; sid:1; rev:2; )')
+        self.assertEqual(rule._src_port, '[1024:, 8080]')
+        self.assertEqual(rule._dst_ip, '[10.0.0.1, 10.0.0.2]')
+        self.assertEqual(rule.get('msg'), '"escaped \\; semicolon"')
+        self.assertEqual([option.name for option in rule._rule_body["options"]],
+                         ['msg', 'content', 'http_uri', 'content', 'sid', 'rev'])
+        self.assertEqual(len(rule.signature['pkt_data']), 1)
+        self.assertEqual(len(rule.signature['http_uri']), 1)
+
+        # An unterminated list in the header is not a rule.
+        self.assertIsNone(Rule.from_string('alert tcp any [80, 443 -> any any ( sid:1; )'))
+
+    def test_finding_rules(self):
+        target_ruleset = RuleSet.from_files([str(self.community_rules['snort3']), str(self.dns_rules['snort3'])])
+
+        for rule in target_ruleset.rules:
+            expected_rule = next(r for r in target_ruleset.rules if r.id == rule.id)
+            self.assertIs(target_ruleset.find_rule(rule.id), expected_rule)
+        self.assertIsNone(target_ruleset.find_rule('0:0:0'))
+
+    def test_indexing_rules(self):
+        target_ruleset = RuleSet.from_files([str(self.community_rules['snort3']), str(self.http_rules['snort3'])])
+
+        for criteria in [{'service': 'http'}, {'protocol': 'TCP'}, {'service': 'pop'}, {'protocol': 'udp', 'service': 'dns'}]:
+            expected_rules = [rule for rule in target_ruleset.rules
+                              if all(v.casefold() in getattr(rule, k).casefold() for k, v in criteria.items())]
+            rule_group = target_ruleset.group(**criteria)
+            self.assertEqual(rule_group.rules, expected_rules)
+            self.assertEqual(rule_group._set_flowbits, RuleSet.from_rules(expected_rules)._set_flowbits)
+            print(f'{criteria}: {rule_group}')
+
+        file_data_rules = target_ruleset.group(sticky_buffer='file_data')
+        self.assertTrue(all('file_data' in rule.signature for rule in file_data_rules.rules))
+
+        bitmap = target_ruleset.bitmap(feature='pcre') & ~target_ruleset.bitmap(feature='content')
+        pcre_only_rules = target_ruleset.subset(bitmap)
+        self.assertEqual(pcre_only_rules.rules, [rule for rule in target_ruleset.rules
+                                                 if 'pcre' in rule.features and 'content' not in rule.features])
+
+    def test_mapping_rules(self):
+        target_ruleset = RuleSet.from_file(str(self.sip_rules['snort3']))
+        rules = target_ruleset.activated_rules
+
+        # Simulate a rule file of another NIDS platform: a rule whose revision is bumped,
+        # a rule whose sid is changed and a rule that is missing from the fuzzed rules.
+        bumped_rule, renumbered_rule = rules[0], rules[1]
+        mapped_rules = [rule.key for rule in rules[2:]]
+        mapped_rules.append(re.sub(r'rev:(\d+);', lambda m: f'rev:{int(m.group(1)) + 1};', bumped_rule.key))
+        mapped_rules.append(re.sub(r'sid:\d+;', 'sid:9999999;', renumbered_rule.key))
+        mapped_rules.append('alert tcp any any -> any 5060 ( msg:"UNKNOWN"; content:"|00 01 02 03|"; sid:9999998; rev:1; )')
+        mapped_ruleset = RuleSet.from_rules([Rule.from_string(rule) for rule in mapped_rules])
+
+        rule_mapping = RuleMapping(target_ruleset, mapped_ruleset)
+        print(rule_mapping)
+        self.assertEqual(rule_mapping.normalize(mapped_ruleset.rules[-3].id), bumped_rule.id)
+        self.assertEqual(rule_mapping.normalize(mapped_ruleset.rules[-2].id), renumbered_rule.id)
+        self.assertEqual(rule_mapping.normalize('1:9999998:1'), '1:9999998:1')
+        self.assertEqual(rule_mapping.num_signature_matches, 1)
+        for rule in rules:
+            self.assertEqual(rule_mapping.normalize(rule.id), rule.id)
+
+    def test_reloading_rules(self):
+        import os, shutil, tempfile
+
+        with tempfile.TemporaryDirectory() as rule_dir:
+            rule_file = shutil.copy(self.community_rules['snort3'], rule_dir)
+            target_ruleset = RuleSet.from_file(rule_file)
+            self.assertEqual(target_ruleset.reload(), ([], []))
+
+            rules = target_ruleset.activated_rules
+            modified_rule, removed_rule, unchanged_rule = rules[0], rules[1], rules[2]
+            modified_line = re.sub(r'rev:(\d+);', lambda m: f'rev:{int(m.group(1)) + 1};', modified_rule.key)
+            added_line = 'alert tcp any any -> any 21 ( msg:"ADDED"; flowbits:set,added; content:"added"; sid:9999999; rev:1; )'
+            with open(rule_file, 'r', encoding='utf-8') as f:
+                lines = [line.strip() for line in f]
+            lines = [modified_line if line == modified_rule.key else line for line in lines if line != removed_rule.key]
+            lines.append(added_line)
+            with open(rule_file, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines))
+            os.utime(rule_file, ns=(0, 0))
+
+            added_rules, removed_rules = target_ruleset.reload()
+            self.assertEqual({rule.key for rule in added_rules}, {modified_line, added_line})
+            self.assertEqual(set(removed_rules), {modified_rule, removed_rule})
+            # Unchanged rules keep their objects.
+            self.assertIs(target_ruleset.find_rule(unchanged_rule.id), unchanged_rule)
+            self.assertIsNone(target_ruleset.find_rule(removed_rule.id))
+            self.assertIn('added', target_ruleset._set_flowbits)
+
+            reloaded_ruleset = RuleSet.from_file(rule_file)
+            self.assertEqual(set(target_ruleset.rules), set(reloaded_ruleset.rules))
+            self.assertEqual(target_ruleset.flowbits, reloaded_ruleset.flowbits)
+            self.assertEqual(set(target_ruleset.group(service='http').rules), set(reloaded_ruleset.group(service='http').rules))
+
+    def test_reloading_unresolved_rules(self):
+        import os, shutil, tempfile
+
+        with tempfile.TemporaryDirectory() as rule_dir:
+            rule_file = shutil.copy(self.community_rules['snort3'], rule_dir)
+            unresolved_line = 'alert http ( msg:"UNRESOLVED"; content:"unresolved"; sid:9999998; rev:1; )'
+            with open(rule_file, 'a', encoding='utf-8') as f:
+                f.write('\n' + unresolved_line)
+            target_ruleset = RuleSet.from_file(rule_file)
+            unresolved_num = len(target_ruleset._unresolved_rules)
+            self.assertIn(unresolved_line, target_ruleset._unresolved_rules.values())
+
+            # Touching the file does not record its unresolved lines again.
+            os.utime(rule_file, ns=(0, 0))
+            self.assertEqual(target_ruleset.reload(), ([], []))
+            self.assertEqual(len(target_ruleset._unresolved_rules), unresolved_num)
+
+            with open(rule_file, 'r', encoding='utf-8') as f:
+                lines = [line.rstrip('\n') for line in f if line.strip() != unresolved_line.strip()]
+            with open(rule_file, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines))
+            os.utime(rule_file, ns=(1, 1))
+            target_ruleset.reload()
+            self.assertNotIn(unresolved_line, target_ruleset._unresolved_rules.values())
+            self.assertEqual(len(target_ruleset._unresolved_rules), unresolved_num - 1)
+
+    def test_diffing_rulesets(self):
+        import shutil, tempfile
+
+        with tempfile.TemporaryDirectory() as rule_dir:
+            rule_file = shutil.copy(self.community_rules['snort3'], rule_dir)
+            baseline_ruleset = RuleSet.from_file(rule_file)
+            self.assertEqual(baseline_ruleset.diff(baseline_ruleset), [])
+
+            modified_rule = baseline_ruleset.find_rule('1:3010:6')
+            removed_setter = baseline_ruleset.find_rule('1:3009:8')
+            self.assertIn(removed_setter, baseline_ruleset._set_flowbits['backdoor.netbus_2.connect'])
+            added_line = 'alert http any any -> any any ( msg:"ADDED"; content:"added"; sid:9999997; rev:1; )'
+            with open(rule_file, 'r', encoding='utf-8') as f:
+                lines = [line.rstrip('\n') for line in f]
+            lines = [line.replace('rev:6;', 'rev:7;') if 'sid:3010;' in line else line
+                     for line in lines if 'sid:3009;' not in line]
+            with open(rule_file, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines + [added_line]))
+            target_ruleset = RuleSet.from_file(rule_file)
+
+            # Besides the modified and added rules, the rules checking the flowbit of the removed setter are changed.
+            changed_rules = target_ruleset.diff(baseline_ruleset)
+            changed_ids = [rule.id for rule in changed_rules]
+            self.assertIn('1:3010:7', changed_ids)
+            self.assertIn('1:9999997:1', changed_ids)
+            self.assertNotIn(modified_rule.id, changed_ids)
+            for rule in target_ruleset._check_flowbits['backdoor.netbus_2.connect']:
+                self.assertIn(rule, changed_rules)
+            self.assertEqual(changed_rules, [rule for rule in target_ruleset.activated_rules if rule in changed_rules])
+            self.assertLess(len(changed_rules), 5)
+
+    def test_partial_loading(self):
+        rule_files = [str(self.community_rules['snort3']), str(self.http_rules['snort3'])]
+        full_ruleset = RuleSet.from_files(rule_files)
+
+        for service in ['sip', 'http', 'smtp']:
+            expected_ruleset = full_ruleset.group(service=service)
+            target_ruleset = RuleSet.from_files(rule_files, proto=service)
+            self.assertEqual([rule.key for rule in target_ruleset.rules], [rule.key for rule in expected_ruleset.rules])
+            self.assertEqual(target_ruleset.flowbits, expected_ruleset.flowbits)
+
+            # Without grouping, the flowbit setters of the checked flowbits are loaded as well.
+            partial_ruleset = RuleSet.from_files(rule_files, services=[service])
+            self.assertLess(len(partial_ruleset.rules), len(full_ruleset.rules))
+            for flowbit in expected_ruleset._check_flowbits:
+                self.assertEqual(partial_ruleset._set_flowbits.get(flowbit), full_ruleset._set_flowbits.get(flowbit))
+
+        # Rules are streamed in file order.
+        streamed_rules = list(RuleSet.stream(rule_files, services=['sip']))
+        self.assertEqual(streamed_rules, [rule for rule in full_ruleset.rules if rule in set(streamed_rules)])
+        self.assertEqual(set(streamed_rules), set(full_ruleset.group(service='sip').rules))
+
     def test_resolving_flowbits(self):
         target_ruleset = RuleSet.from_file(str(self.community_rules['snort3'])).group(service='http')
 
@@ -148,4 +363,48 @@ class TestRuleParser(TestCase):
         for proto in protos:
             proto_ruleset = total_ruleset.group(service=proto)
             proto_num = len(proto_ruleset.rules)
-            print(f'The proportion of {proto} rules is: {proto_num} / {total_num} = {proto_num / total_num:.4f}')
\ No newline at end of file
+            print(f'The proportion of {proto} rules is: {proto_num} / {total_num} = {proto_num / total_num:.4f}')
+
+    def test_caching_rulesets(self):
+        import tempfile, time
+
+        rule_file = str(self.community_rules['snort3'])
+        with tempfile.TemporaryDirectory() as cache_dir:
+            start = time.perf_counter()
+            parsed_ruleset = RuleSet.from_file(rule_file, cache_dir=cache_dir)
+            print(f'Parsing the rule file takes {time.perf_counter() - start:.3f}s')
+
+            start = time.perf_counter()
+            cached_ruleset = RuleSet.from_file(rule_file, cache_dir=cache_dir)
+            print(f'Loading the cached rule file takes {time.perf_counter() - start:.3f}s')
+
+            self.assertEqual(parsed_ruleset.rules, cached_ruleset.rules)
+            self.assertEqual(parsed_ruleset.flowbits, cached_ruleset.flowbits)
+            self.assertEqual(len(list(Path(cache_dir).iterdir())), 1)
+
+    def test_caching_partial_rulesets(self):
+        import os, shutil, tempfile
+
+        rule_file = str(self.community_rules['snort3'])
+        with tempfile.TemporaryDirectory() as cache_dir, tempfile.TemporaryDirectory() as rule_dir:
+            RuleSet.from_file(rule_file, cache_dir=cache_dir)
+            for services in [['sip'], ['http']]:
+                expected_ruleset = RuleSet.from_file(rule_file, services=services)
+                parsed_ruleset = RuleSet.from_file(rule_file, services=services, cache_dir=cache_dir)
+                cached_ruleset = RuleSet.from_file(rule_file, services=services, cache_dir=cache_dir)
+                self.assertEqual(parsed_ruleset.rules, expected_ruleset.rules)
+                self.assertEqual(cached_ruleset.rules, expected_ruleset.rules)
+            # The full RuleSet and each partial one are cached separately.
+            self.assertEqual(len(list(Path(cache_dir).iterdir())), 3)
+
+            # A cache hit from another path of the same content tracks the requested path.
+            copied_file = shutil.copy(rule_file, rule_dir)
+            cached_ruleset = RuleSet.from_file(copied_file, services=['sip'], cache_dir=cache_dir)
+            self.assertEqual(list(cached_ruleset._sources), [str(Path(copied_file).resolve())])
+            added_line = 'alert tcp any any -> any 5060 ( msg:"ADDED"; content:"added"; service:sip; sid:9999999; rev:1; )'
+            with open(copied_file, 'a', encoding='utf-8') as f:
+                f.write('\n' + added_line)
+            os.utime(copied_file, ns=(0, 0))
+            added_rules, removed_rules = cached_ruleset.reload()
+            self.assertEqual([rule.key for rule in added_rules], [added_line])
+            self.assertEqual(removed_rules, [])
\ No newline at end of file
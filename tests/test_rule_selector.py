@@ -1,8 +1,12 @@
+import itertools
+import math
 import pathlib
 import unittest
 
-from rule import RuleSet
-from selection import RandomSelector, SequentialSelector, CombinationSelector
+from rule import RuleSet, RuleClusters, RuleCompatibility, Rule
+from selection import RandomSelector, SequentialSelector, CombinationSelector, CoveringSelector, AdaptiveSelector, \
+    StratifiedSelector, RulePool
+from utils import jaccard_similarity
 
 
 class TestRuleSelector(unittest.TestCase):
@@ -11,6 +15,41 @@ class TestRuleSelector(unittest.TestCase):
         self.rule_file = pathlib.Path(__file__).parent.parent / 'resources' / 'rules' / 'snort3-community.rules'
         self.ruleset = RuleSet.from_file(str(self.rule_file))
 
+    def test_rule_pool(self):
+        import random
+
+        rules = self.ruleset.activated_rules * 2
+        pool, expected_pool = RulePool(rules), list(rules)
+        for _ in range(3000):
+            match random.choice(['remove', 'popleft', 'append', 'sample', 'index']):
+                case 'remove':
+                    rule = random.choice(rules)
+                    if rule in expected_pool:
+                        expected_pool.remove(rule)
+                        pool.remove(rule)
+                    else:
+                        self.assertRaises(ValueError, pool.remove, rule)
+                case 'popleft':
+                    self.assertIs(pool.popleft(), expected_pool.pop(0))
+                case 'append':
+                    rule = random.choice(rules)
+                    expected_pool.append(rule)
+                    pool.append(rule)
+                case 'sample':
+                    sampled_rules = pool.sample(3)
+                    self.assertTrue(all(rule in expected_pool for rule in sampled_rules))
+                case 'index':
+                    # Positional access does not compact the tombstones away.
+                    tombstones = pool._tombstones
+                    position = random.randrange(-len(pool), len(pool))
+                    self.assertIs(pool[position], expected_pool[position])
+                    self.assertEqual(pool._tombstones, tombstones)
+            self.assertEqual(len(pool), len(expected_pool))
+        # The order of the rules is kept.
+        self.assertEqual(list(pool), expected_pool)
+        self.assertEqual([pool[position] for position in range(len(pool))], expected_pool)
+        self.assertEqual(pool[-10:], expected_pool[-10:])
+
     def test_random_selector(self):
         selector = RandomSelector(
             ruleset=self.ruleset,
@@ -54,4 +93,246 @@ class TestRuleSelector(unittest.TestCase):
             print(f'proto: {proto}')
             print(f'rules: {[rule.id for rule in rules]}')
 
-        print(f'The number of selections is: {selector.count}')
\ No newline at end of file
+        print(f'The number of selections is: {selector.count}')
+
+    def test_ranking_combinations(self):
+        selector = CombinationSelector(
+            ruleset=self.ruleset,
+            batch_num=100000,
+            batch_size=3,
+            proto='dns',
+        )
+        pool = selector.current_rule_pool
+
+        # Every unique combination is numbered exactly once.
+        combinations = [selector.unrank(index) for index in range(selector.num_combinations)]
+        self.assertEqual({frozenset(combination) for combination in combinations},
+                         {frozenset(combination) for combination in itertools.combinations(pool, 3)})
+        for index, combination in enumerate(combinations):
+            self.assertEqual(selector.rank(combination), index)
+
+        # The shards of several workers partition the combinations.
+        sharded_combinations = []
+        for shard_index in range(4):
+            shard = CombinationSelector(ruleset=self.ruleset, batch_num=100000, batch_size=3, proto='dns',
+                                        shard_index=shard_index, shard_count=4)
+            sharded_combinations.extend(rules for _, rules in itertools.islice(shard, len(combinations[shard_index::4])))
+        self.assertCountEqual(sharded_combinations, combinations)
+
+        # A campaign resumes from its position, and filtered rules are skipped.
+        selected_combinations = [rules for _, rules in itertools.islice(selector, 10)]
+        resumed_selector = CombinationSelector(ruleset=self.ruleset, batch_num=100000, batch_size=3, proto='dns',
+                                               start=selector.position)
+        selector.filter(pool[-1])
+        self.assertEqual(next(resumed_selector)[1], combinations[10])
+        self.assertEqual(selected_combinations, combinations[:10])
+        # The remaining combinations without the filtered rule are visited before the enumeration starts over.
+        num_remaining = len(combinations) - 10 - math.comb(len(pool) - 1, 2)
+        remaining_combinations = [rules for _, rules in itertools.islice(selector, num_remaining)]
+        self.assertCountEqual(remaining_combinations, [rules for rules in combinations[10:] if pool[-1] not in rules])
+
+    def test_covering_selector(self):
+        for strength, batch_size, unit in [(2, 4, 'rule'), (3, 6, 'rule'), (2, 4, 'feature')]:
+            selector = CoveringSelector(
+                ruleset=self.ruleset,
+                batch_num=100000,
+                batch_size=batch_size,
+                proto='dns',
+                strength=strength,
+                unit=unit,
+            )
+            batches = [rules for _, rules in itertools.islice(selector, selector.num_combinations)]
+            # Far fewer batches than all combinations, but every t-way combination is covered.
+            self.assertLess(len(batches), math.comb(len(selector.units), batch_size))
+            covered_combinations = {frozenset(combination) for rules in batches
+                                    for combination in itertools.combinations(rules, strength)}
+            for combination in itertools.combinations(selector.units, strength):
+                self.assertIn(frozenset(combination), covered_combinations)
+                self.assertTrue(set(combination) <= set(batches[selector.rank(list(combination))]))
+
+    def test_focused_selector(self):
+        dns_rules = self.ruleset.partition()['dns']
+        targets = dns_rules[1:4]
+
+        selector = RandomSelector(ruleset=self.ruleset, batch_num=100, batch_size=2)
+        selector.focus(*targets)
+        self.assertEqual(list(selector.rule_pools), ['dns'])
+        for _, rules in selector:
+            self.assertTrue(set(rules) <= set(targets))
+
+        # The focused rules are combined with all the other rules, and only these combinations are visited.
+        selector = CombinationSelector(ruleset=self.ruleset, batch_num=100000, batch_size=2, proto='dns')
+        selector.focus(*targets)
+        expected_num = math.comb(len(dns_rules), 2) - math.comb(len(dns_rules) - len(targets), 2)
+        batches = [rules for _, rules in itertools.islice(selector, expected_num)]
+        self.assertEqual(len({frozenset(rules) for rules in batches}), expected_num)
+        self.assertTrue(all(not set(targets).isdisjoint(rules) for rules in batches))
+
+        selector = CoveringSelector(ruleset=self.ruleset, batch_num=100000, batch_size=4, proto='dns')
+        selector.focus(*targets)
+        batches = [rules for _, rules in itertools.islice(selector, selector.num_combinations - selector.offset)]
+        self.assertTrue(all(not set(targets).isdisjoint(rules) for rules in batches))
+        covered_pairs = {frozenset(pair) for rules in batches for pair in itertools.combinations(rules, 2)}
+        for target in targets:
+            for rule in dns_rules:
+                if rule != target:
+                    self.assertIn(frozenset((target, rule)), covered_pairs)
+
+    def test_adaptive_selector(self):
+        for algorithm in ['ucb', 'thompson']:
+            selector = AdaptiveSelector(
+                ruleset=self.ruleset,
+                batch_num=100000,
+                batch_size=2,
+                proto='ftp',
+                algorithm=algorithm,
+            )
+            pool_size = len(selector.current_rule_pool)
+
+            # Every rule is selected once before any rule is selected again.
+            selected_rules = [rule for _, rules in itertools.islice(selector, pool_size // 2) for rule in rules]
+            self.assertEqual(len(set(selected_rules)), len(selected_rules))
+
+            # The reward of a pull is clamped to [0, 1].
+            flawed_rule = selected_rules[0]
+            selector.reward(flawed_rule, value=10.0, pattern=frozenset({('snort3', flawed_rule.id)}))
+            self.assertEqual(selector.rewards[selector._arm(flawed_rule)], 1.0)
+
+            # The rules that keep yielding discrepancies are selected more often from then on.
+            selections = []
+            for _, rules in itertools.islice(selector, 20):
+                selections.extend(rules)
+                if flawed_rule in rules:
+                    selector.reward(flawed_rule, confirmed=[flawed_rule])
+            self.assertGreater(selections.count(flawed_rule), max(selections.count(rule) for rule in selected_rules[1:]))
+            self.assertTrue(all(selector.rewards[arm] <= selector.pulls[arm] for arm in selector.rewards))
+
+        # The clusters of near-duplicate rules are the arms by default.
+        selector = AdaptiveSelector(ruleset=self.ruleset, batch_num=100, batch_size=2, proto='http')
+        self.assertIsNotNone(selector.clusters)
+        self.assertLess(len(selector.current_rule_pool), len(self.ruleset.group(service='http').activated_rules))
+
+    def test_warm_starting_selector(self):
+        from commons import Outcome
+
+        selector = AdaptiveSelector(ruleset=self.ruleset, batch_num=100, batch_size=2, proto='dns', cluster_threshold=1.0)
+        consistent_rule, flaky_rule = selector.current_rule_pool[0], selector.current_rule_pool[1]
+        selector.warm_start({consistent_rule: Outcome(tested=10),
+                             flaky_rule: Outcome(tested=10, discrepancies=5, confirmed=1)})
+        self.assertEqual(selector.total_pulls, 20)
+        self.assertGreater(selector.score(flaky_rule), selector.score(consistent_rule))
+        # The rules never tested before still come first.
+        batches = [rules for _, rules in itertools.islice(selector, len(selector.current_rule_pool) // 2 - 1)]
+        self.assertTrue(all(consistent_rule not in rules and flaky_rule not in rules for rules in batches))
+
+    def test_stratified_selector(self):
+        selector = StratifiedSelector(ruleset=self.ruleset, batch_num=100000, batch_size=3, proto='http')
+        strata = selector.strata
+        self.assertEqual(sum(len(rules) for rules in strata.values()), len(selector.current_rule_pool))
+
+        # Every stratum is visited once in each round, however few rules it holds.
+        num_batches = len(strata) // selector.batch_size
+        selected_rules = [rule for _, rules in itertools.islice(selector, num_batches) for rule in rules]
+        self.assertEqual(len({selector.stratum(rule) for rule in selected_rules}), len(selected_rules))
+
+        random_selector = RandomSelector(ruleset=self.ruleset, batch_num=100000, batch_size=3, proto='http')
+        randomly_selected_rules = [rule for _, rules in itertools.islice(random_selector, num_batches) for rule in rules]
+        self.assertLess(len({selector.stratum(rule) for rule in randomly_selected_rules}), len(selected_rules))
+
+    def test_compatible_selector(self):
+        get_rule = 'alert tcp any any -> any any ( msg:"GET"; content:"GET ",depth 4; service:http; sid:1; )'
+        post_rule = 'alert tcp any any -> any any ( msg:"POST"; content:"POST",depth 4; service:http; sid:2; )'
+        short_rule = 'alert tcp any any -> any any ( msg:"SHORT"; content:"A"; isdataat:!8; service:http; sid:3; )'
+        long_rule = 'alert tcp any any -> any any ( msg:"LONG"; content:"0123456789"; service:http; sid:4; )'
+        rules = [Rule.from_string(rule) for rule in (get_rule, post_rule, short_rule, long_rule)]
+        compatibility = RuleCompatibility(rules)
+        self.assertFalse(compatibility.is_compatible(rules[0], rules[1]))
+        self.assertFalse(compatibility.is_compatible(rules[2], rules[3]))
+        self.assertTrue(compatibility.is_compatible(rules[0], rules[2]))
+        # The rules with contents at absolute ranges are blended first.
+        self.assertEqual(compatibility.order([rules[3], rules[0]]), [rules[0], rules[3]])
+
+        for selector in [RandomSelector(ruleset=self.ruleset, batch_num=500, batch_size=3, proto='ftp', compatible=True),
+                         CombinationSelector(ruleset=self.ruleset, batch_num=500, batch_size=2, proto='ftp', compatible=True)]:
+            self.assertTrue(len(selector.compatibility) > 0)
+            for _, rules in selector:
+                self.assertTrue(selector.compatibility.is_compatible(*rules))
+
+    def test_excluding_rules(self):
+        rule_file = self.rule_file.parent / 'snort3-os-windows.rules'
+        selector = RandomSelector(ruleset=RuleSet.from_file(str(rule_file)), batch_num=1000, batch_size=1)
+        invalid_rules = []
+        for rule in selector.ruleset:
+            try:
+                _ = rule.signature
+            except Exception:
+                invalid_rules.append(rule)
+        self.assertTrue(invalid_rules)
+
+        # Excluded rules are kept out of the rule pools, even after the rule pools start over.
+        selector.exclude(*invalid_rules)
+        for _ in range(2):
+            self.assertTrue(all(rule not in rules for rules in selector.rule_pools.values() for rule in invalid_rules))
+            selector.rule_pools = selector._preprocess()
+
+    def test_clustering_rules(self):
+        clusters = RuleClusters(self.ruleset.activated_rules, threshold=0.8)
+        print(f'Clusters: {clusters}')
+        self.assertLess(len(clusters), len(self.ruleset.activated_rules))
+        for representative in clusters.representatives:
+            for rule in clusters.members(representative):
+                self.assertIs(clusters.representative(rule), representative)
+                self.assertGreaterEqual(jaccard_similarity(representative.fuzzy_signature, rule.fuzzy_signature), 0.8)
+
+    def test_clustered_selector(self):
+        selector = SequentialSelector(
+            ruleset=self.ruleset,
+            batch_num=1000,
+            batch_size=1,
+            cluster_threshold=0.8,
+        )
+        pool = selector.current_rule_pool
+        held_rules = selector.held_rules[selector.current_service]
+        self.assertTrue(held_rules)
+        self.assertEqual(len({selector.clusters.representative(rule) for rule in pool}), len(pool))
+
+        # A discrepancy on the representative releases the rest of its cluster.
+        representative = next(iter(held_rules))
+        near_duplicates = held_rules[representative]
+        selector.expand(representative)
+        self.assertNotIn(representative, held_rules)
+        self.assertEqual(pool[-len(near_duplicates):], near_duplicates)
+
+        for proto, rules in selector:
+            print(f'proto: {proto}')
+            print(f'rules: {[rule.id for rule in rules]}')
+
+    def test_reloading_selector(self):
+        import os, shutil, tempfile
+
+        with tempfile.TemporaryDirectory() as rule_dir:
+            rule_file = shutil.copy(self.rule_file, rule_dir)
+            selector = SequentialSelector(
+                ruleset=RuleSet.from_file(rule_file),
+                batch_num=1000,
+                batch_size=1,
+            )
+            pool = selector.current_rule_pool
+            selected_rules = [rules[0] for _, rules in itertools.islice(selector, 10)]
+
+            removed_rule = pool[0]
+            added_line = f'alert tcp any any -> any any ( msg:"ADDED"; content:"added"; service:{selector.current_service}; sid:9999999; rev:1; )'
+            with open(rule_file, 'r', encoding='utf-8') as f:
+                lines = [line.strip() for line in f if line.strip() != removed_rule.key]
+            with open(rule_file, 'w', encoding='utf-8') as f:
+                f.write('\n'.join([*lines, added_line]))
+            os.utime(rule_file, ns=(0, 0))
+
+            added_rules, removed_rules = selector.reload()
+            self.assertEqual(removed_rules, [removed_rule])
+            self.assertIs(selector.current_rule_pool, pool)
+            self.assertNotIn(removed_rule, pool)
+            self.assertIs(pool[-1], added_rules[0])
+            # The state of the selector is kept.
+            self.assertEqual(selector.count, 10)
+            self.assertEqual(selector.filtered_rules[selector.current_service], selected_rules)